@@ -1,21 +1,40 @@
 from datetime import datetime, timedelta
+import hashlib
 import logging
 from opengeo.geoserver.layer import Layer
 from opengeo.geoserver.store import coveragestore_from_index, datastore_from_index, \
     UnsavedDataStore, UnsavedCoverageStore
 from opengeo.geoserver.style import Style
-from opengeo.geoserver.support import prepare_upload_bundle, url
+from opengeo.geoserver.support import prepare_upload_bundle, url, write_bbox, write_attribute_list, \
+    write_dict
 from opengeo.geoserver.layergroup import LayerGroup, UnsavedLayerGroup
 from opengeo.geoserver.workspace import workspace_from_index, Workspace
 from os import unlink
-from xml.etree.ElementTree import XML
+from xml.etree.ElementTree import XML, TreeBuilder, tostring
 from xml.parsers.expat import ExpatError
-from urlparse import urlparse
-import httplib2
-from opengeo.geoserver import util
+from xml.sax.saxutils import escape as xml_escape
+from opengeo.geoserver.transport import Transport
+from opengeo.geoserver import util, pgprofiles
 
 logger = logging.getLogger("gsconfig.catalog")
 
+def _bbox_element(name, box):
+    '''Returns the XML for a (minx, maxx, miny, maxy, crs) bounding box, or an empty string if it is None'''
+    if box is None:
+        return ""
+    minx, maxx, miny, maxy, crs = box
+    builder = TreeBuilder()
+    write_bbox(name)(builder, [repr(float(v)) for v in (minx, maxx, miny, maxy)] + [crs])
+    return tostring(builder.close())
+
+def _attributes_element(attributes):
+    '''Returns the XML for a list of attribute names, or an empty string if it is None'''
+    if attributes is None:
+        return ""
+    builder = TreeBuilder()
+    write_attribute_list("attributes")(builder, attributes)
+    return tostring(builder.close())
+
 class UploadError(Exception):
     pass
 
@@ -50,27 +69,26 @@ class Catalog(object):
         self.service_url = service_url
         if self.service_url.endswith("/"):
             self.service_url = self.service_url.strip("/")
-        self.http = httplib2.Http(
-            disable_ssl_certificate_validation=disable_ssl_certificate_validation)
         self.username = username
         self.password = password
-        self.http.add_credentials(self.username, self.password)
-        netloc = urlparse(service_url).netloc
-        self.http.authorizations.append(
-                httplib2.BasicAuthentication(
-                        (username, password),
-                        netloc,
-                        service_url,
-                        {},
-                        None,
-                        None,
-                        self.http
-                        ))
+        self.http = Transport(self.gs_base_url, username, password,
+                disable_ssl_certificate_validation=disable_ssl_certificate_validation)
         self._cache = dict()
+        self._validators = dict()
+        # increased each time the catalog is modified, or its cached responses are discarded
+        self.generation = 0
         
+    def _invalidate(self):
+        self._cache.clear()
+        self.generation += 1
+
     @property
     def gs_base_url(self):
         return self.service_url.rstrip("rest")
+
+    def stats(self):
+        '''return the current state of the request limiters used to talk to this catalog'''
+        return self.http.stats()
     
     def about(self):
         '''return the about information as a formatted html'''
@@ -130,7 +148,7 @@ class Catalog(object):
             "Accept": "application/xml"
         }
         response, content = self.http.request(rest_url, "DELETE", headers=headers)
-        self._cache.clear()
+        self._invalidate()
 
         if response.status == 200:
             return (response, content)
@@ -164,10 +182,67 @@ class Catalog(object):
             else:
                 raise FailedRequestError(content)
 
+    def revalidate(self, rest_url):
+        """
+        Returns a digest of the content of the given REST resource.
+        If the server sent validators (ETag, Last-Modified) the last time the
+        resource was requested, a conditional request is made, so an unchanged
+        resource is not transferred again.
+        """
+        headers = {}
+        validators = self._validators.get(rest_url)
+        if validators is not None:
+            etag, modified, digest = validators
+            if etag is not None:
+                headers["If-None-Match"] = etag
+            if modified is not None:
+                headers["If-Modified-Since"] = modified
+        response, content = self.http.request(rest_url, "GET", headers=headers)
+        if response.status == 304 and validators is not None:
+            return validators[2]
+        elif response.status == 200:
+            digest = hashlib.md5(content).hexdigest()
+            self._validators[rest_url] = (response.get("etag"),
+                                          response.get("last-modified"), digest)
+            return digest
+        else:
+            raise FailedRequestError(content)
+
+    def get_listing_digests(self):
+        """
+        Returns a dict with a digest of each of the main listings of the catalog
+        (workspaces, layers, layergroups, styles), to cheaply detect changes in it
+        """
+        listings = ["workspaces", "layers", "layergroups", "styles"]
+        return dict((listing, self.revalidate(url(self.service_url, [listing + ".xml"])))
+                    for listing in listings)
+
+    def get_listing_names(self):
+        """
+        Returns a dict with the names of the elements in each of the main listings of
+        the catalog (workspaces, layers, layergroups, styles), without fetching
+        the elements themselves
+        """
+        tags = {"workspaces": "workspace", "layers": "layer",
+                "layergroups": "layerGroup", "styles": "style"}
+        names = {}
+        for listing, tag in tags.iteritems():
+            description = self.get_xml(url(self.service_url, [listing + ".xml"]))
+            names[listing] = [e.find("name").text for e in description.findall(tag)]
+        return names
+
+    def get_listing_counts(self):
+        """
+        Returns a dict with the number of elements in each of the main listings of
+        the catalog (workspaces, layers, layergroups, styles), without fetching
+        the elements themselves
+        """
+        return dict((listing, len(names)) for listing, names in self.get_listing_names().iteritems())
+
     def reload(self):
         reload_url = url(self.service_url, ['reload'])
         response = self.http.request(reload_url, "POST")
-        self._cache.clear()
+        self._invalidate()
         return response
 
     def save(self, obj):
@@ -187,7 +262,7 @@ class Catalog(object):
         logger.debug("%s %s", obj.save_method, obj.href)
         response = self.http.request(rest_url, obj.save_method, message, headers)
         headers, body = response
-        self._cache.clear()
+        self._invalidate()
         if 400 <= int(headers['status']) < 600:            
             raise FailedRequestError(body)
         return response
@@ -294,15 +369,21 @@ class Catalog(object):
 
         try:
             headers, response = self.http.request(upload_url, "PUT", message, headers)
-            self._cache.clear()
+            self._invalidate()
             if headers.status != 201:
                 raise UploadError(response)
         finally:
             unlink(bundle)
 
     def create_pg_featurestore(self, name, workspace=None, overwrite=False, 
-                               host="localhost", port = 5432 , database="db", schema="public", user="postgres", passwd=""):
-        '''creates a postgis-based datastore'''
+                               host="localhost", port = 5432 , database="db", schema="public", user="postgres", passwd="",
+                               connection_params=None):
+        '''
+        creates a postgis-based datastore.
+        connection_params is a dict of additional connection parameters (pool size, fetch 
+        size...), i.e. those of one of the profiles in pgprofiles. They are only used for new
+        stores. An existing store that is overwritten keeps its own tuning parameters
+        '''
         
         if user == "" and passwd == "":
             raise Exception("Both username and password are empty strings. Use a different user/passwd combination")
@@ -322,6 +403,7 @@ class Catalog(object):
                         and params['user'] == user):
                     print "db connection already exists"
                     return
+                connection_params = pgprofiles.tuning_params(params)
             else:                          
                 msg = "There is already a store named " + name
                 if workspace:
@@ -350,6 +432,8 @@ class Catalog(object):
                 "<user>" + user + "</user>\n"
                 "<passwd>" + passwd + "</passwd>\n"
                 "<dbtype>postgis</dbtype>\n"
+                + "".join('<entry key="%s">%s</entry>\n' % (xml_escape(k, {'"': "&quot;"}), xml_escape(v))
+                          for k, v in (connection_params or {}).iteritems()) +
                 "</connectionParameters>\n"
                 "</dataStore>")
         
@@ -362,12 +446,19 @@ class Catalog(object):
                          ["workspaces", workspace, "datastores.xml"], params)
             headers, response = self.http.request(ds_url, "POST", xml, headers)
 
-        self._cache.clear()
+        self._invalidate()
         if headers.status != 201 and headers.status != 200:            
             raise UploadError(response)
         
-    def create_pg_featuretype(self, name, store, workspace=None, srs = "EPSG:4326"):
-        
+    def create_pg_featuretype(self, name, store, workspace=None, srs = "EPSG:4326", native_bbox = None, latlon_bbox = None,
+                              attributes = None):
+        '''
+        creates a feature type for a table in a postgis-based datastore.
+        Bounding boxes can be passed as (minx, maxx, miny, maxy, crs) tuples. Otherwise
+        GeoServer computes them, which requires scanning the whole table.
+        If a list of attribute names is passed, only those columns are published. It 
+        must include the geometry column
+        '''
         if workspace is None:
             workspace = self.get_default_workspace()
             
@@ -389,6 +480,9 @@ class Catalog(object):
         "<title>" + name + "</title>\n" 
         "<name>" + name +"</name>\n"         
         "<srs>" + srs +"</srs>" 
+        + _bbox_element("nativeBoundingBox", native_bbox)
+        + _bbox_element("latLonBoundingBox", latlon_bbox)
+        + _attributes_element(attributes) +
         "</featureType>")
         
         headers, response = self.http.request(ds_url, "POST", xml, headers)
@@ -397,6 +491,144 @@ class Catalog(object):
             raise UploadError(response)
 
         
+    def create_pg_sqlview(self, name, store, sql, workspace=None, geometry=None, key_columns=None, parameters=None):
+        '''
+        creates a feature type in a postgis-based datastore from a SQL query (a SQL view).
+        geometry is a (column, type, srid) tuple, with a JTS geometry type name (Point, MultiPolygon...).
+        key_columns is a list of the columns that identify the features.
+        parameters is a list of (name, default value, validation regexp) tuples, for the 
+        %name% placeholders in the query, which GeoServer replaces with the values passed 
+        in the viewparams of each request
+        '''
+        if workspace is None:
+            workspace = self.get_default_workspace()
+        workspace = util.name(workspace)
+        store = util.name(store)
+        ds_url = url(self.service_url,
+            ["workspaces", workspace, "datastores", store, "featuretypes.xml"], dict())
+
+        def element(builder, tag, text):
+            builder.start(tag, dict())
+            if text is not None:
+                builder.data(unicode(text))
+            builder.end(tag)
+
+        builder = TreeBuilder()
+        builder.start("featureType", dict())
+        element(builder, "name", name)
+        element(builder, "nativeName", name)
+        element(builder, "title", name)
+        element(builder, "enabled", "true")
+        if geometry is not None:
+            element(builder, "srs", "EPSG:%i" % int(geometry[2]))
+        builder.start("metadata", dict())
+        builder.start("entry", dict(key="JDBC_VIRTUAL_TABLE"))
+        builder.start("virtualTable", dict())
+        element(builder, "name", name)
+        element(builder, "sql", sql)
+        element(builder, "escapeSql", "false")
+        for column in key_columns or []:
+            element(builder, "keyColumn", column)
+        if geometry is not None:
+            column, geomtype, srid = geometry
+            builder.start("geometry", dict())
+            element(builder, "name", column)
+            element(builder, "type", geomtype)
+            element(builder, "srid", int(srid))
+            builder.end("geometry")
+        for paramname, default, regexp in parameters or []:
+            builder.start("parameter", dict())
+            element(builder, "name", paramname)
+            element(builder, "defaultValue", default)
+            if regexp:
+                element(builder, "regexpValidator", regexp)
+            builder.end("parameter")
+        builder.end("virtualTable")
+        builder.end("entry")
+        builder.end("metadata")
+        builder.end("featureType")
+
+        headers = {
+            "Content-type": "text/xml"
+        }
+        headers, response = self.http.request(ds_url, "POST", tostring(builder.close()), headers)
+        self._invalidate()
+        if headers.status != 201 and headers.status != 200:
+            raise UploadError(response)
+
+    def create_pregeneralized_featurestore(self, name, base_store, base_feature, geom_property, levels, 
+                                           workspace=None, overwrite=False):
+        '''
+        creates a pre-generalized datastore, which serves a feature type from the generalized copy of
+        a feature type that better suits the scale of each request, and that feature type, named as 
+        the datastore.
+        levels is a list of (distance, feature name, geometry property) tuples describing the generalized
+        copies of base_feature. All of them have to be in base_store.
+        It requires the pregeneralized features extension, and the REST resource API to upload 
+        the file describing the generalizations
+        '''
+        if workspace is None:
+            workspace = self.get_default_workspace()
+        workspace = util.name(workspace)
+        base_store = util.name(base_store)
+        try:
+            store = self.get_store(name, workspace)
+        except FailedRequestError:
+            store = None
+        if store is not None:
+            if not overwrite:
+                raise ConflictingDataError("There is already a store named " + name)
+            self.delete(store, recurse=True)
+
+        data_source = workspace + ":" + base_store
+        builder = TreeBuilder()
+        builder.start("GeneralizationInfos", dict(version="1.0"))
+        builder.start("GeneralizationInfo", dict(dataSourceName=data_source, featureName=name,
+                                                 baseFeatureName=base_feature, geomPropertyName=geom_property))
+        for distance, feature, geom in levels:
+            builder.start("Generalization", dict(dataSourceName=data_source, distance=repr(float(distance)),
+                                                 featureName=feature, geomPropertyName=geom))
+            builder.end("Generalization")
+        builder.end("GeneralizationInfo")
+        builder.end("GeneralizationInfos")
+        filename = "%s_%s.xml" % (workspace, name)
+        headers, response = self.http.request(url(self.service_url, ["resource", "pregeneralized", filename]), 
+                                              "PUT", tostring(builder.close()), {"Content-type": "application/xml"})
+        if headers.status < 200 or headers.status > 299: 
+            raise UploadError(response)
+
+        namespace = self.get_xml(url(self.service_url, ["namespaces", workspace + ".xml"])).findtext("uri")
+        params = {"RepositoryClassName": "org.geoserver.data.gen.DSFinderRepository",
+                  "GeneralizationInfosProviderClassName": "org.geoserver.data.gen.info.GeneralizationInfosProviderImpl",
+                  "GeneralizationInfosProviderParam": "file:pregeneralized/" + filename,
+                  "namespace": namespace}
+        builder = TreeBuilder()
+        builder.start("dataStore", dict())
+        builder.start("name", dict())
+        builder.data(name)
+        builder.end("name")
+        builder.start("type", dict())
+        builder.data("Generalizing data store")
+        builder.end("type")
+        write_dict("connectionParameters")(builder, params)
+        builder.end("dataStore")
+        headers = {
+            "Content-type": "text/xml"
+        }
+        ds_url = url(self.service_url, ["workspaces", workspace, "datastores.xml"])
+        headers, response = self.http.request(ds_url, "POST", tostring(builder.close()), headers)
+        self._invalidate()
+        if headers.status != 201 and headers.status != 200:
+            raise UploadError(response)
+
+        xml = ("<featureType><name>%s</name><nativeName>%s</nativeName><title>%s</title><enabled>true</enabled></featureType>" 
+               % ((xml_escape(name),) * 3))
+        ft_url = url(self.service_url, ["workspaces", workspace, "datastores", name, "featuretypes.xml"])
+        headers, response = self.http.request(ft_url, "POST", xml, {"Content-type": "text/xml"})
+        self._invalidate()
+        if headers.status != 201 and headers.status != 200:
+            raise UploadError(response)
+
     def create_shp_featurestore(self, name, data, workspace=None, overwrite=False, charset=None):
         '''creates a shapefile-based datastore'''
         if workspace is None:
@@ -433,7 +665,7 @@ class Catalog(object):
         message = open(archive)
         try:
             headers, response = self.http.request(ds_url, "PUT", message, headers)
-            self._cache.clear()
+            self._invalidate()
             if headers.status != 201:
                 raise UploadError(response)
         finally:
@@ -483,7 +715,7 @@ class Catalog(object):
 
         try:
             headers, response = self.http.request(cs_url, "PUT", message, headers)
-            self._cache.clear()
+            self._invalidate()
             if headers.status != 201:
                 raise UploadError(response)
         finally:
@@ -621,7 +853,7 @@ class Catalog(object):
         style_url = url(self.service_url, ["styles", name + ".sld"])
         headers, response = self.http.request(style_url, "PUT", sld, headers)
 
-        self._cache.clear()
+        self._invalidate()
         if headers.status < 200 or headers.status > 299: raise UploadError(response)                   
 
     def create_workspace(self, name, uri):
@@ -634,7 +866,7 @@ class Catalog(object):
 
         headers, response = self.http.request(workspace_url, "POST", xml, headers)
         assert 200 <= headers.status < 300, "Error creating workspace: " + str(headers.status) + ": " + response
-        self._cache.clear()
+        self._invalidate()
         return self.get_workspace(name)
 
     def get_workspaces(self):
@@ -660,7 +892,7 @@ class Catalog(object):
             default_workspace_url = self.service_url + "/workspaces/default.xml"            
             headers, response = self.http.request(default_workspace_url, "PUT", workspace.message(), headers)
             assert 200 <= headers.status < 300, "Error setting default workspace: " + str(headers.status) + ": " + response
-            self._cache.clear()
+            self._invalidate()
             
             
         
@@ -1,7 +1,5 @@
-import httplib2
 from xml.etree.ElementTree import XML
 import xml.etree.ElementTree as ET
-from urlparse import urlparse
 from opengeo.geoserver.catalog import FailedRequestError
 import json
 
@@ -10,21 +8,7 @@ class Gwc(object):
     def __init__(self, catalog):
         self.catalog = catalog
         self.url = catalog.gs_base_url + 'gwc/rest/'
-        http = httplib2.Http()
-        http.add_credentials(catalog.username, catalog.password)
-        netloc = urlparse(self.url).netloc
-        http.authorizations.append(
-            httplib2.BasicAuthentication(
-                (catalog.username, catalog.password),
-                netloc,
-                self.url,
-                {},
-                None,
-                None,
-                http
-            )
-        )
-        self.http = http 
+        self.http = catalog.http
        
     def layers(self):
         '''get a dict of layer->href'''
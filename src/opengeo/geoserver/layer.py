@@ -1,5 +1,9 @@
-from opengeo.geoserver.support import ResourceInfo, xml_property, write_bool, url
+import urllib
+from opengeo.geoserver.support import ResourceInfo, xml_property, write_bool, url, atom_link
 from opengeo.geoserver.style import Style
+from opengeo.geoserver.workspace import Workspace
+from opengeo.geoserver.store import DataStore, CoverageStore
+from opengeo.geoserver.resource import FeatureType, Coverage
 
 class _attribution(object):
     def __init__(self, title, width, height):
@@ -74,8 +78,39 @@ class Layer(ResourceInfo):
     def resource(self):
         if self.dom is None: 
             self.fetch()
+        resource = self._resource_from_link()
+        if resource is not None:
+            return resource
         name = self.dom.find("resource/name").text
         return self.catalog.get_resource(name)
+
+    def _resource_from_link(self):
+        """
+        Builds the resource of the layer from the link in its description, which
+        avoids searching for it in every store of the catalog
+        """
+        try:
+            href = atom_link(self.dom.find("resource"))
+        except AttributeError:
+            return None
+        base = self.catalog.service_url.rstrip("/") + "/"
+        if href is None or not href.startswith(base):
+            return None
+        path = href[len(base):]
+        if path.endswith(".xml"):
+            path = path[:-len(".xml")]
+        segments = [urllib.unquote(s) for s in path.split("/")]
+        if len(segments) != 6 or segments[0] != "workspaces":
+            return None
+        workspace = Workspace(self.catalog, segments[1])
+        if segments[2] == "datastores" and segments[4] == "featuretypes":
+            return FeatureType(self.catalog, workspace,
+                               DataStore(self.catalog, workspace, segments[3]), segments[5])
+        elif segments[2] == "coveragestores" and segments[4] == "coverages":
+            return Coverage(self.catalog, workspace,
+                            CoverageStore(self.catalog, workspace, segments[3]), segments[5])
+        else:
+            return None
     
     @property
     def abstract(self):
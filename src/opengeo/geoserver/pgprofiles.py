@@ -0,0 +1,69 @@
+'''
+Named sets of connection parameters for PostGIS datastores.
+
+GeoServer creates PostGIS stores with a small connection pool, no prepared
+statements and exact extents, which is slow for most uses. These profiles tune
+the store for the kind of requests it will mostly serve.
+'''
+
+GEOSERVER_DEFAULTS = "GeoServer defaults"
+INTERACTIVE_WMS = "Interactive WMS"
+BULK_WFS = "Bulk WFS"
+
+PROFILES = {
+    GEOSERVER_DEFAULTS: {},
+    # many small, concurrent requests (map tiles), where response time matters
+    INTERACTIVE_WMS: {
+        "min connections": "4",
+        "max connections": "20",
+        "fetch size": "1000",
+        "Connection timeout": "20",
+        "validate connections": "true",
+        "preparedStatements": "true",
+        "Max open prepared statements": "50",
+        "Estimated extends": "true",
+        "Loose bbox": "true",
+        "encode functions": "true",
+    },
+    # fewer requests returning large numbers of exact features
+    BULK_WFS: {
+        "min connections": "1",
+        "max connections": "10",
+        "fetch size": "10000",
+        "Connection timeout": "60",
+        "validate connections": "true",
+        "preparedStatements": "true",
+        "Max open prepared statements": "50",
+        "Estimated extends": "true",
+        "Loose bbox": "false",
+        "encode functions": "true",
+    },
+}
+
+# parameters set by any of the profiles. Applying a profile removes the ones it does not
+# set, so the store uses the GeoServer defaults for them
+PROFILE_KEYS = frozenset(key for params in PROFILES.itervalues() for key in params)
+
+def profile_names():
+    return sorted(PROFILES.keys())
+
+def profile_params(name):
+    '''returns the connection parameters of a profile. Raises ValueError if it does not exist'''
+    try:
+        return dict(PROFILES[name])
+    except KeyError:
+        raise ValueError("Unknown PostGIS store profile: %s" % name)
+
+def apply_profile(params, name):
+    '''returns the connection parameters of a store, with those of a profile replacing the tuning ones'''
+    tuned = dict((k, v) for k, v in params.iteritems() if k not in PROFILE_KEYS)
+    tuned.update(profile_params(name))
+    return tuned
+
+def tuning_params(params):
+    '''returns the connection parameters of a store that are set by profiles'''
+    return dict((k, v) for k, v in params.iteritems() if k in PROFILE_KEYS)
+
+def is_postgis_store(store):
+    params = getattr(store, "connection_parameters", None) or {}
+    return params.get("dbtype") == "postgis"
@@ -1,5 +1,6 @@
 from opengeo.geoserver.support import ResourceInfo, xml_property, write_string, bbox, \
-    write_bbox, string_list, write_string_list, attribute_list, write_bool, url
+    write_bbox, string_list, write_string_list, attribute_list, write_bool, url, \
+    attribute_binding_list, write_attribute_list
 
 def md_link(node):
     """Extract a metadata link tuple from an xml node"""
@@ -72,6 +73,7 @@ class FeatureType(ResourceInfo):
     projection_policy = xml_property("projectionPolicy")
     keywords = xml_property("keywords", string_list)
     attributes = xml_property("attributes", attribute_list)
+    attribute_bindings = xml_property("attributes", attribute_binding_list)
     metadata_links = xml_property("metadataLinks", metadata_link_list)
 
     writers = dict(
@@ -83,7 +85,8 @@ class FeatureType(ResourceInfo):
                 srs = write_string("srs"),
                 projectionPolicy = write_string("projectionPolicy"),
                 keywords = write_string_list("keywords"),
-                metadataLinks = write_metadata_link_list("metadataLinks")
+                metadataLinks = write_metadata_link_list("metadataLinks"),
+                attributes = write_attribute_list("attributes")
             )
 
 class CoverageDimension(object):
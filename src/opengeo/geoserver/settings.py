@@ -1,28 +1,12 @@
-import httplib2
 from xml.etree.ElementTree import XML
 import xml.etree.ElementTree as ET
-from urlparse import urlparse
 from opengeo.geoserver.support import url
 
 class Settings(object):
     
     def __init__(self, catalog):
         self.catalog = catalog    
-        http = httplib2.Http()
-        http.add_credentials(catalog.username, catalog.password)
-        netloc = urlparse(self.catalog.service_url).netloc
-        http.authorizations.append(
-            httplib2.BasicAuthentication(
-                (catalog.username, catalog.password),
-                netloc,
-                self.catalog.service_url,
-                {},
-                None,
-                None,
-                http
-            )
-        )
-        self.http = http
+        self.http = catalog.http
         
     def settings(self):
         settings = {}     
@@ -81,6 +81,14 @@ def attribute_list(node):
     if node is not None:
         return [n.text for n in node.findall("attribute/name")]
 
+def attribute_binding_list(node):
+    if node is not None:
+        return [(n.findtext("name"), n.findtext("binding")) for n in node.findall("attribute")]
+
+def is_geometry_binding(binding):
+    return binding is not None and (binding.startswith("com.vividsolutions.jts.geom.")
+                                    or binding.startswith("org.locationtech.jts.geom."))
+
 def key_value_pairs(node):
     if node is not None:
         return dict((entry.attrib['key'], entry.text) for entry in node.findall("entry"))
@@ -117,6 +125,24 @@ def write_string_list(name):
         builder.end(name)
     return write
 
+def write_attribute_list(name):
+    '''writes a list of attribute names, or of (name, binding) tuples'''
+    def write(builder, attributes):
+        builder.start(name, dict())
+        for attribute in attributes:
+            attname, binding = (attribute, None) if isinstance(attribute, basestring) else attribute
+            builder.start("attribute", dict())
+            builder.start("name", dict())
+            builder.data(attname)
+            builder.end("name")
+            if binding is not None:
+                builder.start("binding", dict())
+                builder.data(binding)
+                builder.end("binding")
+            builder.end("attribute")
+        builder.end(name)
+    return write
+
 def write_dict(name):
     def write(builder, pairs):
         builder.start(name, dict())
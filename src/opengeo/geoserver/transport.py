@@ -0,0 +1,172 @@
+'''
+Shared HTTP transport for the GeoServer REST, GWC and WPS clients of a catalog.
+
+All requests go through an adaptive concurrency limiter, so a large number of
+parallel operations (listing, publishing, deleting) cannot flood the server.
+Reads and writes are limited separately, since GeoServer serializes configuration
+writes anyway, and each limit grows and shrinks following an AIMD scheme
+(additive increase, multiplicative decrease). Both back off when the server answers
+that it is overloaded. Reads also back off when they are slow, but writes do not,
+since uploading and configuring a large layer can take long on an idle server.
+'''
+
+import logging
+import socket
+import threading
+import time
+from urlparse import urlparse
+import httplib2
+
+logger = logging.getLogger("gsconfig.transport")
+
+READ = "read"
+WRITE = "write"
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Responses that indicate that the server is saturated, as opposed to
+# a regular error caused by the request itself
+OVERLOAD_STATUS = (429, 502, 503, 504)
+
+
+class AdaptiveLimiter(object):
+    '''
+    An AIMD concurrency limit for a class of requests.
+
+    The limit grows by roughly one slot for each window of requests that
+    complete fast and without errors, and is multiplied by the backoff factor
+    when a request is slower than the latency threshold (unless it is None) or
+    signals that the server is overloaded. Decreases are applied at most once per
+    window, so a burst of slow responses caused by a single congestion event does
+    not collapse the limit
+    '''
+
+    def __init__(self, initial = 4, minimum = 1, maximum = 32,
+                 latencyThreshold = 5.0, backoff = 0.5):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latencyThreshold = latencyThreshold
+        self.backoff = backoff
+        self._limit = float(max(minimum, min(initial, maximum)))
+        self._inflight = 0
+        self._lastDecrease = 0
+        self._latency = None
+        self._condition = threading.Condition()
+        self.requests = 0
+        self.errors = 0
+        self.decreases = 0
+
+    @property
+    def limit(self):
+        return int(self._limit)
+
+    @property
+    def inflight(self):
+        return self._inflight
+
+    def acquire(self):
+        self._condition.acquire()
+        try:
+            while self._inflight >= int(self._limit):
+                self._condition.wait()
+            self._inflight += 1
+        finally:
+            self._condition.release()
+
+    def release(self, latency = None, overloaded = False):
+        '''
+        Frees the slot of a request. latency is None if the request got no response
+        (i.e. the connection failed), which does not change the limit
+        '''
+        self._condition.acquire()
+        try:
+            self._inflight -= 1
+            self._condition.notifyAll()
+            if latency is None:
+                return
+            self.requests += 1
+            if self._latency is None:
+                self._latency = latency
+            else:
+                self._latency = 0.8 * self._latency + 0.2 * latency
+            if overloaded:
+                self.errors += 1
+            slow = self.latencyThreshold is not None and latency > self.latencyThreshold
+            if overloaded or slow:
+                now = time.time()
+                if now - self._lastDecrease > max(self._latency, latency):
+                    self._limit = max(self.minimum, self._limit * self.backoff)
+                    self._lastDecrease = now
+                    self.decreases += 1
+            else:
+                self._limit = min(self.maximum, self._limit + 1.0 / self._limit)
+        finally:
+            self._condition.release()
+
+    def stats(self):
+        return {"limit": self.limit,
+                "inflight": self._inflight,
+                "requests": self.requests,
+                "errors": self.errors,
+                "decreases": self.decreases,
+                "latency": self._latency}
+
+
+class Transport(object):
+    '''
+    A drop-in replacement for the httplib2.Http object used by the catalog and its
+    helper clients. It keeps an httplib2.Http instance per thread, since those are
+    not thread safe, and routes every request through the read or write limiter
+    '''
+
+    def __init__(self, url, username, password,
+                 disable_ssl_certificate_validation = False,
+                 maxReads = 16, maxWrites = 4):
+        self.url = url
+        self.username = username
+        self.password = password
+        self.disable_ssl_certificate_validation = disable_ssl_certificate_validation
+        self.limiters = {READ: AdaptiveLimiter(initial = min(4, maxReads), maximum = maxReads),
+                         WRITE: AdaptiveLimiter(initial = 1, maximum = maxWrites, latencyThreshold = None)}
+        self._local = threading.local()
+
+    def _http(self):
+        http = getattr(self._local, "http", None)
+        if http is None:
+            http = httplib2.Http(
+                disable_ssl_certificate_validation=self.disable_ssl_certificate_validation)
+            http.add_credentials(self.username, self.password)
+            netloc = urlparse(self.url).netloc
+            http.authorizations.append(
+                httplib2.BasicAuthentication(
+                    (self.username, self.password),
+                    netloc,
+                    self.url,
+                    {},
+                    None,
+                    None,
+                    http
+                ))
+            self._local.http = http
+        return http
+
+    def request(self, uri, method = "GET", body = None, headers = None, **kwargs):
+        requestClass = READ if method.upper() in READ_METHODS else WRITE
+        limiter = self.limiters[requestClass]
+        limiter.acquire()
+        start = time.time()
+        latency = None
+        overloaded = False
+        try:
+            response, content = self._http().request(uri, method, body, headers, **kwargs)
+            latency = time.time() - start
+            overloaded = response.status in OVERLOAD_STATUS
+            return response, content
+        except (socket.error, httplib2.HttpLib2Error), e:
+            logger.warning("%s request to %s failed: %s" % (method, uri, e))
+            raise
+        finally:
+            limiter.release(latency, overloaded)
+
+    def stats(self):
+        return dict((k, v.stats()) for k, v in self.limiters.iteritems())
@@ -0,0 +1,60 @@
+import threading
+from PyQt4 import QtCore
+from PyQt4.QtCore import QSettings
+
+class CatalogPoller(QtCore.QObject):
+    '''
+    Periodically checks the catalogs in the explorer for changes made by other clients.
+    Checks are run in a background thread and use revalidated listing requests,
+    so an unchanged catalog costs a handful of conditional requests.
+    The catalogChanged signal is emitted with the catalog and the names of the
+    listings that have changed
+    '''
+
+    catalogChanged = QtCore.pyqtSignal(object, list)
+
+    def __init__(self, catalogs):
+        QtCore.QObject.__init__(self)
+        self.catalogs = catalogs
+        self.digests = {}
+        self.running = False
+        self.timer = QtCore.QTimer(self)
+        self.timer.timeout.connect(self.poll)
+        self.updateInterval()
+
+    def updateInterval(self):
+        try:
+            interval = int(QSettings().value("/OpenGeo/Settings/GeoServer/CatalogPollInterval", 0))
+        except (TypeError, ValueError):
+            interval = 0
+        if interval > 0:
+            self.timer.start(interval * 1000)
+        else:
+            self.timer.stop()
+
+    def poll(self):
+        if self.running:
+            return
+        self.running = True
+        catalogs = list(self.catalogs().values())
+        thread = threading.Thread(target = self._check, args = (catalogs,))
+        thread.daemon = True
+        thread.start()
+
+    def _check(self, catalogs):
+        try:
+            for catalog in catalogs:
+                try:
+                    digests = catalog.get_listing_digests()
+                except Exception:
+                    #the catalog might be unavailable, we will try again in the next check
+                    continue
+                previous = self.digests.get(id(catalog))
+                self.digests[id(catalog)] = digests
+                if previous is not None:
+                    changed = [listing for listing, digest in digests.iteritems()
+                               if previous.get(listing) != digest]
+                    if changed:
+                        self.catalogChanged.emit(catalog, changed)
+        finally:
+            self.running = False
@@ -11,11 +11,11 @@ def _confirmationBox(title, msg):
     return ret == QtGui.QMessageBox.Yes         
     
     
-def publishLayer (catalog, layer, workspace=None, overwrite=True, name=None):
+def publishLayer (catalog, layer, workspace=None, overwrite=True, name=None, attributes=None):
     gslayer = catalog.catalog.get_layer(layer.name())
     if gslayer is None or _confirmationBox("Confirm overwrite", 
             "A layer named '%s' already exists in the catalog\nDo you want to overwrite it?" % layer.name()):
-        catalog.publishLayer(layer, workspace, overwrite, name)
+        catalog.publishLayer(layer, workspace, overwrite, name, attributes)
         
 def confirmDelete():
     askConfirmation = bool(QtCore.QSettings().value("/OpenGeo/Settings/General/ConfirmDelete", True, bool))
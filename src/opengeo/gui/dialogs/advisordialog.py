@@ -0,0 +1,81 @@
+from PyQt4 import QtGui, QtCore
+from opengeo.postgis import advisor
+
+
+class AdvisorDialog(QtGui.QDialog):
+    '''Shows the problems found in PostGIS tables, to select those to fix and when to do it'''
+
+    FIXES = {advisor.MISSING_SPATIAL_INDEX: "Create GiST index (concurrently)",
+             advisor.MISSING_PRIMARY_KEY: "Add serial primary key",
+             advisor.POORLY_CLUSTERED: "Cluster and analyze",
+             advisor.STALE_STATISTICS: "Analyze"}
+
+    CLUSTER_METHODS = [("Spatial index order", advisor.CLUSTER_INDEX),
+                       ("Geohash order", advisor.CLUSTER_GEOHASH)]
+
+    def __init__(self, issues, parent = None):
+        super(AdvisorDialog, self).__init__(parent)
+        self.issues = issues
+        self.selected = []
+        self.clusterMethod = advisor.CLUSTER_INDEX
+        self.runAt = None
+        self.ok = False
+        self.initGui()
+
+    def initGui(self):
+        self.setWindowTitle('PostGIS tables advisor')
+        layout = QtGui.QVBoxLayout()
+
+        self.issuesTree = QtGui.QTreeWidget()
+        self.issuesTree.setColumnCount(3)
+        self.issuesTree.setHeaderLabels(["Table", "Problem", "Fix"])
+        self.issuesTree.setRootIsDecorated(False)
+        for issue in self.issues:
+            item = QtGui.QTreeWidgetItem([issue.schema + "." + issue.table, issue.description,
+                                          self.FIXES[issue.kind]])
+            item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+            #adding a primary key rewrites the table, so it is not selected by default
+            checked = issue.kind != advisor.MISSING_PRIMARY_KEY
+            item.setCheckState(0, QtCore.Qt.Checked if checked else QtCore.Qt.Unchecked)
+            self.issuesTree.addTopLevelItem(item)
+        self.issuesTree.resizeColumnToContents(0)
+        self.issuesTree.resizeColumnToContents(1)
+        layout.addWidget(self.issuesTree)
+
+        formLayout = QtGui.QFormLayout()
+        self.clusterMethodBox = QtGui.QComboBox()
+        self.clusterMethodBox.addItems([name for name, method in self.CLUSTER_METHODS])
+        formLayout.addRow("Cluster tables in", self.clusterMethodBox)
+        scheduleLayout = QtGui.QHBoxLayout()
+        self.runNowRadio = QtGui.QRadioButton("Now")
+        self.runNowRadio.setChecked(True)
+        self.runAtRadio = QtGui.QRadioButton("At")
+        self.runAtBox = QtGui.QTimeEdit(QtCore.QTime(2, 0))
+        self.runAtBox.setEnabled(False)
+        self.runAtRadio.toggled.connect(self.runAtBox.setEnabled)
+        scheduleLayout.addWidget(self.runNowRadio)
+        scheduleLayout.addWidget(self.runAtRadio)
+        scheduleLayout.addWidget(self.runAtBox)
+        scheduleLayout.addStretch()
+        formLayout.addRow("Run fixes", scheduleLayout)
+        layout.addLayout(formLayout)
+
+        self.buttonBox = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.Ok | QtGui.QDialogButtonBox.Cancel)
+        layout.addWidget(self.buttonBox)
+        self.setLayout(layout)
+
+        self.buttonBox.accepted.connect(self.okPressed)
+        self.buttonBox.rejected.connect(self.cancelPressed)
+        self.resize(700, 400)
+
+    def okPressed(self):
+        self.selected = [issue for i, issue in enumerate(self.issues)
+                         if self.issuesTree.topLevelItem(i).checkState(0) == QtCore.Qt.Checked]
+        self.clusterMethod = self.CLUSTER_METHODS[self.clusterMethodBox.currentIndex()][1]
+        self.runAt = self.runAtBox.time() if self.runAtRadio.isChecked() else None
+        self.ok = True
+        self.close()
+
+    def cancelPressed(self):
+        self.ok = False
+        self.close()
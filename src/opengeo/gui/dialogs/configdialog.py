@@ -3,6 +3,7 @@ from PyQt4 import QtGui, QtCore
 from PyQt4.QtCore import *
 from PyQt4.QtGui import *
 from qgis.gui import QgsFilterLineEdit
+from opengeo.geoserver import pgprofiles
 
 
 class ConfigDialog(QDialog):
@@ -77,7 +78,13 @@ class ConfigDialog(QDialog):
                     ("UseRestApi", "Always use REST API for uploads", True),                    
                     ("DeleteStyle", "Delete style when deleting layer", True),
                     ("Recurse", "Delete resource when deleting layer", True),
-                    ("OverwriteGroupLayers", "Overwrite layers when uploading group", True)]
+                    ("OverwriteGroupLayers", "Overwrite layers when uploading group", True),
+                    ("CatalogPollInterval", "Check catalogs for changes every N seconds (0 to disable)", 0),
+                    ("PublishStyleAttributesOnly", "Publish only the attributes used by the layer style", True),
+                    ("StagingConnection", "Publish vector layers through this PostGIS connection (empty to upload shapefiles)", ""),
+                    ("StagingSchema", "Schema for layers published through PostGIS", "public"),
+                    ("PostGISStoreProfile", "Tuning profile for new PostGIS stores (%s)" % ", ".join(pgprofiles.profile_names()),
+                     pgprofiles.INTERACTIVE_WMS)]
         try:
             import processing.tools.dataobjects
             gsParams.extend([("PreuploadRasterHook", "Raster pre-upload hook file", ""),
@@ -88,6 +95,21 @@ class ConfigDialog(QDialog):
         gsItem = self._getItem("GeoServer", icon, gsParams)        
         self.tree.addTopLevelItem(gsItem)
 
+        pgParams = [("MaxConnections", "Maximum number of open connections per database", 10),
+                    ("IdleTimeout", "Close unused connections after N seconds", 300),
+                    ("PoolWaitTimeout", "Wait up to N seconds for a connection when all of them are in use", 10),
+                    ("ConnectTimeout", "Give up connecting to a database after N seconds", 10),
+                    ("ImportBatchSize", "Number of features committed at once when importing layers", 10000),
+                    ("ImportWorkers", "Number of connections used when importing layers in parallel", 4),
+                    ("MaintenanceWorkers", "Number of tables vacuumed or analyzed at the same time", 2),
+                    ("CountTimeout", "Cancel row counts after N seconds (0 to disable)", 60),
+                    ("QueryTimeout", "Cancel previews and query validations after N seconds (0 to disable)", 30),
+                    ("DdlTimeout", "Cancel deleting or renaming tables and schemas after N seconds (0 to disable)", 30),
+                    ("MaintenanceTimeout", "Cancel vacuuming, indexing or clustering a table after N seconds (0 to disable)", 0)]
+        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../../images/postgis.png")
+        pgItem = self._getItem("PostGIS", icon, pgParams)
+        self.tree.addTopLevelItem(pgItem)
+
         self.tree.setColumnWidth(0, 400)
 
     def _getItem(self, name, icon, params):
@@ -87,6 +87,10 @@ class ImportIntoPostGISDialog(QDialog):
 		self.horizontalLayout4.addWidget(self.addCheckBox)
 		self.singleGeomCheckBox = QCheckBox("Import as single geometries")
 		self.horizontalLayout4.addWidget(self.singleGeomCheckBox)
+		self.parallelCheckBox = QCheckBox("Load in parallel")
+		self.parallelCheckBox.setToolTip("Copy into the database over several connections at the same time, for large layers.\n"
+										 "The layer is still read by a single thread")
+		self.horizontalLayout4.addWidget(self.parallelCheckBox)
 		self.optionsGroupBox.setLayout(self.horizontalLayout4)
 		self.verticalLayout.addWidget(self.optionsGroupBox)   
 
@@ -148,6 +152,7 @@ class ImportIntoPostGISDialog(QDialog):
 			self.tablename = None	
 		self.add = self.addCheckBox.isChecked()
 		self.single = self.singleGeomCheckBox.isChecked()
+		self.parallel = self.parallelCheckBox.isChecked()
 		self.ok = True		
 		QDialog.accept(self)        
 		
@@ -3,11 +3,18 @@ from PyQt4 import QtGui, QtCore
 
 class PublishLayerDialog(QtGui.QDialog):
     
-    def __init__(self, catalogs, parent = None):
+    def __init__(self, catalogs, parent = None, fields = None, selected = None):
+        '''
+        If a list of field names is passed, the attributes to publish can be selected 
+        among them. Those in the selected list are initially checked (all if it is None)
+        '''
         super(PublishLayerDialog, self).__init__(parent)
         self.catalogs = catalogs            
         self.catalog = None
         self.workspace = None
+        self.fields = fields
+        self.selected = selected
+        self.attributes = None
         self.initGui()
         
         
@@ -55,8 +62,23 @@ class PublishLayerDialog(QtGui.QDialog):
         
         layout.addWidget(self.destGroupBox)
         
-        self.spacer = QtGui.QSpacerItem(20,40, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Expanding)
-        layout.addItem(self.spacer)
+        if self.fields is not None:
+            attributesLayout = QtGui.QVBoxLayout()
+            attributesLayout.setMargin(10)
+            self.attributesList = QtGui.QListWidget()
+            for field in self.fields:
+                item = QtGui.QListWidgetItem(field)
+                item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+                checked = self.selected is None or field in self.selected
+                item.setCheckState(QtCore.Qt.Checked if checked else QtCore.Qt.Unchecked)
+                self.attributesList.addItem(item)
+            attributesLayout.addWidget(self.attributesList)
+            attributesGroupBox = QtGui.QGroupBox("Attributes to publish")
+            attributesGroupBox.setLayout(attributesLayout)
+            layout.addWidget(attributesGroupBox)
+        else:
+            self.spacer = QtGui.QSpacerItem(20,40, QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Expanding)
+            layout.addItem(self.spacer)
                       
         self.buttonBox = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.Ok | QtGui.QDialogButtonBox.Cancel)                       
         layout.addWidget(self.buttonBox)
@@ -65,7 +87,7 @@ class PublishLayerDialog(QtGui.QDialog):
         self.buttonBox.accepted.connect(self.okPressed)
         self.buttonBox.rejected.connect(self.cancelPressed)
         
-        self.resize(400,160) 
+        self.resize(400, 160 if self.fields is None else 400) 
         
     def catalogHasChanged(self):
         catalog = self.catalogs[self.catalogBox.currentText()]
@@ -86,11 +108,15 @@ class PublishLayerDialog(QtGui.QDialog):
     def okPressed(self):                
         self.catalog = self.catalogs[self.catalogBox.currentText()]
         self.workspace = self.workspaces[self.workspaceBox.currentIndex()]
+        if self.fields is not None:
+            items = [self.attributesList.item(i) for i in xrange(self.attributesList.count())]
+            self.attributes = [unicode(item.text()) for item in items if item.checkState() == QtCore.Qt.Checked]
         self.close()
 
     def cancelPressed(self):
         self.catalog = None        
         self.workspace = None
+        self.attributes = None
         self.close()          
         
         
@@ -0,0 +1,55 @@
+from PyQt4 import QtGui
+from opengeo.postgis import maintenance
+
+
+class MaintenanceDialog(QtGui.QDialog):
+    '''Dialog to choose the maintenance to run on a set of PostGIS tables'''
+
+    OPERATIONS = [("Vacuum and analyze", maintenance.VACUUM_ANALYZE),
+                  ("Analyze only (refresh statistics)", maintenance.ANALYZE)]
+
+    def __init__(self, tableCount, parent = None):
+        super(MaintenanceDialog, self).__init__(parent)
+        self.tableCount = tableCount
+        self.operation = maintenance.VACUUM_ANALYZE
+        self.reindex = False
+        self.workers = maintenance.maintenanceWorkers()
+        self.ok = False
+        self.initGui()
+
+    def initGui(self):
+        self.setWindowTitle('Maintain PostGIS tables')
+        layout = QtGui.QVBoxLayout()
+        layout.addWidget(QtGui.QLabel("%i tables will be processed, those with more dead rows first"
+                                      % self.tableCount))
+        formLayout = QtGui.QFormLayout()
+        self.operationBox = QtGui.QComboBox()
+        self.operationBox.addItems([name for name, operation in self.OPERATIONS])
+        formLayout.addRow("Operation", self.operationBox)
+        self.reindexBox = QtGui.QCheckBox("Rebuild indexes (locks each table while it is reindexed)")
+        formLayout.addRow("", self.reindexBox)
+        self.workersBox = QtGui.QSpinBox()
+        self.workersBox.setMinimum(1)
+        self.workersBox.setMaximum(32)
+        self.workersBox.setValue(self.workers)
+        formLayout.addRow("Tables at the same time", self.workersBox)
+        layout.addLayout(formLayout)
+
+        self.buttonBox = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.Ok | QtGui.QDialogButtonBox.Cancel)
+        layout.addWidget(self.buttonBox)
+        self.setLayout(layout)
+
+        self.buttonBox.accepted.connect(self.okPressed)
+        self.buttonBox.rejected.connect(self.cancelPressed)
+        self.resize(400, 150)
+
+    def okPressed(self):
+        self.operation = self.OPERATIONS[self.operationBox.currentIndex()][1]
+        self.reindex = self.reindexBox.isChecked()
+        self.workers = self.workersBox.value()
+        self.ok = True
+        self.close()
+
+    def cancelPressed(self):
+        self.ok = False
+        self.close()
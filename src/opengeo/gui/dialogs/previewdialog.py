@@ -0,0 +1,192 @@
+from PyQt4 import QtGui, QtCore
+from opengeo.postgis import preview
+from opengeo.postgis.connection import statementTimeout, QUERY
+from opengeo.gui.worker import runInBackground
+
+# models of closed previews are kept here until their last fetch returns, so they can close its connection
+_closing = set()
+
+class PreviewModel(QtCore.QAbstractTableModel):
+    '''
+    Table model showing a page of rows of a TablePreview. Rows are fetched in the background
+    as the view scrolls down, and only the rows of the current page are kept
+    '''
+
+    pageLoaded = QtCore.pyqtSignal()
+    errorRaised = QtCore.pyqtSignal(object)
+
+    def __init__(self, tablePreview, parent = None):
+        QtCore.QAbstractTableModel.__init__(self, parent)
+        self.preview = tablePreview
+        self.rows = []
+        self.firstRow = 0
+        self.fetching = False
+        self.complete = True
+        self.closed = False
+        self.worker = None
+
+    def rowCount(self, parent = QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent = QtCore.QModelIndex()):
+        return 0 if parent.isValid() else len(self.preview.columns)
+
+    def data(self, index, role = QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        value = self.rows[index.row()][index.column()]
+        if role == QtCore.Qt.DisplayRole:
+            return "NULL" if value is None else unicode(value)
+        elif role == QtCore.Qt.ForegroundRole and value is None:
+            return QtGui.QBrush(QtCore.Qt.gray)
+        return None
+
+    def headerData(self, section, orientation, role = QtCore.Qt.DisplayRole):
+        if role != QtCore.Qt.DisplayRole:
+            return None
+        if orientation == QtCore.Qt.Horizontal:
+            return self.preview.columns[section]
+        return str(self.firstRow + section + 1)
+
+    def canFetchMore(self, parent = QtCore.QModelIndex()):
+        return not (parent.isValid() or self.complete or self.fetching or self.closed)
+
+    def fetchMore(self, parent = QtCore.QModelIndex()):
+        if self.canFetchMore(parent):
+            self._startFetching(self.preview.fetch)
+
+    def loadPage(self, after, firstRow):
+        '''Replaces the rows shown with those of the page following the row with the passed key'''
+        self.beginResetModel()
+        self.rows = []
+        self.firstRow = firstRow
+        self.complete = False
+        self.endResetModel()
+        def openAndFetch():
+            self.preview.openPage(after)
+            return self.preview.fetch()
+        self._startFetching(openAndFetch)
+
+    def _startFetching(self, func):
+        self.fetching = True
+        self.worker = runInBackground(func, self._rowsFetched, self._fetchFailed)
+
+    def _rowsFetched(self, rows):
+        self.fetching = False
+        if self.closed:
+            self._closePreview()
+            return
+        if rows:
+            self.beginInsertRows(QtCore.QModelIndex(), len(self.rows), len(self.rows) + len(rows) - 1)
+            self.rows.extend(rows)
+            self.endInsertRows()
+        if not rows or self.preview.remaining <= 0:
+            self.complete = True
+            self.pageLoaded.emit()
+
+    def _fetchFailed(self, trace):
+        self.fetching = False
+        self.complete = True
+        if self.closed:
+            self._closePreview()
+            return
+        self.errorRaised.emit(trace)
+
+    def close(self):
+        '''Cancels the query running, if any, and closes the connection used by the preview'''
+        if self.closed:
+            return
+        self.closed = True
+        if self.fetching:
+            # the connection is closed once the cancelled fetch returns
+            _closing.add(self)
+            self.preview.cancel()
+        else:
+            self.preview.close()
+
+    def _closePreview(self):
+        _closing.discard(self)
+        self.preview.close()
+
+
+class PreviewDialog(QtGui.QDialog):
+    '''Window showing the rows of a PostGIS table, a page at a time'''
+
+    def __init__(self, table, parent = None):
+        super(PreviewDialog, self).__init__(parent)
+        self.table = table
+        # the model has no parent, so it outlives the dialog if a fetch is still running when it is closed
+        self.model = PreviewModel(preview.TablePreview(table, timeout = statementTimeout(QUERY)))
+        # keys of the rows preceding each of the pages visited, to go back to them
+        self.pageKeys = [None]
+        self.initGui()
+        self.model.pageLoaded.connect(self.updateButtons)
+        self.model.errorRaised.connect(self.showError)
+        self.loadPage()
+
+    def initGui(self):
+        self.setWindowTitle("Preview of %s.%s" % (self.table.schema, self.table.name))
+        self.setAttribute(QtCore.Qt.WA_DeleteOnClose)
+        layout = QtGui.QVBoxLayout()
+        self.tableView = QtGui.QTableView()
+        self.tableView.setModel(self.model)
+        self.tableView.setEditTriggers(QtGui.QAbstractItemView.NoEditTriggers)
+        layout.addWidget(self.tableView)
+
+        buttonsLayout = QtGui.QHBoxLayout()
+        self.firstButton = QtGui.QPushButton("<< First")
+        self.firstButton.clicked.connect(self.firstPage)
+        self.previousButton = QtGui.QPushButton("< Previous")
+        self.previousButton.clicked.connect(self.previousPage)
+        self.nextButton = QtGui.QPushButton("Next >")
+        self.nextButton.clicked.connect(self.nextPage)
+        self.pageLabel = QtGui.QLabel()
+        buttonsLayout.addWidget(self.firstButton)
+        buttonsLayout.addWidget(self.previousButton)
+        buttonsLayout.addWidget(self.nextButton)
+        buttonsLayout.addStretch()
+        buttonsLayout.addWidget(self.pageLabel)
+        layout.addLayout(buttonsLayout)
+        if not self.model.preview.isKeyed():
+            self.firstButton.setVisible(False)
+            self.previousButton.setVisible(False)
+            self.pageLabel.setToolTip("The table has no primary key, so pages can only be read in order")
+        self.setLayout(layout)
+        self.resize(800, 500)
+
+    def loadPage(self):
+        for button in [self.firstButton, self.previousButton, self.nextButton]:
+            button.setEnabled(False)
+        page = len(self.pageKeys) - 1
+        self.pageLabel.setText("Page %i" % (page + 1))
+        self.model.loadPage(self.pageKeys[-1], page * self.model.preview.pageSize)
+
+    def updateButtons(self):
+        page = len(self.pageKeys) - 1
+        self.firstButton.setEnabled(page > 0)
+        self.previousButton.setEnabled(page > 0)
+        self.nextButton.setEnabled(len(self.model.rows) == self.model.preview.pageSize)
+        self.pageLabel.setText("Page %i, rows %i to %i" % (page + 1, self.model.firstRow + 1,
+                                                          self.model.firstRow + len(self.model.rows)))
+
+    def firstPage(self):
+        self.pageKeys = [None]
+        self.loadPage()
+
+    def previousPage(self):
+        self.pageKeys.pop()
+        self.loadPage()
+
+    def nextPage(self):
+        key = self.model.preview.key(self.model.rows[-1]) if self.model.preview.isKeyed() else None
+        self.pageKeys.append(key)
+        self.loadPage()
+
+    def showError(self, trace):
+        self.updateButtons()
+        QtGui.QMessageBox.warning(self, "Table preview", "Could not read the rows of the table:\n" + trace)
+
+    def reject(self):
+        # called as well when the window is closed
+        self.model.close()
+        QtGui.QDialog.reject(self)
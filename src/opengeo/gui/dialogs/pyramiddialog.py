@@ -0,0 +1,93 @@
+from PyQt4 import QtGui
+from opengeo.postgis import pyramid
+
+
+class PyramidDialog(QtGui.QDialog):
+    '''Dialog to set the tolerances of a pyramid of generalized tables, and where to publish it'''
+
+    METHODS = [("Simplify, preserving topology", pyramid.SIMPLIFY),
+               ("Snap to grid", pyramid.SNAP_TO_GRID)]
+
+    def __init__(self, catalogs, tolerances, parent = None):
+        super(PyramidDialog, self).__init__(parent)
+        self.catalogs = catalogs
+        self.tolerances = tolerances
+        self.method = pyramid.SIMPLIFY
+        self.catalog = None
+        self.workspace = None
+        self.workspaces = []
+        self.ok = False
+        self.initGui()
+
+    def initGui(self):
+        self.setWindowTitle('Create generalized pyramid')
+        layout = QtGui.QVBoxLayout()
+
+        formLayout = QtGui.QFormLayout()
+        self.tolerancesBox = QtGui.QLineEdit(", ".join("%g" % t for t in self.tolerances))
+        self.tolerancesBox.setToolTip("Comma-separated tolerances, in the units of the table CRS. "
+                                      "A generalized copy of the table is created for each of them")
+        formLayout.addRow("Tolerances", self.tolerancesBox)
+        self.methodBox = QtGui.QComboBox()
+        self.methodBox.addItems([name for name, method in self.METHODS])
+        formLayout.addRow("Method", self.methodBox)
+        layout.addLayout(formLayout)
+
+        self.publishGroupBox = QtGui.QGroupBox("Publish as pre-generalized layer")
+        self.publishGroupBox.setCheckable(True)
+        self.publishGroupBox.setChecked(bool(self.catalogs))
+        self.publishGroupBox.setEnabled(bool(self.catalogs))
+        formLayout = QtGui.QFormLayout()
+        self.catalogBox = QtGui.QComboBox()
+        self.catalogBox.addItems(self.catalogs.keys())
+        self.catalogBox.currentIndexChanged.connect(self.catalogHasChanged)
+        formLayout.addRow("Catalog", self.catalogBox)
+        self.workspaceBox = QtGui.QComboBox()
+        formLayout.addRow("Workspace", self.workspaceBox)
+        self.publishGroupBox.setLayout(formLayout)
+        layout.addWidget(self.publishGroupBox)
+        if self.catalogs:
+            self.catalogHasChanged()
+
+        self.buttonBox = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.Ok | QtGui.QDialogButtonBox.Cancel)
+        layout.addWidget(self.buttonBox)
+        self.setLayout(layout)
+
+        self.buttonBox.accepted.connect(self.okPressed)
+        self.buttonBox.rejected.connect(self.cancelPressed)
+        self.resize(400, 200)
+
+    def catalogHasChanged(self):
+        catalog = self.catalogs[self.catalogBox.currentText()]
+        self.workspaces = catalog.get_workspaces()
+        self.workspaceBox.clear()
+        try:
+            defaultWorkspace = catalog.get_default_workspace()
+            defaultWorkspace.fetch()
+            defaultName = defaultWorkspace.dom.find('name').text
+        except:
+            defaultName = None
+        workspaceNames = [w.name for w in self.workspaces]
+        self.workspaceBox.addItems(workspaceNames)
+        if defaultName is not None:
+            self.workspaceBox.setCurrentIndex(workspaceNames.index(defaultName))
+
+    def okPressed(self):
+        try:
+            tolerances = [float(t) for t in unicode(self.tolerancesBox.text()).split(",") if t.strip()]
+        except ValueError:
+            tolerances = []
+        if not tolerances or min(tolerances) <= 0:
+            QtGui.QMessageBox.warning(self, "Generalized pyramid", "Enter one or more positive tolerances")
+            return
+        self.tolerances = tolerances
+        self.method = self.METHODS[self.methodBox.currentIndex()][1]
+        if self.publishGroupBox.isChecked():
+            self.catalog = self.catalogs[self.catalogBox.currentText()]
+            self.workspace = self.workspaces[self.workspaceBox.currentIndex()]
+        self.ok = True
+        self.close()
+
+    def cancelPressed(self):
+        self.ok = False
+        self.close()
@@ -0,0 +1,179 @@
+from PyQt4 import QtGui, QtCore
+from opengeo.postgis import sqlview
+from opengeo.postgis.postgis_utils import DbError
+from opengeo.postgis.connection import statementTimeout, QUERY
+
+
+class PublishSqlViewDialog(QtGui.QDialog):
+    '''
+    Dialog to define a SQL view on a PostGIS schema and choose where to publish it.
+    The query is validated with EXPLAIN before the dialog can be accepted
+    '''
+
+    def __init__(self, catalogs, schema, parent = None):
+        super(PublishSqlViewDialog, self).__init__(parent)
+        self.catalogs = catalogs
+        self.schema = schema
+        self.catalog = None
+        self.workspace = None
+        self.name = None
+        self.sql = None
+        self.keyColumns = []
+        self.geomColumn = None
+        self.parameters = []
+        self.queryInfo = None
+        self.initGui()
+
+    def initGui(self):
+        self.setWindowTitle('Publish SQL view')
+        layout = QtGui.QVBoxLayout()
+
+        formLayout = QtGui.QFormLayout()
+        self.catalogBox = QtGui.QComboBox()
+        self.catalogBox.addItems(self.catalogs.keys())
+        self.catalogBox.currentIndexChanged.connect(self.catalogHasChanged)
+        formLayout.addRow("Catalog", self.catalogBox)
+        self.workspaceBox = QtGui.QComboBox()
+        formLayout.addRow("Workspace", self.workspaceBox)
+        self.nameBox = QtGui.QLineEdit()
+        formLayout.addRow("Layer name", self.nameBox)
+        layout.addLayout(formLayout)
+
+        self.sqlBox = QtGui.QPlainTextEdit()
+        self.sqlBox.setToolTip("Parameters are written as %name%, and replaced with the values in the viewparams of each request")
+        self.sqlBox.textChanged.connect(self.sqlHasChanged)
+        sqlLayout = QtGui.QVBoxLayout()
+        sqlLayout.addWidget(self.sqlBox)
+        sqlGroupBox = QtGui.QGroupBox("SQL query")
+        sqlGroupBox.setLayout(sqlLayout)
+        layout.addWidget(sqlGroupBox)
+
+        self.parametersTable = QtGui.QTableWidget(0, 3)
+        self.parametersTable.setHorizontalHeaderLabels(["Parameter", "Default value", "Validation regexp"])
+        self.parametersTable.horizontalHeader().setStretchLastSection(True)
+        self.parametersTable.verticalHeader().setVisible(False)
+        parametersLayout = QtGui.QVBoxLayout()
+        parametersLayout.addWidget(self.parametersTable)
+        parametersGroupBox = QtGui.QGroupBox("View parameters")
+        parametersGroupBox.setLayout(parametersLayout)
+        layout.addWidget(parametersGroupBox)
+
+        formLayout = QtGui.QFormLayout()
+        validateLayout = QtGui.QHBoxLayout()
+        self.validateButton = QtGui.QPushButton("Validate")
+        self.validateButton.clicked.connect(self.validate)
+        validateLayout.addWidget(self.validateButton)
+        self.validationLabel = QtGui.QLabel("Query not validated yet")
+        validateLayout.addWidget(self.validationLabel)
+        validateLayout.addStretch()
+        formLayout.addRow(validateLayout)
+        self.geomColumnBox = QtGui.QComboBox()
+        formLayout.addRow("Geometry column", self.geomColumnBox)
+        self.keyColumnsBox = QtGui.QLineEdit()
+        self.keyColumnsBox.setPlaceholderText("Comma-separated column names")
+        formLayout.addRow("Key columns", self.keyColumnsBox)
+        layout.addLayout(formLayout)
+
+        self.buttonBox = QtGui.QDialogButtonBox(QtGui.QDialogButtonBox.Ok | QtGui.QDialogButtonBox.Cancel)
+        layout.addWidget(self.buttonBox)
+        self.setLayout(layout)
+
+        self.buttonBox.accepted.connect(self.okPressed)
+        self.buttonBox.rejected.connect(self.cancelPressed)
+
+        self.catalogHasChanged()
+        self.resize(550, 600)
+
+    def catalogHasChanged(self):
+        catalog = self.catalogs[self.catalogBox.currentText()]
+        self.workspaces = catalog.get_workspaces()
+        self.workspaceBox.clear()
+        try:
+            defaultWorkspace = catalog.get_default_workspace()
+            defaultWorkspace.fetch()
+            defaultName = defaultWorkspace.dom.find('name').text
+        except:
+            defaultName = None
+        workspaceNames = [w.name for w in self.workspaces]
+        self.workspaceBox.addItems(workspaceNames)
+        if defaultName is not None:
+            self.workspaceBox.setCurrentIndex(workspaceNames.index(defaultName))
+
+    def sqlHasChanged(self):
+        self.queryInfo = None
+        self.validationLabel.setText("Query not validated yet")
+        self.validationLabel.setToolTip("")
+        current = dict((p[0], p[1:]) for p in self.tableParameters())
+        names = sqlview.viewParameters(self.sqlBox.toPlainText())
+        self.parametersTable.setRowCount(len(names))
+        for i, name in enumerate(names):
+            default, regexp = current.get(name, ("", ""))
+            nameItem = QtGui.QTableWidgetItem(name)
+            nameItem.setFlags(nameItem.flags() & ~QtCore.Qt.ItemIsEditable)
+            self.parametersTable.setItem(i, 0, nameItem)
+            self.parametersTable.setItem(i, 1, QtGui.QTableWidgetItem(default))
+            self.parametersTable.setItem(i, 2, QtGui.QTableWidgetItem(regexp))
+
+    def tableParameters(self):
+        parameters = []
+        for i in xrange(self.parametersTable.rowCount()):
+            texts = []
+            for j in xrange(3):
+                item = self.parametersTable.item(i, j)
+                texts.append(unicode(item.text()).strip() if item is not None else "")
+            parameters.append(tuple(texts))
+        return parameters
+
+    def validate(self):
+        sql = unicode(self.sqlBox.toPlainText()).strip().rstrip(";")
+        defaults = dict((name, default) for name, default, regexp in self.tableParameters())
+        QtGui.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.WaitCursor))
+        try:
+            geodb = self.schema.conn.geodb
+            with geodb.timeout(statementTimeout(QUERY)):
+                self.queryInfo = sqlview.validateQuery(geodb, sql, defaults)
+        except (DbError, ValueError), e:
+            self.queryInfo = None
+            QtGui.QApplication.restoreOverrideCursor()
+            self.validationLabel.setText("Query is not valid")
+            QtGui.QMessageBox.warning(self, "Invalid query", unicode(e))
+            return False
+        QtGui.QApplication.restoreOverrideCursor()
+        self.validationLabel.setText("Query is valid")
+        self.validationLabel.setToolTip("\n".join(self.queryInfo.plan))
+        current = self.geomColumnBox.currentText()
+        self.geomColumnBox.clear()
+        self.geomColumnBox.addItems(self.queryInfo.geomColumns + ["(No geometry)"])
+        index = self.geomColumnBox.findText(current)
+        if index != -1:
+            self.geomColumnBox.setCurrentIndex(index)
+        return True
+
+    def okPressed(self):
+        name = unicode(self.nameBox.text()).strip()
+        if not name:
+            QtGui.QMessageBox.warning(self, "Publish SQL view", "A name for the layer is needed")
+            return
+        #parameter values might have changed since the query was validated
+        if not self.validate():
+            return
+        columns = [c for c, datatype in self.queryInfo.columns]
+        keyColumns = [c.strip() for c in unicode(self.keyColumnsBox.text()).split(",") if c.strip()]
+        wrong = [c for c in keyColumns if c not in columns]
+        if wrong:
+            QtGui.QMessageBox.warning(self, "Publish SQL view", "The query does not return the key columns: " + ", ".join(wrong))
+            return
+        self.catalog = self.catalogs[self.catalogBox.currentText()]
+        self.workspace = self.workspaces[self.workspaceBox.currentIndex()]
+        self.name = name
+        self.sql = unicode(self.sqlBox.toPlainText()).strip().rstrip(";")
+        self.keyColumns = keyColumns
+        geomColumn = unicode(self.geomColumnBox.currentText())
+        self.geomColumn = geomColumn if geomColumn in self.queryInfo.geomColumns else None
+        self.parameters = self.tableParameters()
+        self.close()
+
+    def cancelPressed(self):
+        self.catalog = None
+        self.workspace = None
+        self.close()
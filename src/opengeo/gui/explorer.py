@@ -59,6 +59,10 @@ class OpenGeoExplorer(QtGui.QDockWidget):
         self.layout.setSpacing(2)
         self.layout.setMargin(0)                                               
         self.layout.addWidget(self.toolbar)
+        self.searchBox = QtGui.QLineEdit()
+        self.searchBox.setPlaceholderText("Search...")
+        self.searchBox.textChanged.connect(self.explorerWidget.filterItems)
+        self.layout.addWidget(self.searchBox)
         self.layout.addWidget(self.splitter)     
         self.dockWidgetContents.setLayout(self.layout)
         self.setWidget(self.dockWidgetContents)  
@@ -97,6 +101,7 @@ class OpenGeoExplorer(QtGui.QDockWidget):
     def refreshContent(self):
         showDescription = QSettings().value("/OpenGeo/Settings/General/ShowDescription", True, bool)  
         self.description.setVisible(showDescription)
+        invalidateDescriptions()
         self.explorerWidget.refreshContent()
         self.refreshDescription()
         
@@ -131,6 +136,8 @@ class OpenGeoExplorer(QtGui.QDockWidget):
             noerror = False
         finally:
             QtGui.QApplication.restoreOverrideCursor()
+            #the command might have modified any element
+            commandExecuted()
             self.refreshDescription()
                                
         return noerror
@@ -146,7 +153,8 @@ class OpenGeoExplorer(QtGui.QDockWidget):
         if self.progress is not None:
             self.progress.setValue(value)        
         
-    def setProgressMaximum(self, value, msg = ""):
+    def setProgressMaximum(self, value, msg = "", cancel = None):
+        '''Shows a progress bar in the message bar. If a cancel function is passed, a button to call it is added'''
         self.progressMaximum = value
         self.isProgressVisible = True
         self.progressMessageBar = config.iface.messageBar().createMessage(msg)
@@ -154,6 +162,11 @@ class OpenGeoExplorer(QtGui.QDockWidget):
         self.progress.setMaximum(self.progressMaximum)
         self.progress.setAlignment(Qt.AlignLeft|Qt.AlignVCenter)
         self.progressMessageBar.layout().addWidget(self.progress) 
+        if cancel is not None:
+            cancelButton = QtGui.QPushButton("Cancel")
+            cancelButton.clicked.connect(lambda: cancel())
+            cancelButton.clicked.connect(lambda: cancelButton.setEnabled(False))
+            self.progressMessageBar.layout().addWidget(cancelButton)
         config.iface.messageBar().pushWidget(self.progressMessageBar, QgsMessageBar.INFO)   
 
     def setInfo(self, msg):
@@ -1,7 +1,48 @@
+import weakref
 from opengeo.geoserver import util
+from opengeo.gui.worker import runInBackground
 from PyQt4 import QtGui, QtCore
 
+# description data already loaded, by element, along with the generation of the element
+# it was loaded for. Refreshed elements are new objects, so they do not use the data loaded
+# for the previous version of the element
+_descriptions = weakref.WeakKeyDictionary()
+
+# increased each time the explorer runs a command, for the items whose elements cannot
+# tell by themselves whether they might have changed
+_generation = 0
+
+def invalidateDescriptions(element = None):
+    '''
+    Discards the description data loaded for an element, or for all of them if no 
+    element is passed, so it is loaded again the next time it is shown
+    '''
+    if element is None:
+        _descriptions.clear()
+    else:
+        try:
+            _descriptions.pop(element, None)
+        except TypeError:
+            pass
+
+def commandExecuted():
+    '''
+    Outdates the description data of the items that do not have a generation of their own,
+    since a command run in the explorer might have modified their elements
+    '''
+    global _generation
+    _generation += 1
+
 class TreeItem(QtGui.QTreeWidgetItem): 
+
+    # names of the children of a lazy item that has not been populated yet, taken from data
+    # already fetched, so the item can be found by them with the search box before expanding it
+    unloadedNames = ()
+
+    # attributes taken from the fresh item when an item is kept in a refreshed subtree
+    # (see reconcileChildren). Anything else, such as workers or counters, stays as it was
+    stateAttributes = ("element", "unloadedNames")
+
     def __init__(self, element, icon = None, text = None): 
         QtGui.QTreeWidgetItem.__init__(self) 
         self.element = element    
@@ -13,13 +54,82 @@ class TreeItem(QtGui.QTreeWidgetItem):
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)               
             
     def refreshContent(self, explorer):
-        self.takeChildren()        
+        previous = children(self)
         if hasattr(self.element, "refresh"):
             self.element.refresh()
-        explorer.run(self.populate, None, [])                
+        if explorer.run(self.populate, None, []):
+            reconcileChildren(self, previous, explorer)
+        else:
+            discardNewChildren(self, previous)
        
+    def setLazy(self):
+        '''Marks the item as expandable, so it is populated when the user expands it'''
+        self.setChildIndicatorPolicy(QtGui.QTreeWidgetItem.ShowIndicator)
+
+    def isLazy(self):
+        return hasattr(self, "loadChildren")
+
+    def addLoadedChildren(self, data):
+        self.unloadedNames = ()
+        self.addChildren(self.childItems(data))
+        self.setChildIndicatorPolicy(QtGui.QTreeWidgetItem.DontShowIndicatorWhenChildless)
+
+    def populateInBackground(self, explorer):
+        '''
+        Populates the item without blocking the GUI, showing a placeholder child
+        while the content is fetched.
+        Items supporting this split their populate method in loadChildren, which
+        fetches the data needed and is run in a background thread, and childItems, 
+        which creates the child items from that data in the GUI thread.
+        If the item had already been populated, the loaded children are reconciled
+        with the current ones
+        '''
+        if getattr(self, "loading", False):
+            return
+        self.loading = True
+        def finished():
+            self.loading = False
+        def addLoaded(data):
+            previous = children(self)
+            self.addLoadedChildren(data)
+            reconcileChildren(self, previous, explorer)
+        self.worker = loadInBackground(self, self.loadChildren, addLoaded,
+                                       explorer, self.text(0), finished)
+
+    def key(self):
+        '''
+        Returns a key identifying the element that this item represents, used to match
+        items when a refreshed subtree is reconciled with the current one.
+        The href of the element is used if available, otherwise its name or the item text
+        '''
+        ident = None
+        if self.element is not None:
+            ident = getattr(self.element, "href", None)
+            if ident is None:
+                try:
+                    ident = util.name(self.element)
+                except ValueError:
+                    pass
+        if ident is None:
+            ident = unicode(self.text(0))
+        return (self.__class__.__name__, ident)
+
+    def searchText(self):
+        '''
+        Returns the text used to find this item with the search box of the explorer.
+        Only metadata that has already been fetched is used, so this never
+        issues any request
+        '''
+        texts = [unicode(self.text(0))]
+        try:
+            texts.append(util.name(self.element))
+        except ValueError:
+            pass
+        texts.extend(metadataTexts(self.element))
+        texts.extend(self.unloadedNames)
+        return " ".join(t for t in texts if t)
+
     def descriptionWidget(self, tree, explorer):                
-        text = self.getDescriptionHtml(tree, explorer)                
         class MyBrowser(QtGui.QTextBrowser):
             def loadResource(self, type, name):                
                 return None
@@ -28,11 +138,74 @@ class TreeItem(QtGui.QTreeWidgetItem):
         def linkClicked(url):
             self.linkClicked(tree, explorer, url)
         self.description.connect(self.description, QtCore.SIGNAL("anchorClicked(const QUrl&)"), linkClicked)
-        self.description.setHtml(text)   
+        self.showDescription(tree, explorer)
         return self.description 
+
+    def showDescription(self, tree, explorer, reload = False):
+        '''
+        Sets the description of the item in its description browser.
+        Items whose description needs data that is slow to get (i.e. it requires
+        requests to a server or a database) define a loadDescriptionData method,
+        which is run in a background thread, while a placeholder is shown.
+        The loaded data is kept in the descriptionData attribute, and memoized 
+        for the element of the item and its generation, unless the item sets 
+        cacheDescription to False. It is also passed to descriptionDataLoaded before
+        the description is rendered, so the item can update itself from it
+        '''
+        browser = self.description
+        if not hasattr(self, "loadDescriptionData"):
+            browser.setHtml(self.getDescriptionHtml(tree, explorer))
+            return
+        cache = getattr(self, "cacheDescription", True)
+        generation = self.descriptionGeneration()
+        if cache and not reload:
+            try:
+                memo = _descriptions.get(self.element)
+            except TypeError:
+                memo = None
+            if memo is not None and memo[0] == generation:
+                self.descriptionData = memo[1]
+                self.descriptionDataLoaded(memo[1])
+                browser.setHtml(self.getDescriptionHtml(tree, explorer))
+                return
+        browser.setHtml(self.getDescriptionHeaderHtml("<p><i>Loading description...</i></p>"))
+        element = self.element
+        def loaded(data):
+            if cache:
+                try:
+                    _descriptions[element] = (generation, data)
+                except TypeError:
+                    pass
+            if self.element is element:
+                self.descriptionDataLoaded(data)
+            #the user might have selected a different item in the meantime
+            if self.description is browser and self.element is element:
+                self.descriptionData = data
+                try:
+                    browser.setHtml(self.getDescriptionHtml(tree, explorer))
+                except Exception, e:
+                    browser.setHtml(self.getDescriptionHeaderHtml("<p>Cannot show description: %s</p>" % unicode(e)))
+        def failed(trace):
+            if self.description is browser:
+                browser.setHtml(self.getDescriptionHeaderHtml("<p>Cannot load description:</p><pre>%s</pre>" % trace))
+        self.descriptionWorker = runInBackground(self.loadDescriptionData, loaded, failed)
     
+    def descriptionDataLoaded(self, data):
+        '''Called with the description data of the element of the item, once it is available'''
+        pass
+
+    def descriptionGeneration(self):
+        '''
+        Returns a value that changes whenever the element of the item might have changed,
+        so its memoized description data is loaded again. Items whose elements belong to a
+        catalog or a database that tracks its own modifications return its generation
+        '''
+        return _generation
+
     def getDescriptionHtml(self, tree, explorer):
-        html = self._getDescriptionHtml(tree, explorer)
+        return self.getDescriptionHeaderHtml(self._getDescriptionHtml(tree, explorer))
+
+    def getDescriptionHeaderHtml(self, html):
         img = ""
         if hasattr(self, "iconPath"):
             img = '<img src="' + self.iconPath() + '"/>'
@@ -98,4 +271,169 @@ class TreeItem(QtGui.QTreeWidgetItem):
             return toUpdate
             
     def acceptDroppedUris(self, tree, explorer, uris):
-        return []
\ No newline at end of file
+        return []
+
+def metadataTexts(element):
+    '''Returns the title, abstract and keywords of an element, if its description has been fetched'''
+    if getattr(element, "dom", None) is None:
+        return []
+    texts = []
+    for attr in ["title", "abstract"]:
+        try:
+            value = getattr(element, attr, None)
+        except Exception:
+            value = None
+        if isinstance(value, basestring):
+            texts.append(value)
+    try:
+        keywords = getattr(element, "keywords", None) or []
+    except Exception:
+        keywords = []
+    texts.extend(k for k in keywords if isinstance(k, basestring))
+    return texts
+
+def loadInBackground(parent, load, addLoaded, explorer, name, finished = None):
+    '''
+    Runs load in a background thread and passes its result to addLoaded in the GUI thread,
+    showing a placeholder child of parent while the data is fetched. The parent can be an
+    item or the invisible root item of a tree. finished, if passed, is called once loading
+    ends, whether it succeeded or not
+    '''
+    placeholder = QtGui.QTreeWidgetItem()
+    placeholder.setText(0, "Loading...")
+    placeholder.setFlags(QtCore.Qt.NoItemFlags)
+    parent.addChild(placeholder)
+    def loaded(data):
+        if finished is not None:
+            finished()
+        parent.removeChild(placeholder)
+        try:
+            addLoaded(data)
+        except Exception, e:
+            explorer.setError("Could not populate '%s':\n%s" % (name, unicode(e)))
+    def failed(trace):
+        if finished is not None:
+            finished()
+        parent.removeChild(placeholder)
+        explorer.setError("Could not populate '%s':\n%s" % (name, trace))
+    return runInBackground(load, loaded, failed)
+
+def children(item):
+    return [item.child(i) for i in range(item.childCount())]
+
+def itemKey(item):
+    if isinstance(item, TreeItem):
+        return item.key()
+    else:
+        return (item.__class__.__name__, unicode(item.text(0)))
+
+def itemHash(item):
+    '''Returns a hash of the visible content of a tree item'''
+    return hash((unicode(item.text(0)), unicode(item.toolTip(0)),
+                 item.icon(0).cacheKey(), int(item.flags())))
+
+def expandedItems(item):
+    expanded = []
+    for child in children(item):
+        if child.isExpanded():
+            expanded.append(child)
+        expanded.extend(expandedItems(child))
+    return expanded
+
+def discardNewChildren(parent, previous):
+    previousIds = set(id(child) for child in previous)
+    for child in children(parent):
+        if id(child) not in previousIds:
+            parent.removeChild(child)
+
+def reconcileChildren(parent, previous, explorer = None):
+    '''
+    Reconciles the children of an item after it has been repopulated.
+
+    'previous' is the list of children that the item had before calling its populate
+    method, which adds the fresh ones. Each fresh item is matched with a previous one
+    representing the same element. In that case the previous item is kept, so its
+    expansion and selection state are preserved, and it is updated only if its
+    content has changed. Previous items with no fresh counterpart are removed and
+    fresh items with no previous counterpart are inserted.
+    The same procedure is applied recursively to the children of matched items.
+    Matched items that had been populated but whose fresh counterpart is lazy and has
+    not been populated yet are repopulated in the background if they are expanded and
+    an explorer is passed, or emptied so they are populated when expanded otherwise.
+    '''
+    previousIds = set(id(child) for child in previous)
+    fresh = [child for child in children(parent) if id(child) not in previousIds]
+    available = {}
+    for child in previous:
+        available.setdefault(itemKey(child), []).append(child)
+    matched = []
+    target = []
+    replaced = {}
+    for child in fresh:
+        candidates = available.get(itemKey(child))
+        if candidates:
+            old = candidates.pop(0)
+            matched.append((old, child))
+            replaced[id(child)] = old
+            target.append(old)
+        else:
+            target.append(child)
+    for child in fresh:
+        parent.removeChild(child)
+    for candidates in available.values():
+        for child in candidates:
+            parent.removeChild(child)
+    for i, child in enumerate(target):
+        if parent.child(i) is child:
+            continue
+        if parent.indexOfChild(child) != -1:
+            #a kept item that has changed its position
+            expanded = [child] if child.isExpanded() else []
+            expanded.extend(expandedItems(child))
+            parent.removeChild(child)
+            parent.insertChild(i, child)
+            for item in expanded:
+                item.setExpanded(True)
+        else:
+            parent.insertChild(i, child)
+    for old, new in matched:
+        _updateItem(old, new, explorer)
+    _redirectReferences(parent, replaced)
+    return target
+
+def _updateItem(old, new, explorer):
+    if itemHash(old) != itemHash(new):
+        old.setText(0, new.text(0))
+        old.setToolTip(0, new.toolTip(0))
+        old.setIcon(0, new.icon(0))
+        old.setFlags(new.flags())
+    for name in getattr(new, "stateAttributes", ()):
+        if name in new.__dict__:
+            setattr(old, name, new.__dict__[name])
+        else:
+            #the fresh item uses the class default
+            old.__dict__.pop(name, None)
+    if hasattr(new, "element"):
+        old.setData(0, QtCore.Qt.UserRole, new.element)
+    previous = children(old)
+    if previous and not new.childCount() and isinstance(new, TreeItem) and new.isLazy():
+        #the fresh item has not been populated yet, but the current one had been
+        if old.isExpanded() and explorer is not None:
+            old.populateInBackground(explorer)
+        else:
+            old.takeChildren()
+            old.setLazy()
+        return
+    old.addChildren(new.takeChildren())
+    reconcileChildren(old, previous, explorer)
+
+def _redirectReferences(item, replaced):
+    '''
+    Items keep references to some of their children (i.e. catalog items and their
+    containers). Make those point to the kept items instead of the discarded ones
+    '''
+    if not replaced:
+        return
+    for name, value in item.__dict__.items():
+        if isinstance(value, QtGui.QTreeWidgetItem) and id(value) in replaced:
+            setattr(item, name, replaced[id(value)])
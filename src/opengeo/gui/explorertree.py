@@ -3,6 +3,30 @@ from qgis.core import *
 from opengeo.gui.gsexploreritems import *
 from opengeo.gui.qgsexploreritems import *
 from opengeo.qgis import uri as uri_utils
+from opengeo.gui.icons import getIcon
+from opengeo.gui.search import SearchIndex
+
+
+def elementKey(element):
+    '''
+    Returns the key used to find the items representing a given element in the tree.
+    Named elements are identified by their class, catalog (or database connection),
+    workspace (or schema) and name, so elements with the same name in different
+    catalogs or workspaces are not mixed
+    '''
+    if hasattr(element, 'name'):
+        container = getattr(element, 'catalog', getattr(element, 'conn', None))
+        namespace = getattr(element, 'workspace', getattr(element, 'schema', None))
+        namespace = getattr(namespace, 'name', namespace)
+        return (element.__class__, container, namespace, element.name)
+    else:
+        return element
+
+def subtree(item):
+    items = [item]
+    for i in range(item.childCount()):
+        items.extend(subtree(item.child(i)))
+    return items
 
 
 class ExplorerTreeWidget(QtGui.QTreeWidget):
@@ -13,6 +37,9 @@ class ExplorerTreeWidget(QtGui.QTreeWidget):
         self.setSelectionMode(QtGui.QAbstractItemView.ExtendedSelection)                    
         self.setColumnCount(1)            
         self.header().hide()
+        #all rows have the same height, so the view does not have to measure
+        #every item to lay out the tree, which matters for large catalogs
+        self.setUniformRowHeights(True)
         self.setContextMenuPolicy(Qt.CustomContextMenu)
         self.customContextMenuRequested.connect(self.showTreePopupMenu)
         self.itemExpanded.connect(self.treeItemExpanded)
@@ -25,6 +52,14 @@ class ExplorerTreeWidget(QtGui.QTreeWidget):
         self.catalogs = {}
         self.qgisItem = None
         self.lastClicked = None
+        self.itemsIndex = {}
+        self.searchIndex = SearchIndex()
+        self.searchQuery = ""
+        self.hiddenItems = set()
+        self.model().rowsInserted.connect(self.rowsInserted)
+        self.model().rowsAboutToBeRemoved.connect(self.rowsAboutToBeRemoved)
+        self.model().dataChanged.connect(self.itemDataChanged)
+        self.model().modelReset.connect(self.modelWasReset)
   
     def refreshContent(self):
         pass        
@@ -47,7 +82,7 @@ class ExplorerTreeWidget(QtGui.QTreeWidget):
         if len(items) == 1:
             actions = item.contextMenuActions(self, self.explorer)
             if (isinstance(item, TreeItem) and hasattr(item, 'populate')): 
-                icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/refresh.png")           
+                icon = getIcon("refresh.png")           
                 refreshAction = QtGui.QAction(icon, "Refresh", self.explorer)
                 refreshAction.triggered.connect(lambda: item.refreshContent(self.explorer))
                 actions.append(refreshAction) 
@@ -67,7 +102,10 @@ class ExplorerTreeWidget(QtGui.QTreeWidget):
         
     def treeItemExpanded(self, item):
         if item is not None and not item.childCount():            
-            item.refreshContent(self.explorer)      
+            if isinstance(item, TreeItem) and item.isLazy():
+                item.populateInBackground(self.explorer)
+            else:
+                item.refreshContent(self.explorer)      
     
     def showTreePopupMenu(self,point):
         allTypes = self.getSelectionTypes()                
@@ -102,7 +140,7 @@ class ExplorerTreeWidget(QtGui.QTreeWidget):
             return                  
         menu = QtGui.QMenu()
         if (isinstance(self.selectedItem, TreeItem) and hasattr(self.selectedItem, 'populate')):
-            refreshIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/refresh.png")               
+            refreshIcon = getIcon("refresh.png")               
             refreshAction = QtGui.QAction(refreshIcon, "Refresh", None)
             refreshAction.triggered.connect(lambda: self.selectedItem.refreshContent(self.explorer))
             menu.addAction(refreshAction) 
@@ -113,21 +151,159 @@ class ExplorerTreeWidget(QtGui.QTreeWidget):
         menu.exec_(point)
 
     def findAllItems(self, element):
+        key = elementKey(element)
+        try:
+            allItems = [item for item in self.itemsIndex.get(key, []) 
+                        if item.treeWidget() is self and elementKey(item.element) == key]
+        except TypeError:
+            allItems = []
+        if not allItems:
+            #the element of an item might have been replaced after adding it to the tree,
+            #so we check the whole tree before giving up
+            allItems = self._scanItems(key)
+        if not allItems:
+            allItems = [None] #Signal that the whole tree has to be updated
+        return allItems      
+
+    def _scanItems(self, key):
         allItems = []
         iterator = QtGui.QTreeWidgetItemIterator(self)
         value = iterator.value()
         while value:            
-            if hasattr(value, 'element'):
-                if hasattr(value.element, 'name') and hasattr(element, 'name'):                                    
-                    if  value.element.name == element.name and value.element.__class__ == element.__class__:
-                        allItems.append(value)
-                elif value.element == element:
-                    allItems.append(value)                
+            if hasattr(value, 'element') and elementKey(value.element) == key:
+                allItems.append(value)
+                self._indexItem(value)
             iterator += 1
             value = iterator.value()
-        if not allItems:
-            allItems = [None] #Signal that the whole tree has to be updated
-        return allItems      
+        return allItems
+
+    def _itemsAt(self, parent, first, last):
+        parentItem = self.itemFromIndex(parent) if parent.isValid() else self.invisibleRootItem()
+        if parentItem is None:
+            return []
+        return [parentItem.child(i) for i in range(first, last + 1)]
+
+    def _indexItem(self, item):
+        if not hasattr(item, 'element'):
+            return
+        try:
+            items = self.itemsIndex.setdefault(elementKey(item.element), [])
+        except TypeError:
+            #unhashable element, it will be found by scanning the tree
+            return
+        if item not in items:
+            items.append(item)
+
+    def _unindexItem(self, item):
+        if not hasattr(item, 'element'):
+            return
+        try:
+            key = elementKey(item.element)
+            items = self.itemsIndex.get(key, [])
+        except TypeError:
+            return
+        if item in items:
+            items.remove(item)
+            if not items:
+                del self.itemsIndex[key]
+
+    def rowsInserted(self, parent, first, last):
+        parentItem = self.itemFromIndex(parent) if parent.isValid() else None
+        if parentItem in self.searchIndex:
+            #a lazy item stops being found by the names of its children once they are added
+            self.searchIndex.add(parentItem, parentItem.searchText())
+        inserted = []
+        for item in self._itemsAt(parent, first, last):
+            for subitem in subtree(item):
+                self._indexItem(subitem)
+                if isinstance(subitem, TreeItem):
+                    self.searchIndex.add(subitem, subitem.searchText())
+                    inserted.append(subitem)
+        if self.searchQuery:
+            self._filterInserted(inserted)
+
+    def rowsAboutToBeRemoved(self, parent, first, last):
+        for item in self._itemsAt(parent, first, last):
+            for subitem in subtree(item):
+                self._unindexItem(subitem)
+                self.searchIndex.remove(subitem)
+                self.hiddenItems.discard(subitem)
+
+    def itemDataChanged(self, topLeft, bottomRight):
+        item = self.itemFromIndex(topLeft)
+        if item in self.searchIndex:
+            self.searchIndex.add(item, item.searchText())
+
+    def modelWasReset(self):
+        self.itemsIndex.clear()
+        self.searchIndex = SearchIndex()
+        self.hiddenItems.clear()
+
+    def filterItems(self, query):
+        '''
+        Shows only the items matching the passed query, along with their ancestors
+        and descendants, so they can be reached in the tree.
+        The search index contains the items that have already been loaded, along with the
+        names of the children of lazy items taken from the catalog listings and database
+        introspection already fetched. It is kept up to date as items are added, so no
+        request is made while filtering
+        '''
+        self.searchQuery = query.strip()
+        if not self.searchQuery:
+            toHide = set()
+        else:
+            matches = self.searchIndex.search(self.searchQuery)
+            visible = set()
+            for item in matches:
+                if item not in visible:
+                    visible.update(subtree(item))
+            for item in matches:
+                parent = item.parent()
+                while parent is not None and parent not in visible:
+                    visible.add(parent)
+                    parent = parent.parent()
+            toHide = set(self.searchIndex.documents) - visible
+        self._showAndHide(toHide)
+
+    def _filterInserted(self, items):
+        '''
+        Applies the current query to items just added to the tree, without checking again
+        the ones already in it, so populating items while searching does not get slower
+        as the tree grows
+        '''
+        query = self.searchQuery
+        visible = set()
+        for item in items:
+            if item not in visible and self.searchIndex.matches(item, query):
+                visible.update(subtree(item))
+                parent = item.parent()
+                while parent is not None and parent not in visible:
+                    visible.add(parent)
+                    if parent in self.hiddenItems:
+                        parent.setHidden(False)
+                        self.hiddenItems.discard(parent)
+                    parent = parent.parent()
+        for item in items:
+            if item in visible or item.isHidden():
+                continue
+            #children of an item matching the query are shown, as when filtering the whole tree
+            parent = item.parent()
+            while parent is not None and not self.searchIndex.matches(parent, query):
+                parent = parent.parent()
+            if parent is None:
+                item.setHidden(True)
+                self.hiddenItems.add(item)
+
+    def _showAndHide(self, toHide):
+        for item in self.hiddenItems - toHide:
+            item.setHidden(False)
+        #items hidden for other reasons are left untouched, and not shown again later
+        hidden = self.hiddenItems & toHide
+        for item in toHide - self.hiddenItems:
+            if not item.isHidden():
+                item.setHidden(True)
+                hidden.add(item)
+        self.hiddenItems = hidden
     
 
                     
@@ -1,4 +1,3 @@
-import os
 from PyQt4 import QtGui
 from PyQt4.QtCore import *
 from opengeo.gui.explorertree import ExplorerTreeWidget
@@ -6,6 +5,8 @@ from opengeo.gui.gsexploreritems import GsCatalogsItem
 from opengeo.gui.pgexploreritems import PgConnectionsItem
 from opengeo.gui.qgsexploreritems import QgsProjectItem
 from opengeo.gui.treepanels import GsTreePanel, QgsTreePanel, PgTreePanel
+from opengeo.gui.catalogpoller import CatalogPoller
+from opengeo.gui.icons import getIcon
 
 
 class ExplorerWidget(QtGui.QWidget):
@@ -26,6 +27,8 @@ class ExplorerWidget(QtGui.QWidget):
             verticalLayout.addWidget(self.tabbedPanel)                    
         self.setLayout(verticalLayout)
         self.fillData()
+        self.poller = CatalogPoller(self.catalogs)
+        self.poller.catalogChanged.connect(self.catalogChanged)
         
     def fillData(self):        
         if self.singletab:                                     
@@ -38,9 +41,9 @@ class ExplorerWidget(QtGui.QWidget):
             self.tree.addTopLevelItem(self.pgItem)                                
             self.tree.addTopLevelItem(self.qgsItem) 
         else:                                
-            gsIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/geoserver.png")
-            pgIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/postgis.png")
-            qgsIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/qgis.png") 
+            gsIcon = getIcon("geoserver.png")
+            pgIcon = getIcon("postgis.png")
+            qgsIcon = getIcon("qgis.png") 
             self.gsPanel = GsTreePanel(self.explorer) 
             self.qgsPanel = QgsTreePanel(self.explorer)
             self.pgPanel = PgTreePanel(self.explorer)
@@ -73,6 +76,13 @@ class ExplorerWidget(QtGui.QWidget):
         else:
             return self.tabbedPanel.currentWidget().tree       
 
+    def filterItems(self, text):
+        if self.singletab:
+            self.tree.filterItems(text)
+        else:
+            for panel in [self.gsPanel, self.pgPanel, self.qgsPanel]:
+                panel.tree.filterItems(text)
+
     def updateQgisContent(self):        
         if self.singletab:
             self.qgsItem.refreshContent(self.explorer)
@@ -81,6 +91,21 @@ class ExplorerWidget(QtGui.QWidget):
             
         
     def refreshContent(self):
+        self.poller.updateInterval()
         tree = self.currentTreeWidget()
         if tree is not None:
-            tree.refreshContent()
\ No newline at end of file
+            tree.refreshContent()
+
+    def catalogChanged(self, catalog, listings):
+        if self.singletab:
+            containers = {"workspaces": "workspacesItem", "layers": "layersItem",
+                          "layergroups": "groupsItem", "styles": "stylesItem"}
+            for item in self.tree.findAllItems(catalog):
+                if item is None:
+                    continue
+                for listing in listings:
+                    container = getattr(item, containers[listing], None)
+                    if container is not None:
+                        container.refreshContent(self.explorer)
+        elif getattr(self.gsPanel, "catalog", None) is catalog:
+            self.gsPanel.refreshContent()
\ No newline at end of file
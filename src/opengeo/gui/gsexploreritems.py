@@ -1,4 +1,5 @@
 import os
+import weakref
 from qgis.core import *
 from PyQt4 import QtGui,QtCore
 from PyQt4.QtCore import *
@@ -10,7 +11,7 @@ from opengeo.geoserver.style import Style
 from opengeo.geoserver.layer import Layer
 from dialogs.styledialog import AddStyleToLayerDialog, StyleFromLayerDialog
 from opengeo.qgis.catalog import OGCatalog
-from opengeo.gui.exploreritems import TreeItem
+from opengeo.gui.exploreritems import TreeItem, metadataTexts
 from dialogs.groupdialog import LayerGroupDialog
 from dialogs.workspacedialog import DefineWorkspaceDialog
 from opengeo.geoserver.layergroup import UnsavedLayerGroup
@@ -18,6 +19,7 @@ from opengeo.gui.qgsexploreritems import QgsLayerItem, QgsGroupItem,\
     QgsStyleItem
 from opengeo.geoserver.catalog import Catalog
 from opengeo.geoserver.catalog import FailedRequestError
+from opengeo.geoserver import pgprofiles
 from opengeo.gui.pgexploreritems import PgTableItem
 import traceback
 from opengeo.geoserver.wps import Wps
@@ -36,8 +38,23 @@ from opengeo.gui.gsoperations import publishDraggedGroup, publishDraggedLayer,\
     addDraggedUrisToWorkspace, publishDraggedTable, publishDraggedStyle,\
     addDraggedStyleToLayer, addDraggedLayerToGroup
 from opengeo.gui.confirm import confirmDelete
+from opengeo.gui.icons import getIcon
+
+# titles of the layers whose resource has been fetched, by catalog and layer name, along with the
+# generation of the catalog they were fetched at. Items created again for a layer (i.e. when its
+# catalog is refreshed) show its title while it is current, without fetching its resource
+_titles = weakref.WeakKeyDictionary()
 
 class GsTreeItem(TreeItem):
+
+    stateAttributes = TreeItem.stateAttributes + ("catalog",)
+
+    def descriptionGeneration(self):
+        catalog = getattr(self.element, "catalog", self.element)
+        generation = getattr(catalog, "generation", None)
+        if generation is None:
+            return TreeItem.descriptionGeneration(self)
+        return generation
     
     def parentCatalog(self):   
         if hasattr(self, 'catalog') and self.catalog is not None:
@@ -207,7 +224,7 @@ class GsTreeItem(TreeItem):
 class GsCatalogsItem(GsTreeItem):    
     def __init__(self): 
         self._catalogs = {}
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/geoserver.png")        
+        icon = getIcon("geoserver.png")        
         GsTreeItem.__init__(self, None, icon, "GeoServer catalogs") 
         settings = QSettings()
         saveCatalogs = bool(settings.value("/OpenGeo/Settings/GeoServer/SaveCatalogs", False, bool))  
@@ -228,7 +245,7 @@ class GsCatalogsItem(GsTreeItem):
            
 
     def contextMenuActions(self, tree, explorer):  
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")      
+        icon = getIcon("add.png")      
         createCatalogAction = QtGui.QAction(icon, "New catalog...", explorer)
         createCatalogAction.triggered.connect(lambda: self.addGeoServerCatalog(explorer))
         return [createCatalogAction]
@@ -266,25 +283,66 @@ class GsCatalogsItem(GsTreeItem):
                 
                                       
             
-class GsLayersItem(GsTreeItem): 
-    def __init__(self, catalog):
-        self.catalog = catalog 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer.png")
-        GsTreeItem.__init__(self, None, icon, "GeoServer Layers")
+class GsContainerItem(GsTreeItem):
+    '''
+    Base class for the items grouping elements of a given type in a catalog.
+    They are populated when expanded, and show the number of elements they contain.
+    The names of those elements can be taken from the catalog listings before populating
+    them, so the item shows their number and can be found by them with the search box
+    '''
+    stateAttributes = GsTreeItem.stateAttributes + ("label",)
+
+    def __init__(self, catalog, icon, label, names = None):
+        self.catalog = catalog
+        self.label = label
+        GsTreeItem.__init__(self, None, icon, label)
+        if names is not None:
+            self.unloadedNames = names
+            self.setCount(len(names))
+        else:
+            self.setCount(None)
+        self.setLazy()
+
+    def setCount(self, count):
+        if count is None:
+            self.setText(0, self.label)
+        else:
+            self.setText(0, "%s (%i)" % (self.label, count))
+
+    def key(self):
+        return (self.__class__.__name__,)
+
+    def populate(self):
+        self.addLoadedChildren(self.loadChildren())
+
+    def addLoadedChildren(self, data):
+        #when repopulating, the current children are still there until reconciled
+        previous = self.childCount()
+        GsTreeItem.addLoadedChildren(self, data)
+        self.setCount(self.childCount() - previous)
+
+
+class GsLayersItem(GsContainerItem): 
+    def __init__(self, catalog, names = None):
+        icon = getIcon("layer.png")
+        GsContainerItem.__init__(self, catalog, icon, "GeoServer Layers", names)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled) 
             
-    def populate(self):
-        layers = self.catalog.get_layers()
+    def loadChildren(self):
+        #layers are created from the names in the listing. Their descriptions and resources
+        #are only fetched when needed, so this is a single request however many layers there are
+        return self.catalog.get_layers()
+
+    def childItems(self, layers):
         items = {}
         for layer in layers:
             if layer.name in items:
                 items[layer.name].markAsDuplicated()
             else:
-                layerItem = GsLayerItem(layer)            
-                layerItem.populate()    
-                self.addChild(layerItem) 
+                layerItem = GsLayerItem(layer)
+                layerItem.setLazy()
                 items[layer.name] = layerItem
-        self.sortChildren(0, Qt.AscendingOrder)                  
+        return sorted(items.values(), key = lambda item: unicode(item.text(0)))
     
     def acceptDroppedItem(self, tree, explorer, item):                          
         if isinstance(item, QgsGroupItem):  
@@ -320,18 +378,21 @@ class GsLayersItem(GsTreeItem):
     def acceptDroppedUris(self, tree, explorer, uris):  
         return addDraggedUrisToWorkspace(uris, self.parentCatalog(), self.getDefaultWorkspace(), explorer, tree)           
                         
-class GsGroupsItem(GsTreeItem): 
-    def __init__(self, catalog):
-        self.catalog = catalog 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/group.gif")
-        GsTreeItem.__init__(self, None, icon, "GeoServer Groups")           
+class GsGroupsItem(GsContainerItem): 
+    def __init__(self, catalog, names = None):
+        icon = getIcon("group.gif")
+        GsContainerItem.__init__(self, catalog, icon, "GeoServer Groups", names)           
         
-    def populate(self):
-        groups = self.catalog.get_layergroups()
+    def loadChildren(self):
+        return self.catalog.get_layergroups()
+
+    def childItems(self, groups):
+        items = []
         for group in groups:
             groupItem = GsGroupItem(group)
-            groupItem.populate()                                
-            self.addChild(groupItem)    
+            groupItem.setLazy()
+            items.append(groupItem)
+        return items
             
     def acceptDroppedItem(self, tree, explorer, item):                    
         if isinstance(item, QgsGroupItem):                
@@ -347,7 +408,7 @@ class GsGroupsItem(GsTreeItem):
             return []  
     
     def contextMenuActions(self, tree, explorer): 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")           
+        icon = getIcon("add.png")           
         createGroupAction = QtGui.QAction(icon, "New group...", explorer)
         createGroupAction.triggered.connect(lambda: self.createGroup(explorer))
         return [createGroupAction]
@@ -363,26 +424,30 @@ class GsGroupsItem(GsTreeItem):
                      group)
      
         
-class GsWorkspacesItem(GsTreeItem): 
-    def __init__(self, catalog):
-        self.catalog = catalog 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/workspace.png")
-        GsTreeItem.__init__(self, None, icon, "GeoServer Workspaces")  
+class GsWorkspacesItem(GsContainerItem): 
+    def __init__(self, catalog, names = None):
+        icon = getIcon("workspace.png")
+        GsContainerItem.__init__(self, catalog, icon, "GeoServer Workspaces", names)  
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)        
     
-    def populate(self):
-        cat = self.parentCatalog()
+    def loadChildren(self):
+        cat = self.catalog
         try:
             defaultWorkspace = cat.get_default_workspace()
             defaultWorkspace.fetch()
             defaultName = defaultWorkspace.dom.find('name').text
         except:
             defaultName = None             
-        workspaces = cat.get_workspaces()
+        return defaultName, cat.get_workspaces()
+
+    def childItems(self, data):
+        defaultName, workspaces = data
+        items = []
         for workspace in workspaces:
             workspaceItem = GsWorkspaceItem(workspace, workspace.name == defaultName)
-            workspaceItem.populate()
-            self.addChild(workspaceItem) 
+            workspaceItem.setLazy()
+            items.append(workspaceItem)
+        return items
     
     def acceptDroppedItem(self, tree, explorer, item):
         if isinstance(item, QgsGroupItem):                
@@ -415,7 +480,7 @@ class GsWorkspacesItem(GsTreeItem):
         return addDraggedUrisToWorkspace(uris, self.parentCatalog(), self.getDefaultWorkspace(), explorer, tree)
                             
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")        
+        icon = getIcon("add.png")        
         createWorkspaceAction = QtGui.QAction(icon, "New workspace...", explorer)
         createWorkspaceAction.triggered.connect(lambda: self.createWorkspace(explorer))
         return [createWorkspaceAction]
@@ -429,18 +494,17 @@ class GsWorkspacesItem(GsTreeItem):
                     [self],
                     dlg.name, dlg.uri)
                  
-class GsStylesItem(GsTreeItem): 
-    def __init__(self, catalog):
-        self.catalog = catalog 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/style.png")
-        GsTreeItem.__init__(self, None, icon, "GeoServer Styles")
+class GsStylesItem(GsContainerItem): 
+    def __init__(self, catalog, names = None):
+        icon = getIcon("style.png")
+        GsContainerItem.__init__(self, catalog, icon, "GeoServer Styles", names)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled) 
                     
-    def populate(self):
-        styles = self.parentCatalog().get_styles()
-        for style in styles:
-            styleItem = GsStyleItem(style, False)                
-            self.addChild(styleItem)
+    def loadChildren(self):
+        return self.catalog.get_styles()
+
+    def childItems(self, styles):
+        return [GsStyleItem(style, False) for style in styles]
 
     def acceptDroppedItem(self, tree, explorer, item):
         if isinstance(item, QgsStyleItem):
@@ -456,10 +520,10 @@ class GsStylesItem(GsTreeItem):
             return []
         
     def contextMenuActions(self, tree, explorer):   
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")     
+        icon = getIcon("add.png")     
         createStyleFromLayerAction = QtGui.QAction(icon, "New style from QGIS layer...", explorer)
         createStyleFromLayerAction.triggered.connect(lambda: self.createStyleFromLayer(explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/clean.png")      
+        icon = getIcon("clean.png")      
         cleanAction = QtGui.QAction(icon, "Clean (remove unused styles)", explorer)
         cleanAction.triggered.connect(lambda: self.cleanStyles(explorer))
         consolidateStylesAction = QtGui.QAction(icon, "Consolidate styles", explorer)
@@ -488,37 +552,38 @@ class GsStylesItem(GsTreeItem):
 
 
 class GsCatalogItem(GsTreeItem): 
+
+    stateAttributes = GsTreeItem.stateAttributes + ("geonode", "isConnected", "workspacesItem", "layersItem",
+                                                   "groupsItem", "stylesItem", "gwcItem", "wpsItem", "settingsItem")
+
     def __init__(self, catalog, name, geonode): 
         self.catalog = catalog
         self.geonode = geonode
         self.isConnected = False
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/geoserver_gray.png")
+        icon = getIcon("geoserver_gray.png")
         GsTreeItem.__init__(self, catalog, icon, name) 
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled) 
+        self.setLazy()
                 
     def populate(self):
+        self.addLoadedChildren(self.loadChildren())
+
+    def loadChildren(self):
+        return self.catalog.get_listing_names()
+
+    def addLoadedChildren(self, names):
         self.isConnected = False        
-        self.workspacesItem = GsWorkspacesItem(self.catalog)                                      
-        self.workspacesItem.populate()
-        self.addChild(self.workspacesItem)
-        self.layersItem = GsLayersItem(self.catalog)                                      
-        self.addChild(self.layersItem)
-        self.layersItem.populate()
-        self.groupsItem = GsGroupsItem(self.catalog)                                    
-        self.addChild(self.groupsItem)
-        self.groupsItem.populate()
-        self.stylesItem = GsStylesItem(self.catalog)                        
-        self.addChild(self.stylesItem)
-        self.stylesItem.populate()      
+        self.workspacesItem = GsWorkspacesItem(self.catalog, names["workspaces"])                                      
+        self.layersItem = GsLayersItem(self.catalog, names["layers"])                                      
+        self.groupsItem = GsGroupsItem(self.catalog, names["layergroups"])                                    
+        self.stylesItem = GsStylesItem(self.catalog, names["styles"])                        
         self.gwcItem = GwcLayersItem(self.catalog)                        
-        self.addChild(self.gwcItem)
-        self.gwcItem.populate()        
         self.wpsItem = GsProcessesItem(self.catalog)                        
-        self.addChild(self.wpsItem)
-        self.wpsItem.populate()
         self.settingsItem = GsSettingsItem(self.catalog)                        
-        self.addChild(self.settingsItem)             
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/geoserver.png")
+        self.addChildren([self.workspacesItem, self.layersItem, self.groupsItem, self.stylesItem,
+                          self.gwcItem, self.wpsItem, self.settingsItem])             
+        self.setChildIndicatorPolicy(QtGui.QTreeWidgetItem.DontShowIndicatorWhenChildless)
+        icon = getIcon("geoserver.png")
         self.setIcon(0, icon) 
         self.isConnected = True  
         self.parent()._catalogs[self.text(0)] = self.catalog                  
@@ -550,12 +615,12 @@ class GsCatalogItem(GsTreeItem):
             return []       
         
     def contextMenuActions(self, tree, explorer):          
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")      
+        icon = getIcon("delete.gif")      
         removeCatalogAction = QtGui.QAction(icon, "Remove", explorer)
         removeCatalogAction.triggered.connect(lambda: self.removeCatalog(explorer))
         actions = [removeCatalogAction]            
         if self.isConnected:
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/clean.png")      
+            icon = getIcon("clean.png")      
             cleanAction = QtGui.QAction(icon, "Clean (remove unused elements)", explorer)
             cleanAction.triggered.connect(lambda: self.cleanCatalog(explorer))
             actions.append(cleanAction)
@@ -579,9 +644,20 @@ class GsCatalogItem(GsTreeItem):
         explorer.setToolbarActions([])
          
         
+    def loadDescriptionData(self):
+        if self.isConnected:
+            return self.catalog.about()
+
     def _getDescriptionHtml(self, tree, explorer):                        
         if self.isConnected:            
-            return self.catalog.about()
+            html = self.descriptionData or ""
+            html += '<p><h3><b>Concurrent requests</b></h3></p><ul>'
+            for requestClass, stats in sorted(self.catalog.stats().iteritems()):
+                html += ('<li><b>%s: </b>limit %i, %i in progress, %i completed, %i failed</li>\n' 
+                         % (requestClass.capitalize(), stats["limit"], stats["inflight"], 
+                            stats["requests"], stats["errors"]))
+            html += '</ul>'
+            return html
         else:
             html = ('<p>You are not connected to this catalog.' 
                     '<a href="refresh">Refresh</a> to connect to it and populate the catalog item</p>')     
@@ -599,25 +675,64 @@ class GsCatalogItem(GsTreeItem):
            
                                 
 class GsLayerItem(GsTreeItem): 
-    def __init__(self, layer):
+    '''
+    Item representing a layer. It shows its title if it is already known, otherwise the name of
+    the layer until its resource is fetched, which happens when the item is expanded or its
+    description is shown
+    '''
+    stateAttributes = GsTreeItem.stateAttributes + ("isDuplicated", "resource")
+
+    def __init__(self, layer, resource = None):
         self.catalog = layer.catalog 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer.png")
-        GsTreeItem.__init__(self, layer, icon, layer.resource.title)  
+        icon = getIcon("layer.png")
+        GsTreeItem.__init__(self, layer, icon)  
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable 
                       | QtCore.Qt.ItemIsDropEnabled | QtCore.Qt.ItemIsDragEnabled)
         self.isDuplicated = False       
+        self.resource = None
+        if resource is not None:
+            self.setResource(resource)
+        else:
+            known = _titles.get(layer.catalog, {}).get(layer.name)
+            if known is not None and known[0] == layer.catalog.generation and known[1]:
+                self.setText(0, known[1])
+
+    def setResource(self, resource):
+        '''Sets the resource of the layer, once fetched, and shows its title'''
+        self.resource = resource
+        catalog = self.element.catalog
+        _titles.setdefault(catalog, {})[self.element.name] = (catalog.generation, resource.title)
+        if resource.title:
+            self.setText(0, resource.title)
+
+    def descriptionDataLoaded(self, resource):
+        self.setResource(resource)
+
+    def searchText(self):
+        texts = [GsTreeItem.searchText(self)]
+        if self.resource is not None:
+            texts.extend(metadataTexts(self.resource))
+        return " ".join(texts)
                 
     def populate(self):
+        self.addLoadedChildren(self.loadChildren())
+
+    def loadChildren(self):
         layer = self.element
-        for style in layer.styles:
-            styleItem = GsStyleItem(style, False)
-            self.addChild(styleItem)
-        if layer.default_style is not None:
-            styleItem = GsStyleItem(layer.default_style, True)                    
-            self.addChild(styleItem)
+        resource = layer.resource
+        resource.fetch()
+        return layer.styles, layer.default_style, resource
+
+    def childItems(self, data):
+        styles, defaultStyle, resource = data
+        self.setResource(resource)
+        items = [GsStyleItem(style, False) for style in styles]
+        if defaultStyle is not None:
+            items.append(GsStyleItem(defaultStyle, True))
+        return items
             
     def markAsDuplicated(self):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/warning.png")
+        icon = getIcon("warning.png")
         self.setIcon(0, icon) 
         self.isDuplicated = True 
             
@@ -643,8 +758,14 @@ class GsLayerItem(GsTreeItem):
         else:
             return []
     
+    def loadDescriptionData(self):
+        resource = self.element.resource
+        resource.fetch()
+        return resource
+
     def _getDescriptionHtml(self, tree, explorer):  
-        wsname = self.element.resource.workspace.name
+        resource = self.descriptionData
+        wsname = resource.workspace.name
         html = ""
         if self.isDuplicated:
             iconPath = os.path.dirname(__file__) + "/../images/warning.png"
@@ -653,11 +774,11 @@ class GsLayerItem(GsTreeItem):
                 + 'This element represents the layer based on a datastore from the ' + wsname + ' workspace </p>')          
         html += '<p><h3><b>Properties</b></h3></p><ul>'
         html += '<li><b>Name: </b>' + unicode(self.element.name) + '</li>\n'
-        html += '<li><b>Title: </b>' + unicode(self.element.resource.title) + ' &nbsp;<a href="modify:title">Modify</a></li>\n'     
-        html += '<li><b>Abstract: </b>' + unicode(self.element.resource.abstract) + ' &nbsp;<a href="modify:abstract">Modify</a></li>\n'
-        html += ('<li><b>SRS: </b>' + str(self.element.resource.projection) + ' &nbsp;<a href="modify:srs">Modify</a></li>\n')
+        html += '<li><b>Title: </b>' + unicode(resource.title) + ' &nbsp;<a href="modify:title">Modify</a></li>\n'     
+        html += '<li><b>Abstract: </b>' + unicode(resource.abstract) + ' &nbsp;<a href="modify:abstract">Modify</a></li>\n'
+        html += ('<li><b>SRS: </b>' + str(resource.projection) + ' &nbsp;<a href="modify:srs">Modify</a></li>\n')
         html += ('<li><b>Datastore workspace: </b>' + wsname + ' </li>\n')            
-        bbox = self.element.resource.latlon_bbox
+        bbox = resource.latlon_bbox
         if bbox is not None:                    
             html += '<li><b>Bounding box (lat/lon): </b></li>\n<ul>'
             html += '<li> N:' + str(bbox[3]) + '</li>'
@@ -707,45 +828,45 @@ class GsLayerItem(GsTreeItem):
             layers = self.parent().element.layers
             count = len(layers)
             idx = layers.index(self.element.name)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+            icon = getIcon("delete.gif")
             removeLayerFromGroupAction = QtGui.QAction(icon, "Remove layer from group", explorer)            
             removeLayerFromGroupAction.setEnabled(count > 1)
             removeLayerFromGroupAction.triggered.connect(lambda: self.removeLayerFromGroup(explorer))
             actions.append(removeLayerFromGroupAction)      
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/up.png")                                          
+            icon = getIcon("up.png")                                          
             moveLayerUpInGroupAction = QtGui.QAction(icon, "Move up", explorer)            
             moveLayerUpInGroupAction.setEnabled(count > 1 and idx > 0)
             moveLayerUpInGroupAction.triggered.connect(lambda: self.moveLayerUpInGroup(explorer))
             actions.append(moveLayerUpInGroupAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/down.png")
+            icon = getIcon("down.png")
             moveLayerDownInGroupAction = QtGui.QAction(icon, "Move down", explorer)            
             moveLayerDownInGroupAction.setEnabled(count > 1 and idx < count - 1)
             moveLayerDownInGroupAction.triggered.connect(lambda: self.moveLayerDownInGroup(explorer))
             actions.append(moveLayerDownInGroupAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/top.png")
+            icon = getIcon("top.png")
             moveLayerToFrontInGroupAction = QtGui.QAction(icon, "Move to front", explorer)            
             moveLayerToFrontInGroupAction.setEnabled(count > 1 and idx > 0)
             moveLayerToFrontInGroupAction.triggered.connect(lambda: self.moveLayerToFrontInGroup(explorer))
             actions.append(moveLayerToFrontInGroupAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/bottom.png")
+            icon = getIcon("bottom.png")
             moveLayerToBackInGroupAction = QtGui.QAction(icon, "Move to back", explorer)            
             moveLayerToBackInGroupAction.setEnabled(count > 1 and idx < count - 1)
             moveLayerToBackInGroupAction.triggered.connect(lambda: self.moveLayerToBackInGroup(explorer))
             actions.append(moveLayerToBackInGroupAction)
         else:
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")
+            icon = getIcon("add.png")
             addStyleToLayerAction = QtGui.QAction(icon, "Add style to layer...", explorer)
             addStyleToLayerAction.triggered.connect(lambda: self.addStyleToLayer(explorer))                    
             actions.append(addStyleToLayerAction)   
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+            icon = getIcon("delete.gif")
             deleteLayerAction = QtGui.QAction(icon, "Delete", None)
             deleteLayerAction.triggered.connect(lambda: self.deleteLayer(tree, explorer))
             actions.append(deleteLayerAction)         
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/import_into_qgis.png")                       
+            icon = getIcon("import_into_qgis.png")                       
             addLayerAction = QtGui.QAction(icon, "Add to current QGIS project", explorer)
             addLayerAction.triggered.connect(lambda: self.addLayerToProject(explorer))
             actions.append(addLayerAction) 
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/geonode.png")                       
+            icon = getIcon("geonode.png")                       
             publishToGeonodeAction = QtGui.QAction(icon, "Publish to GeoNode", explorer)
             publishToGeonodeAction.triggered.connect(lambda: self.publishToGeonode(tree, explorer))
             actions.append(publishToGeonodeAction)  
@@ -753,10 +874,10 @@ class GsLayerItem(GsTreeItem):
         return actions
     
     def multipleSelectionContextMenuActions(self, tree, explorer, selected): 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")       
+        icon = getIcon("delete.gif")       
         deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
         deleteSelectedAction.triggered.connect(lambda: self.deleteElements(selected, tree, explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/group.gif")
+        icon = getIcon("group.gif")
         createGroupAction = QtGui.QAction(icon, "Create group...", explorer)
         createGroupAction.triggered.connect(lambda: self.createGroupFromLayers(selected, tree, explorer))        
         return [deleteSelectedAction, createGroupAction]
@@ -914,23 +1035,32 @@ class GsLayerItem(GsTreeItem):
 class GsGroupItem(GsTreeItem): 
     def __init__(self, group):
         self.catalog = group.catalog 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/group.gif")
+        icon = getIcon("group.gif")
         GsTreeItem.__init__(self, group, icon)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable 
                       | QtCore.Qt.ItemIsDropEnabled)  
         
     def populate(self):
+        self.addLoadedChildren(self.loadChildren())
+
+    def loadChildren(self):
+        #layers are taken from the listing of the catalog, which is cached, and
+        #their resources are only fetched when needed
         layers = self.element.catalog.get_layers()
         layersDict = {layer.name : layer for layer in layers}
         groupLayers = self.element.layers
         if groupLayers is None:
-            return
+            return []
+        data = []
         for layer in groupLayers:
             if layer is not None:
                 if ':' in layer:
                     layer = layer.split(':')[1]
-                layerItem = GsLayerItem(layersDict[layer])                          
-                self.addChild(layerItem)
+                data.append(layersDict[layer])
+        return data
+
+    def childItems(self, layers):
+        return [GsLayerItem(layer) for layer in layers]
             
             
     def acceptDroppedItem(self, tree, explorer, item):                        
@@ -944,16 +1074,16 @@ class GsGroupItem(GsTreeItem):
             return []           
             
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")
+        icon = getIcon("edit.png")
         editLayerGroupAction = QtGui.QAction(icon, "Edit...", explorer)
         editLayerGroupAction.triggered.connect(lambda: self.editLayerGroup(explorer))  
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")           
+        icon = getIcon("delete.gif")           
         deleteLayerGroupAction = QtGui.QAction(icon, "Delete", explorer)
         deleteLayerGroupAction.triggered.connect(lambda: self.deleteLayerGroup(tree, explorer))
         return [editLayerGroupAction, deleteLayerGroupAction]
        
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")        
+        icon = getIcon("delete.gif")        
         deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
         deleteSelectedAction.triggered.connect(lambda: self.deleteElements(selected, tree, explorer))
         return [deleteSelectedAction]
@@ -973,8 +1103,11 @@ class GsGroupItem(GsTreeItem):
 
 
 class GsStyleItem(GsTreeItem): 
+
+    stateAttributes = GsTreeItem.stateAttributes + ("isDefault",)
+
     def __init__(self, style, isDefault): 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/style.png")
+        icon = getIcon("style.png")
         name = style.name if not isDefault else style.name + " [default style]"
         GsTreeItem.__init__(self, style, icon, name)
         self.isDefault = isDefault     
@@ -984,30 +1117,30 @@ class GsStyleItem(GsTreeItem):
     def contextMenuActions(self, tree, explorer):   
         actions = []
         if isinstance(self.parent(), GsLayerItem):
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/default-style.png")
+            icon = getIcon("default-style.png")
             setAsDefaultStyleAction = QtGui.QAction(icon, "Set as default style", explorer)
             setAsDefaultStyleAction.triggered.connect(lambda: self.setAsDefaultStyle(tree, explorer))
             setAsDefaultStyleAction.setEnabled(not self.isDefault)
             actions.append(setAsDefaultStyleAction)  
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+            icon = getIcon("delete.gif")
             removeStyleFromLayerAction = QtGui.QAction(icon, "Remove style from layer", explorer)
             removeStyleFromLayerAction.triggered.connect(lambda: self.removeStyleFromLayer(tree, explorer))
             removeStyleFromLayerAction.setEnabled(not self.isDefault)                        
             actions.append(removeStyleFromLayerAction)                           
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")
+            icon = getIcon("edit.png")
             editStyleAction = QtGui.QAction(icon, "Edit...", explorer)
             editStyleAction.triggered.connect(lambda: self.editStyle(tree, explorer, self.parent().element))
             actions.append(editStyleAction)
         else:                      
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+            icon = getIcon("delete.gif")
             deleteStyleAction = QtGui.QAction(icon, "Delete", explorer)
             deleteStyleAction.triggered.connect(lambda: self.deleteStyle(tree, explorer))
             actions.append(deleteStyleAction)
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")
+            icon = getIcon("edit.png")
             editStyleAction = QtGui.QAction(icon, "Edit...", explorer)
             editStyleAction.triggered.connect(lambda: self.editStyle(tree, explorer))
             actions.append(editStyleAction) 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit_sld.png")
+        icon = getIcon("edit_sld.png")
         editSLDAction = QtGui.QAction(icon, "Edit SLD...", explorer)
         editSLDAction.triggered.connect(lambda: self.editSLD(tree, explorer))                    
         actions.append(editSLDAction)               
@@ -1031,7 +1164,7 @@ class GsStyleItem(GsTreeItem):
             return []            
     
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon("delete.gif")
         deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
         deleteSelectedAction.triggered.connect(lambda: self.deleteElements(selected, tree, explorer))
         return [deleteSelectedAction]
@@ -1100,20 +1233,30 @@ class GsStyleItem(GsTreeItem):
     
                       
 class GsWorkspaceItem(GsTreeItem): 
+
+    stateAttributes = GsTreeItem.stateAttributes + ("isDefault",)
+
     def __init__(self, workspace, isDefault):
         self.catalog = workspace.catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/workspace.png")                 
+        icon = getIcon("workspace.png")                 
         self.isDefault = isDefault        
         name = workspace.name if not isDefault else workspace.name + " [default workspace]"
         GsTreeItem.__init__(self, workspace, icon, name)    
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)  
         
     def populate(self):
-        stores = self.element.catalog.get_stores(self.element)
+        self.addLoadedChildren(self.loadChildren())
+
+    def loadChildren(self):
+        return self.element.catalog.get_stores(self.element)
+
+    def childItems(self, stores):
+        items = []
         for store in stores:
             storeItem = GsStoreItem(store)
-            storeItem.populate()
-            self.addChild(storeItem)         
+            storeItem.setLazy()
+            items.append(storeItem)
+        return items
                    
     def acceptDroppedItem(self, tree, explorer, item):                        
         if isinstance(item, QgsGroupItem):                
@@ -1143,14 +1286,14 @@ class GsWorkspaceItem(GsTreeItem):
                                     
                                      
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/default-workspace.png")
+        icon = getIcon("default-workspace.png")
         setAsDefaultAction = QtGui.QAction(icon, "Set as default workspace", explorer)
         setAsDefaultAction.triggered.connect(lambda: self.setAsDefaultWorkspace(explorer))
         setAsDefaultAction.setEnabled(not self.isDefault)    
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")                            
+        icon = getIcon("delete.gif")                            
         deleteWorkspaceAction = QtGui.QAction(icon, "Delete", explorer)
         deleteWorkspaceAction.triggered.connect(lambda: self.deleteWorkspace(tree, explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/clean.png")      
+        icon = getIcon("clean.png")      
         cleanAction = QtGui.QAction(icon, "Clean (remove unused resources)", explorer)
         cleanAction.triggered.connect(lambda: self.cleanWorkspace(explorer))
         return[setAsDefaultAction, deleteWorkspaceAction, cleanAction]
@@ -1160,7 +1303,7 @@ class GsWorkspaceItem(GsTreeItem):
         explorer.run(ogcat.cleanUnusedResources, "Clean (remove unused resources)", [self])
     
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon("delete.gif")
         deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
         deleteSelectedAction.triggered.connect(lambda: self.deleteElements(selected, tree, explorer))
         return [deleteSelectedAction]
@@ -1180,17 +1323,20 @@ class GsWorkspaceItem(GsTreeItem):
 class GsStoreItem(GsTreeItem): 
     def __init__(self, store):
         if isinstance(store, DataStore):
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer_polygon.png")
+            icon = getIcon("layer_polygon.png")
         else:
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/grid.jpg")             
+            icon = getIcon("grid.jpg")             
         GsTreeItem.__init__(self, store, icon)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)  
 
     def populate(self):   
-        resources = self.element.get_resources()
-        for resource in resources:
-            resourceItem = GsResourceItem(resource)                        
-            self.addChild(resourceItem)        
+        self.addLoadedChildren(self.loadChildren())
+
+    def loadChildren(self):
+        return self.element.get_resources()
+
+    def childItems(self, resources):
+        return [GsResourceItem(resource) for resource in resources]
 
     def acceptDroppedItem(self, tree, explorer, item):  
         if isinstance(item, QgsLayerItem):      
@@ -1202,13 +1348,31 @@ class GsStoreItem(GsTreeItem):
             return []      
     
     def contextMenuActions(self, tree, explorer): 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")       
+        icon = getIcon("delete.gif")       
         deleteStoreAction = QtGui.QAction(icon, "Delete", explorer)
         deleteStoreAction.triggered.connect(lambda: self.deleteStore(tree, explorer))
-        return[deleteStoreAction]
+        actions = [deleteStoreAction]
+        if pgprofiles.is_postgis_store(self.element):
+            profileAction = QtGui.QAction("Apply PostGIS tuning profile...", explorer)
+            profileAction.triggered.connect(lambda: self.applyPgProfile(explorer))
+            actions.append(profileAction)
+        return actions
+
+    def applyPgProfile(self, explorer):
+        profiles = pgprofiles.profile_names()
+        profile, ok = QtGui.QInputDialog.getItem(None, "PostGIS tuning profile", "Profile to apply to store '%s'" % self.element.name,
+                                                 profiles, profiles.index(pgprofiles.INTERACTIVE_WMS), False)
+        if ok:
+            explorer.run(self._applyPgProfile, "Apply PostGIS tuning profile to store '%s'" % self.element.name,
+                         [self], unicode(profile))
+
+    def _applyPgProfile(self, profile):
+        params = pgprofiles.apply_profile(self.element.connection_parameters, profile)
+        self.element.connection_parameters = params
+        self.element.catalog.save(self.element)
                 
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):   
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")     
+        icon = getIcon("delete.gif")     
         deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
         deleteSelectedAction.triggered.connect(lambda: self.deleteElements(selected, tree, explorer))
         return [deleteSelectedAction]
@@ -1219,9 +1383,9 @@ class GsStoreItem(GsTreeItem):
 class GsResourceItem(GsTreeItem): 
     def __init__(self, resource):  
         if isinstance(resource, Coverage):
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/grid.jpg")
+            icon = getIcon("grid.jpg")
         else:
-            icon = None#QtGui.QIcon(os.path.dirname(__file__) + "/../images/workspace.png")
+            icon = None#getIcon("workspace.png")
         GsTreeItem.__init__(self, resource, icon)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)  
 
@@ -1235,7 +1399,7 @@ class GsResourceItem(GsTreeItem):
             return []
     
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon("delete.gif")
         deleteResourceAction = QtGui.QAction(icon, "Delete", explorer)
         deleteResourceAction.triggered.connect(lambda: self.deleteResource(tree, explorer))
         return[deleteResourceAction]
@@ -1247,29 +1411,31 @@ class GsResourceItem(GsTreeItem):
             
 ########### WPS #####################
             
-class GsProcessesItem(GsTreeItem): 
+class GsProcessesItem(GsContainerItem): 
     def __init__(self, catalog):
-        self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/process.png")
-        GsTreeItem.__init__(self, None, icon, "WPS processes")                                    
+        icon = getIcon("process.png")
+        GsContainerItem.__init__(self, catalog, icon, "WPS processes")                                    
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
 
-    def populate(self):
-        self.element = Wps(self.catalog)        
+    def loadChildren(self):
+        wps = Wps(self.catalog)        
         try:
-            processes = self.element.processes()
+            processes = wps.processes()
         except:
             #the WPS extension might not be installed
             processes = []
-        for process in processes:
-            item = GsProcessItem(process)
-            self.addChild(item)
+        return wps, processes
+
+    def childItems(self, data):
+        wps, processes = data
+        self.element = wps
+        return [GsProcessItem(process) for process in processes]
             
 
 class GsProcessItem(GsTreeItem): 
     def __init__(self, process):
         #self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/process.png")
+        icon = getIcon("process.png")
         GsTreeItem.__init__(self, None, icon, process)                                    
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
             
@@ -1280,7 +1446,7 @@ class GsProcessItem(GsTreeItem):
 class GsSettingsItem(GsTreeItem): 
     def __init__(self, catalog):
         self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/config.png")
+        icon = getIcon("config.png")
         settings = Settings(self.catalog)
         GsTreeItem.__init__(self, settings, icon, "GeoServer Settings")                                    
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
@@ -1301,9 +1467,12 @@ class GsSettingItem(GsTreeItem):
 
 
 class GsGeonodesItem(GsTreeItem): 
+
+    stateAttributes = GsTreeItem.stateAttributes + ("geonode",)
+
     def __init__(self, geonode):
         self.geonode = geonode
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/geonode.png")
+        icon = getIcon("geonode.png")
         GsTreeItem.__init__(self, None, icon, "GeoNode")                                    
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable)
 
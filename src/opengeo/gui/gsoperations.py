@@ -2,7 +2,7 @@ from PyQt4 import QtGui,QtCore
 from PyQt4.QtCore import *
 from qgis.core import *            
 from opengeo.qgis import layers
-from opengeo.qgis.catalog import OGCatalog
+from opengeo.qgis.catalog import OGCatalog, pgStoreParams
 from opengeo.gui.confirm import publishLayer
 from opengeo.gui.qgsexploreritems import QgsStyleItem
             
@@ -65,7 +65,8 @@ def _publishTable(table, catalog = None, workspace = None):
                                    schema = table.schema,
                                    port = geodb.port,
                                    user = geodb.user,
-                                   passwd = geodb.passwd)
+                                   passwd = geodb.passwd,
+                                   connection_params = pgStoreParams())
     catalog.create_pg_featuretype(table.name, connection.name, workspace, "EPSG:" + str(table.srid))  
 
 def publishDraggedStyle(explorer, layerName, catalogItem):
@@ -5,6 +5,7 @@ from opengeo.geoserver.catalog import FailedRequestError
 from opengeo.gui.exploreritems import TreeItem
 import os
 from opengeo.gui.confirm import confirmDelete
+from opengeo.gui.icons import getIcon
 
 class GwcTreeItem(TreeItem):
     
@@ -12,19 +13,27 @@ class GwcTreeItem(TreeItem):
         return os.path.dirname(__file__) + "/../images/gwc.png"
                                              
 class GwcLayersItem(GwcTreeItem): 
+
+    stateAttributes = GwcTreeItem.stateAttributes + ("catalog",)
+
     def __init__(self, catalog):
         self.catalog = catalog
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/gwc.png")
+        icon = getIcon("gwc.png")
         TreeItem.__init__(self, None, icon, "GeoWebCache layers")                                    
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)
+        self.setLazy()
 
     def populate(self):
-        catalog = self.catalog
-        self.element = Gwc(catalog)        
-        layers = self.element.layers()
-        for layer in layers:
-            item = GwcLayerItem(layer)
-            self.addChild(item)
+        self.addLoadedChildren(self.loadChildren())
+
+    def loadChildren(self):
+        gwc = Gwc(self.catalog)
+        return gwc, gwc.layers()
+
+    def childItems(self, data):
+        gwc, layers = data
+        self.element = gwc
+        return [GwcLayerItem(layer) for layer in layers]
 
     def acceptDroppedItem(self, tree, explorer, item):  
         from opengeo.gui.gsexploreritems import GsLayerItem
@@ -35,7 +44,7 @@ class GwcLayersItem(GwcTreeItem):
             return []
     
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")
+        icon = getIcon("add.png")
         addGwcLayerAction = QtGui.QAction(icon, "New GWC layer...", explorer)
         addGwcLayerAction.triggered.connect(lambda: self.addGwcLayer(tree, explorer))
         return [addGwcLayerAction]        
@@ -64,21 +73,25 @@ class GwcLayersItem(GwcTreeItem):
           
                 
 class GwcLayerItem(GwcTreeItem): 
+
+    #the seeding state changes while tasks run, so it is always fetched again
+    cacheDescription = False
+
     def __init__(self, layer):          
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer.png")        
+        icon = getIcon("layer.png")        
         TreeItem.__init__(self, layer, icon)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)
         
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")
+        icon = getIcon("edit.png")
         editGwcLayerAction = QtGui.QAction(icon, "Edit...", explorer)
         editGwcLayerAction.triggered.connect(lambda: self.editGwcLayer(explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/seed.png")          
+        icon = getIcon("seed.png")          
         seedGwcLayerAction = QtGui.QAction(icon, "Seed...", explorer)
         seedGwcLayerAction.triggered.connect(lambda: self.seedGwcLayer(explorer))        
         emptyGwcLayerAction = QtGui.QAction("Empty", explorer)
         emptyGwcLayerAction.triggered.connect(lambda: self.emptyGwcLayer(explorer)) 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")                         
+        icon = getIcon("delete.gif")                         
         deleteLayerAction = QtGui.QAction(icon, "Delete", explorer)
         deleteLayerAction.triggered.connect(lambda: self.deleteLayer(explorer))
         return[editGwcLayerAction, seedGwcLayerAction, emptyGwcLayerAction, deleteLayerAction]
@@ -92,16 +105,24 @@ class GwcLayerItem(GwcTreeItem):
             return []
         
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon("delete.gif")
         deleteSelectedAction = QtGui.QAction(icon, "Delete", explorer)
         deleteSelectedAction.triggered.connect(lambda: self.deleteLayers(explorer, selected))
         return [deleteSelectedAction]
     
 
+    def loadDescriptionData(self):
+        try:
+            return self.element.getSeedingState()
+        except SeedingStatusParsingError, e:
+            return e
+
     def _getDescriptionHtml(self, tree, explorer):                                
         html = '<p><b>Seeding status</b></p>'     
         try:
-            state = self.element.getSeedingState()
+            state = self.descriptionData
+            if isinstance(state, SeedingStatusParsingError):
+                raise state
             if state is None:
                 html += "<p>No seeding tasks exist for this layer</p>"
             else:
@@ -127,8 +148,7 @@ class GwcLayerItem(GwcTreeItem):
                 #TODO:
                 return
         try:
-            text = self.getDescriptionHtml(tree, explorer)
-            self.description.setHtml(text)
+            self.showDescription(tree, explorer, True)
         except:
             explorer.setDescriptionWidget()
         
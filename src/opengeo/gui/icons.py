@@ -0,0 +1,25 @@
+import os
+from PyQt4 import QtGui
+
+_icons = {}
+
+def getIcon(name):
+    '''
+    Returns the icon with the given filename from the images folder of the plugin.
+    Icons are loaded once and shared by all the items and actions using them, 
+    instead of reading the image file again for each explorer item
+    '''
+    icon = _icons.get(name)
+    if icon is None:
+        icon = QtGui.QIcon(os.path.join(os.path.dirname(__file__), "..", "images", name))
+        _icons[name] = icon
+    return icon
+
+def getDisabledIcon(name):
+    '''Returns a grayed out version of an icon, i.e. for items that are not available yet'''
+    key = (name, QtGui.QIcon.Disabled)
+    icon = _icons.get(key)
+    if icon is None:
+        icon = QtGui.QIcon(getIcon(name).pixmap(16, 16, QtGui.QIcon.Disabled))
+        _icons[key] = icon
+    return icon
@@ -0,0 +1,105 @@
+'''
+Checks the tables of a PostGIS connection or schema for layout problems, and runs the
+selected fixes as a batch in the background, right away or at a given time of the day
+'''
+
+from PyQt4 import QtGui, QtCore
+from opengeo.postgis import advisor
+from opengeo.postgis.connection import statementTimeout, MAINTENANCE
+from opengeo.gui.worker import runInBackground
+from opengeo.gui.dialogs.advisordialog import AdvisorDialog
+
+# scheduled and running batches are kept here, so they are not garbage collected before finishing
+_batches = set()
+
+class FixBatch(QtCore.QObject):
+    '''
+    Fixes a list of issues in a background thread, with its own connection to the database,
+    so the explorer can still be used while indexes are built and tables clustered
+    '''
+
+    progressed = QtCore.pyqtSignal(int, object)
+
+    def __init__(self, explorer, connection, issues, clusterMethod):
+        QtCore.QObject.__init__(self)
+        self.explorer = explorer
+        self.connection = connection
+        self.issues = issues
+        self.clusterMethod = clusterMethod
+        self.worker = None
+        self.geodb = None
+        self.cancelled = False
+        self.progressed.connect(self.updateProgress)
+
+    def schedule(self, runAt = None):
+        _batches.add(self)
+        if runAt is None:
+            self.start()
+        else:
+            msecs = QtCore.QTime.currentTime().msecsTo(runAt)
+            if msecs < 0:
+                msecs += 24 * 60 * 60 * 1000
+            QtCore.QTimer.singleShot(msecs, self.start)
+            self.explorer.setInfo("Fixes for %i PostGIS table problems will run at %s"
+                                  % (len(self.issues), runAt.toString("HH:mm")))
+
+    def start(self):
+        self.explorer.setProgressMaximum(len(self.issues), "Fix PostGIS tables", self.cancel)
+        self.worker = runInBackground(self.run, self.finished, self.failed)
+
+    def run(self):
+        self.geodb = self.connection.geodb.copy()
+        self.geodb.statement_timeout = statementTimeout(MAINTENANCE)
+        try:
+            return advisor.fixIssues(self.geodb, self.issues, self.clusterMethod, self.progressed.emit,
+                                     lambda: self.cancelled)
+        finally:
+            self.geodb.close()
+
+    def cancel(self):
+        '''Stops the batch, cancelling the statement running'''
+        self.cancelled = True
+        if self.geodb is not None:
+            try:
+                self.geodb.cancel()
+            except Exception:
+                #the batch might have finished already
+                pass
+
+    def updateProgress(self, fixed, issue):
+        self.explorer.setProgress(fixed)
+
+    def finished(self, results):
+        _batches.discard(self)
+        self.explorer.resetActivity()
+        self.connection.geodb.invalidate()
+        errors = ["%r: %s" % (issue, error) for issue, seconds, error in results if error is not None]
+        seconds = sum(result[1] for result in results)
+        if errors:
+            self.explorer.setWarning("%i of %i PostGIS table problems could not be fixed:\n%s"
+                                     % (len(errors), len(results), "\n".join(errors)))
+        elif self.cancelled:
+            self.explorer.setInfo("Fixes cancelled after %i of %i PostGIS table problems"
+                                  % (len(results), len(self.issues)))
+        else:
+            self.explorer.setInfo("%i PostGIS table problems fixed in %.1f seconds" % (len(results), seconds))
+
+    def failed(self, trace):
+        _batches.discard(self)
+        self.explorer.resetActivity()
+        self.explorer.setError(trace)
+
+
+def checkTables(explorer, connection, schema = None):
+    '''Looks for problems in the tables of a connection, or of one of its schemas, and lets the user fix them'''
+    issues = []
+    if not explorer.run(lambda: issues.extend(advisor.findIssues(connection.geodb, schema)),
+                        None, []):
+        return
+    if not issues:
+        QtGui.QMessageBox.information(explorer, "PostGIS tables advisor", "No problems were found")
+        return
+    dlg = AdvisorDialog(issues)
+    dlg.exec_()
+    if dlg.ok and dlg.selected:
+        FixBatch(explorer, connection, dlg.selected, dlg.clusterMethod).schedule(dlg.runAt)
@@ -1,13 +1,18 @@
 import os
+import cgi
 from PyQt4 import QtGui, QtCore
 from qgis.core import *
-from opengeo.postgis.connection import PgConnection
-from opengeo.gui.exploreritems import TreeItem
+from opengeo.postgis.connection import PgConnection, statementTimeout, COUNT, DDL
+from opengeo.postgis import sqlview, pyramid, querylog
+from opengeo.gui.exploreritems import TreeItem, children, reconcileChildren
 from dialogs.layerdialog import PublishLayerDialog
 from dialogs.userpasswd import UserPasswdDialog
 from dialogs.importvector import ImportIntoPostGISDialog
 from dialogs.pgconnectiondialog import NewPgConnectionDialog
 from dialogs.createtable import DlgCreateTable
+from dialogs.sqlviewdialog import PublishSqlViewDialog
+from dialogs.pyramiddialog import PyramidDialog
+from dialogs.previewdialog import PreviewDialog
 from opengeo.gui.qgsexploreritems import QgsLayerItem
 from opengeo.gui.pgoperations import importToPostGIS
 from opengeo.gui.confirm import confirmDelete
@@ -15,22 +20,45 @@ from db_manager.db_plugins.postgis.plugin import PostGisDBPlugin, PGTable
 from db_manager.dlg_sql_window import DlgSqlWindow
 from db_manager.dlg_table_properties import DlgTableProperties
 from opengeo import config
+from opengeo.qgis.catalog import pgStoreParams
+from opengeo.gui.icons import getIcon, getDisabledIcon
+from opengeo.gui.worker import runInBackground
+from opengeo.gui.pgadvisor import checkTables
+from opengeo.gui.pgmaintenance import maintainTables
 
-pgIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/postgis.png")   
+pgIcon = getIcon("postgis.png")   
  
+def _withTimeout(geodb, operation, func):
+    '''Returns a function that calls func with the statement timeout set for a kind of operation'''
+    def run(*args):
+        with geodb.timeout(statementTimeout(operation)):
+            return func(*args)
+    return run
+
 class PgTreeItem(TreeItem):
     
     def iconPath(self):
         return os.path.dirname(__file__) + "/../images/postgis.png"
+
+    def descriptionGeneration(self):
+        conn = getattr(self.element, "conn", self.element)
+        geodb = getattr(conn, "geodb", None)
+        if geodb is None:
+            return TreeItem.descriptionGeneration(self)
+        return geodb.generation
         
 class PgConnectionsItem(PgTreeItem):
 
     def __init__(self):             
         TreeItem.__init__(self, None, pgIcon, "PostGIS connections")
-        self.databases = [] 
+        
+    @property
+    def databases(self):
+        return [item.element for item in children(self) 
+                if isinstance(item, PgConnectionItem) and item.element.isValid]
         
     def populate(self):
-        self.databases = []         
+        items = []
         settings = QtCore.QSettings()
         settings.beginGroup(u'/PostgreSQL/connections')
         for name in settings.childGroups():
@@ -38,24 +66,37 @@ class PgConnectionsItem(PgTreeItem):
             try:                                            
                 conn = PgConnection(name, settings.value('host'), int(settings.value('port')), 
                                 settings.value('database'), settings.value('username'), 
-                                settings.value('password'))                 
-                item = PgConnectionItem(conn)
-                if conn.isValid:                              
-                    item.populate()
-                    self.databases.append(conn)                    
-                else:    
-                    #if there is a problem connecting, we add the unpopulated item with the error icon
-                    #TODO: report on the problem
-                    wrongConnectionIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/wrong.gif")                 
-                    item.setIcon(0, wrongConnectionIcon)                    
-                self.addChild(item)
+                                settings.value('password'), connect = False)                 
+                items.append(PgConnectionItem(conn))
             except Exception, e:                
                 pass
             finally:                            
                 settings.endGroup()  
+        self.addChildren(items)
+        self.connectInBackground()
+        
+    def connectInBackground(self):
+        '''
+        Connects to all the databases at the same time, without blocking the GUI.
+        An unreachable host only affects its own item, which shows the error icon 
+        once the connection times out
+        '''
+        for item in children(self):
+            conn = item.element
+            if conn.connectionAttempted() or getattr(conn, "worker", None) is not None:
+                continue
+            conn.worker = runInBackground(conn.connect, 
+                                lambda result, conn = conn: self.connectionFinished(conn))
+            
+    def connectionFinished(self, conn):
+        conn.worker = None
+        #the item might have been replaced by a refresh, so look for the one with the connection
+        for item in children(self):
+            if item.element is conn:
+                item.updateIcon()
         
     def contextMenuActions(self, tree, explorer):       
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")  
+        icon = getIcon("add.png")  
         newConnectionAction = QtGui.QAction(icon, "New connection...", explorer)
         newConnectionAction.triggered.connect(lambda: self.newConnection(explorer))                                             
         return [newConnectionAction]
@@ -64,14 +105,7 @@ class PgConnectionsItem(PgTreeItem):
         dlg = NewPgConnectionDialog(explorer)
         dlg.exec_()
         if dlg.conn is not None:
-            self.databases.append(dlg.conn)
-            item = PgConnectionItem(dlg.conn)
-            if dlg.conn.isValid:                              
-                item.populate()                
-            else:                    
-                wrongConnectionIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/wrong.gif")                 
-                item.setIcon(0, wrongConnectionIcon)                
-            self.addChild(item)
+            self.addChild(PgConnectionItem(dlg.conn))
             
                   
 class PgConnectionItem(PgTreeItem): 
@@ -79,51 +113,101 @@ class PgConnectionItem(PgTreeItem):
     def __init__(self, conn):                      
         TreeItem.__init__(self, conn, pgIcon)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)          
+        self.setLazy()
+        self.updateIcon()
+        
+    def updateIcon(self):
+        '''Shows the state of the connection: not connected yet, connected or failed'''
+        if self.element.isValid:
+            self.setIcon(0, pgIcon)
+            self.setToolTip(0, "")
+        elif self.element.error is not None:
+            self.setIcon(0, getIcon("wrong.gif"))
+            self.setToolTip(0, self.element.error)
+        else:
+            self.setIcon(0, getDisabledIcon("postgis.png"))
+            self.setToolTip(0, "Connecting...")
         
     def refreshContent(self, explorer):
-        self.takeChildren()              
+        previous = children(self)
+        if self.element.isValid:
+            #the database might have been modified outside of the explorer
+            self.element.geodb.invalidate()
+        else:
+            #the server might be reachable now
+            self.element.reconnect()
         self.populate()   
+        reconcileChildren(self, previous, explorer)
                 
     def populate(self):
-        self.element.reconnect()
+        self.addLoadedChildren(self.loadChildren())
+        
+    def loadChildren(self):
+        self.element.connect()
         if not self.element.isValid:
+            return None
+        return [(schema, schema.tables()) for schema in self.element.schemas()]
+    
+    def childItems(self, schemas):
+        items = []
+        for schema, tables in schemas:
+            schemaItem = PgSchemaItem(schema)
+            schemaItem.addChildren([PgTableItem(table) for table in tables])
+            items.append(schemaItem)
+        return items
+    
+    def searchText(self):
+        text = PgTreeItem.searchText(self)
+        if self.childCount() == 0 and self.element.isValid:
+            #the schemas and tables might have been listed already, without populating the item
+            text = " ".join([text] + self.element.geodb.cached_names())
+        return text
+
+    def addLoadedChildren(self, schemas):
+        self.updateIcon()
+        if schemas is None and self.element.poolExhausted:
+            QtGui.QMessageBox.warning(None, "Error connecting to DB",
+                                      "All the connections to the database are in use. "
+                                      "Wait for the running operations to finish, and refresh the connection")
+            return
+        if schemas is None:
+            #we could not connect. Maybe the credentials are wrong, so ask for them
             dlg = UserPasswdDialog()
             dlg.exec_()
             if dlg.user is None:
                 return
             self.element.reconnect(dlg.user, dlg.passwd)            
+            self.updateIcon()
             if not self.element.isValid:
                 QtGui.QMessageBox.warning(None, "Error connecting to DB", "Cannot connect to the database")
                 return 
-            if self.element not in self.parent().databases:
-                self.parent().databases.append(self.element)
-            self.setIcon(0, pgIcon)
-        schemas = self.element.schemas()
-        for schema in schemas:
-            schemItem = PgSchemaItem(schema)
-            schemItem.populate()
-            self.addChild(schemItem)
+            schemas = self.loadChildren()
+        PgTreeItem.addLoadedChildren(self, schemas)
             
     def contextMenuActions(self, tree, explorer): 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")
+        icon = getIcon("edit.png")
         editAction = QtGui.QAction(icon, "Edit...", explorer)
         editAction.triggered.connect(lambda: self.editConnection(explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")
+        icon = getIcon("delete.gif")
         deleteAction = QtGui.QAction(icon, "Remove...", explorer)
         deleteAction.triggered.connect(lambda: self.deleteConnection(explorer))
         actions = [editAction, deleteAction]
         if self.element.isValid:            
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")
+            icon = getIcon("add.png")
             newSchemaAction = QtGui.QAction(icon, "New schema...", explorer)
             newSchemaAction.triggered.connect(lambda: self.newSchema(explorer))
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/sql_window.png")  
+            icon = getIcon("sql_window.png")  
             sqlAction = QtGui.QAction(icon, "Run SQL...", explorer)
             sqlAction.triggered.connect(self.runSql)     
-            icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/postgis_import.png") 
+            icon = getIcon("postgis_import.png") 
             importAction = QtGui.QAction(icon, "Import files...", explorer)
             importAction.setEnabled(self.childCount() != 0)
             importAction.triggered.connect(lambda: self.importIntoDatabase(explorer))                                        
-            actions.extend([newSchemaAction, sqlAction, importAction])        
+            checkAction = QtGui.QAction("Check tables...", explorer)
+            checkAction.triggered.connect(lambda: checkTables(explorer, self.element))
+            maintainAction = QtGui.QAction("Vacuum analyze tables...", explorer)
+            maintainAction.triggered.connect(lambda: maintainTables(explorer, self.element))
+            actions.extend([newSchemaAction, sqlAction, importAction, checkAction, maintainAction])        
         return actions
         
     def _getDescriptionHtml(self, tree, explorer):  
@@ -132,7 +216,21 @@ class PgConnectionItem(PgTreeItem):
                     'Try <a href="refresh">refreshing</a> the connection, to enter new credentials and retry to connect</p>')     
             return html
         else:
-            return TreeItem._getDescriptionHtml(self, tree, explorer)
+            html = TreeItem._getDescriptionHtml(self, tree, explorer)
+            database = self.element.geodb.database_key()
+            stats = querylog.stats(database)
+            html += '<p><h3><b>Recent queries</b></h3></p><ul>'
+            html += ('<li>%i queries in %.1f seconds, %i failed, %i slower than %.0f seconds</li>\n'
+                     % (stats["queries"], stats["seconds"], stats["errors"], stats["slow"], querylog.SLOW_QUERY))
+            html += '</ul>'
+            slowest = querylog.slowestQueries(5, database)
+            if slowest:
+                html += '<p><b>Slowest queries:</b></p><ul>'
+                for timing in slowest:
+                    html += ('<li>%.3f s%s: <tt>%s</tt></li>\n'
+                             % (timing.seconds, " (failed)" if timing.error else "", cgi.escape(timing.sql[:200])))
+                html += '</ul>'
+            return html
 
     def linkClicked(self, tree, explorer, url):
         if not self.element.isValid:
@@ -154,7 +252,7 @@ class PgConnectionItem(PgTreeItem):
             dlg.exec_()
             if dlg.ok:   
                 importToPostGIS(explorer, self.element, dlg.toImport, 
-                                dlg.schema, dlg.tablename, dlg.add, dlg.single)                            
+                                dlg.schema, dlg.tablename, dlg.add, dlg.single, dlg.parallel)                            
                 return [self]
             return []
         else:
@@ -174,7 +272,7 @@ class PgConnectionItem(PgTreeItem):
             dlg.exec_()
             if dlg.ok: 
                 importToPostGIS(explorer, self.element, dlg.toImport, 
-                                dlg.schema, dlg.tablename, dlg.add, dlg.single)
+                                dlg.schema, dlg.tablename, dlg.add, dlg.single, dlg.parallel)
                 toUpdate.add(self)
         
         return toUpdate          
@@ -194,7 +292,7 @@ class PgConnectionItem(PgTreeItem):
         dlg.exec_()
         if dlg.ok:  
             importToPostGIS(explorer, self.element, dlg.toImport, 
-                                dlg.schema, dlg.tablename, dlg.add, dlg.single)            
+                                dlg.schema, dlg.tablename, dlg.add, dlg.single, dlg.parallel)            
             self.refreshContent(explorer)
           
     def runSql(self):
@@ -205,6 +303,9 @@ class PgConnectionItem(PgTreeItem):
         plugin.connectToUri(uri)
         dlg = DlgSqlWindow(config.iface, plugin.db)
         dlg.exec_()
+        #the statements run in the window do not go through GeoDB, so it does not know
+        #it has to refresh its catalog
+        geodb.invalidate()
     
     def newSchema(self, explorer):            
         text, ok = QtGui.QInputDialog.getText(explorer, "Schema name", "Enter name for new schema", text="schema")
@@ -224,42 +325,85 @@ class PgConnectionItem(PgTreeItem):
 class PgSchemaItem(PgTreeItem): 
     
     def __init__(self, schema): 
-        pgIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/namespace.png")                        
+        pgIcon = getIcon("namespace.png")                        
         TreeItem.__init__(self, schema, pgIcon)
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDropEnabled)
+
+    def refreshContent(self, explorer):
+        #the schema might have been modified outside of the explorer
+        self.element.conn.geodb.invalidate()
+        TreeItem.refreshContent(self, explorer)
         
     def populate(self):
         tables = self.element.tables()
-        for table in tables:
-            tableItem = PgTableItem(table)            
-            self.addChild(tableItem)      
+        self.addChildren([PgTableItem(table) for table in tables])
 
     def contextMenuActions(self, tree, explorer):                        
-        newTableIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/new_table.png")                         
+        newTableIcon = getIcon("new_table.png")                         
         newTableAction = QtGui.QAction(newTableIcon, "New table...", explorer)
         newTableAction.triggered.connect(lambda: self.newTable(explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")                                                                    
+        icon = getIcon("delete.gif")                                                                    
         deleteAction= QtGui.QAction(icon, "Delete", explorer)
         deleteAction.triggered.connect(lambda: self.deleteSchema(explorer)) 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/rename.png") 
+        icon = getIcon("rename.png") 
         renameAction= QtGui.QAction(icon, "Rename...", explorer)
         renameAction.triggered.connect(lambda: self.renameSchema(explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/postgis_import.png")
+        icon = getIcon("postgis_import.png")
         importAction = QtGui.QAction(icon, "Import files...", explorer)
         importAction.triggered.connect(lambda: self.importIntoSchema(explorer))                            
-        return [newTableAction, deleteAction, renameAction, importAction]
+        icon = getIcon("publish-to-geoserver.png")
+        publishSqlViewAction = QtGui.QAction(icon, "Publish SQL view...", explorer)
+        publishSqlViewAction.triggered.connect(lambda: self.publishSqlView(tree, explorer))
+        publishSqlViewAction.setEnabled(len(explorer.catalogs()) > 0)
+        checkAction = QtGui.QAction("Check tables...", explorer)
+        checkAction.triggered.connect(lambda: checkTables(explorer, self.element.conn, self.element.name))
+        maintainAction = QtGui.QAction("Vacuum analyze tables...", explorer)
+        maintainAction.triggered.connect(lambda: maintainTables(explorer, self.element.conn, self.element.name))
+        return [newTableAction, deleteAction, renameAction, importAction, publishSqlViewAction,
+                checkAction, maintainAction]
+
+    def publishSqlView(self, tree, explorer):
+        dlg = PublishSqlViewDialog(explorer.catalogs(), self.element)
+        dlg.exec_()
+        if dlg.catalog is None:
+            return
+        catItem = tree.findAllItems(dlg.catalog)[0]
+        explorer.run(self._publishSqlView,
+                 "Publish SQL view '" + dlg.name + "'",
+                 [catItem],
+                 dlg.catalog, dlg.workspace, dlg.name, dlg.sql, dlg.geomColumn, dlg.keyColumns, dlg.parameters)
+
+    def _publishSqlView(self, catalog, workspace, name, sql, geomColumn, keyColumns, parameters):
+        connection = self.element.conn
+        geodb = connection.geodb
+        catalog.create_pg_featurestore(connection.name,
+                                       workspace = workspace,
+                                       overwrite = True,
+                                       host = geodb.host,
+                                       database = geodb.dbname,
+                                       schema = self.element.name,
+                                       port = geodb.port,
+                                       user = geodb.user,
+                                       passwd = geodb.passwd,
+                                       connection_params = pgStoreParams())
+        geometry = None
+        if geomColumn is not None:
+            defaults = dict((param, default) for param, default, regexp in parameters)
+            geomtype, srid = sqlview.queryGeometry(geodb, sql, defaults, geomColumn)
+            geometry = (geomColumn, geomtype, srid)
+        catalog.create_pg_sqlview(name, connection.name, sql, workspace, geometry, keyColumns, parameters)
 
     def importIntoSchema(self, explorer):
         dlg = ImportIntoPostGISDialog(explorer.pgDatabases(), self.element.conn, self.element)
         dlg.exec_()
         if dlg.ok:        
             importToPostGIS(explorer, self.element.conn, dlg.toImport, 
-                                dlg.schema, dlg.tablename, dlg.add, dlg.single)
+                                dlg.schema, dlg.tablename, dlg.add, dlg.single, dlg.parallel)
             self.refreshContent(explorer)
         
     def deleteSchema(self, explorer):
         if confirmDelete():           
-            explorer.run(self.element.conn.geodb.delete_schema, 
+            explorer.run(_withTimeout(self.element.conn.geodb, DDL, self.element.conn.geodb.delete_schema), 
                           "Delete schema '" + self.element.name + "'",
                           [self.parent()], 
                           self.element.name)
@@ -267,7 +411,7 @@ class PgSchemaItem(PgTreeItem):
     def renameSchema(self, explorer):
         text, ok = QtGui.QInputDialog.getText(explorer, "Schema name", "Enter new name for schema", text="schema")
         if ok:
-            explorer.run(self.element.conn.geodb.rename_schema, 
+            explorer.run(_withTimeout(self.element.conn.geodb, DDL, self.element.conn.geodb.rename_schema), 
                           "Rename schema '" + self.element.name + "'  to '" + text + "'", 
                           [self.parent()], 
                           self.element.name, text)      
@@ -298,7 +442,7 @@ class PgSchemaItem(PgTreeItem):
             dlg.exec_()
             if dlg.ok:
                 importToPostGIS(explorer, self.element, dlg.toImport, 
-                                dlg.schema, dlg.tablename, dlg.add, dlg.single)                     
+                                dlg.schema, dlg.tablename, dlg.add, dlg.single, dlg.parallel)                     
                 return [self]
             return []
         else:
@@ -317,7 +461,7 @@ class PgSchemaItem(PgTreeItem):
             dlg.exec_()
             if dlg.ok:
                 importToPostGIS(explorer, self.element.conn, dlg.toImport, 
-                                dlg.schema, dlg.tablename, dlg.add, dlg.single)
+                                dlg.schema, dlg.tablename, dlg.add, dlg.single, dlg.parallel)
                 toUpdate.add(self)
         
         return [self]                  
@@ -328,12 +472,12 @@ class PgTableItem(PgTreeItem):
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDragEnabled)
         
     def getIcon(self, table):        
-        tableIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/table.png")
-        viewIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/view.png")
-        layerPointIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer_point.png")
-        layerLineIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer_line.png")
-        layerPolygonIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer_polygon.png")        
-        layerUnknownIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer_unknown.png")
+        tableIcon = getIcon("table.png")
+        viewIcon = getIcon("view.png")
+        layerPointIcon = getIcon("layer_point.png")
+        layerLineIcon = getIcon("layer_line.png")
+        layerPolygonIcon = getIcon("layer_polygon.png")        
+        layerUnknownIcon = getIcon("layer_unknown.png")
             
         if table.geomtype is not None:        
             if table.geomtype.find('POINT') != -1:
@@ -350,28 +494,36 @@ class PgTableItem(PgTreeItem):
         return tableIcon
     
     def contextMenuActions(self, tree, explorer):        
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/publish-to-geoserver.png") 
+        icon = getIcon("publish-to-geoserver.png") 
         publishPgTableAction = QtGui.QAction(icon, "Publish...", explorer)
         publishPgTableAction.triggered.connect(lambda: self.publishPgTable(tree, explorer))            
         publishPgTableAction.setEnabled(len(explorer.catalogs()) > 0) 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")     
+        icon = getIcon("delete.gif")     
         deleteAction= QtGui.QAction(icon, "Delete", explorer)
         deleteAction.triggered.connect(lambda: self.deleteTable(explorer))  
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/rename.png") 
+        icon = getIcon("rename.png") 
         renameAction= QtGui.QAction(icon, "Rename...", explorer)
         renameAction.triggered.connect(lambda: self.renameTable(explorer))
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")                  
+        icon = getIcon("edit.png")                  
         editAction= QtGui.QAction(icon, "Edit...", explorer)
         editAction.triggered.connect(self.editTable)
         vacuumAction= QtGui.QAction("Vacuum analyze", explorer)
         vacuumAction.triggered.connect(lambda: self.vacuumTable(explorer))
-        return [publishPgTableAction, deleteAction, renameAction, editAction, vacuumAction]
+        pyramidAction = QtGui.QAction("Create generalized pyramid...", explorer)
+        pyramidAction.triggered.connect(lambda: self.createPyramid(tree, explorer))
+        pyramidAction.setEnabled(self.element.geomfield is not None)
+        previewAction = QtGui.QAction("Preview data...", explorer)
+        previewAction.triggered.connect(lambda: self.previewTable(explorer))
+        return [publishPgTableAction, deleteAction, renameAction, editAction, vacuumAction, pyramidAction,
+                previewAction]
            
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):   
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/delete.gif")     
+        icon = getIcon("delete.gif")     
         deleteAction= QtGui.QAction(icon, "Delete", explorer)
         deleteAction.triggered.connect(lambda: self.deleteTables(explorer, selected))   
-        return [deleteAction]
+        maintainAction = QtGui.QAction("Vacuum analyze...", explorer)
+        maintainAction.triggered.connect(lambda: self.vacuumTables(explorer, selected))
+        return [deleteAction, maintainAction]
     
     def acceptDroppedItems(self, tree, explorer, items):        
         toImport = []
@@ -416,11 +568,76 @@ class PgTableItem(PgTreeItem):
         
                
     def vacuumTable(self, explorer):
-        explorer.run(self.element.conn.geodb.vacuum_analyze, 
-                  "Vacuum table " + self.element.name,
-                  [self.parent()], 
-                  self.element.name, self.element.schema)
+        maintainTables(explorer, self.element.conn, tables = [(self.element.schema, self.element.name)], ask = False)
+
+    def previewTable(self, explorer):
+        dialogs = []
+        if explorer.run(lambda: dialogs.append(PreviewDialog(self.element, config.iface.mainWindow())),
+                        None, []):
+            dialogs[0].show()
+
+    def vacuumTables(self, explorer, selected):
+        conn = self.element.conn
+        tables = [(item.element.schema, item.element.name) for item in selected
+                  if isinstance(item, PgTableItem) and item.element.conn is conn]
+        maintainTables(explorer, conn, tables = tables)
     
+    def createPyramid(self, tree, explorer):
+        table = self.element
+        def computeExtent():
+            #this runs in a background thread, so it uses a connection of its own
+            db = table.conn.geodb.copy()
+            try:
+                return db.get_table_extent(table.name, table.geomfield, table.schema)
+            finally:
+                db.close()
+        def failed(trace):
+            explorer.setError("Could not compute the extent of table '%s':\n%s" % (table.name, trace))
+        self.extentWorker = runInBackground(computeExtent,
+                                            lambda extent: self.showPyramidDialog(tree, explorer, extent),
+                                            failed)
+
+    def showPyramidDialog(self, tree, explorer, extent):
+        table = self.element
+        dlg = PyramidDialog(explorer.catalogs(), pyramid.defaultTolerances(extent) if extent is not None else [])
+        dlg.exec_()
+        if not dlg.ok:
+            return
+        toUpdate = [self.parent()]
+        if dlg.catalog is not None:
+            toUpdate.append(tree.findAllItems(dlg.catalog)[0])
+        levels = []
+        explorer.setProgressMaximum(len(dlg.tolerances), "Create generalized pyramid")
+        ok = explorer.run(self._createPyramid,
+                          "Create generalized pyramid for table '" + table.name + "'",
+                          toUpdate,
+                          dlg.tolerances, dlg.method, dlg.catalog, dlg.workspace, levels, explorer)
+        explorer.resetActivity()
+        if ok:
+            QtGui.QMessageBox.information(explorer, "Generalized pyramid", pyramid.pyramidReport(levels))
+
+    def _createPyramid(self, tolerances, method, catalog, workspace, levels, explorer):
+        table = self.element
+        levels.extend(pyramid.buildPyramid(table, tolerances, method,
+                                           lambda built, level: explorer.setProgress(built)))
+        if catalog is not None:
+            geodb = table.conn.geodb
+            catalog.create_pg_featurestore(table.conn.name,
+                                           workspace = workspace,
+                                           overwrite = True,
+                                           host = geodb.host,
+                                           database = geodb.dbname,
+                                           schema = table.schema,
+                                           port = geodb.port,
+                                           user = geodb.user,
+                                           passwd = geodb.passwd,
+                                           connection_params = pgStoreParams())
+            catalog.create_pregeneralized_featurestore(table.name + "_generalized", table.conn.name, table.name,
+                                                       table.geomfield,
+                                                       [(level.tolerance, level.tablename, table.geomfield)
+                                                        for level in levels[1:]],
+                                                       workspace, overwrite = True)
+
     def deleteTable(self, explorer):
         self.deleteTables(explorer, [self])
         
@@ -431,7 +648,7 @@ class PgTableItem(PgTreeItem):
             explorer.setProgressMaximum(len(items), "Delete tables")
         toUpdate = set()
         for i, item in enumerate(items):                      
-            if not explorer.run(item.element.conn.geodb.delete_table, 
+            if not explorer.run(_withTimeout(item.element.conn.geodb, DDL, item.element.conn.geodb.delete_table), 
                           "Delete PostGIS table", 
                           [], 
                           item.element.name, item.element.schema):
@@ -453,7 +670,7 @@ class PgTableItem(PgTreeItem):
     def renameTable(self, explorer):
         text, ok = QtGui.QInputDialog.getText(explorer, "Table name", "Enter new name for table", text="table")
         if ok:
-            explorer.run(self.element.conn.geodb.rename_table, 
+            explorer.run(_withTimeout(self.element.conn.geodb, DDL, self.element.conn.geodb.rename_table), 
                           "Rename table '" + self.element.name + "' to '" + text + "'",
                           [self.parent()], 
                           self.element.name, text, self.element.schema)      
@@ -468,22 +685,26 @@ class PgTableItem(PgTreeItem):
         table = PGTable(row, plugin.db)
         dlg = DlgTableProperties(table)
         dlg.exec_()
+        #the table is modified through the DB manager connection, not through GeoDB
+        geodb.invalidate()
         
     def publishPgTable(self, tree, explorer):
-        dlg = PublishLayerDialog(explorer.catalogs())
+        columns = self.element.columns()
+        dlg = PublishLayerDialog(explorer.catalogs(), fields = columns)
         dlg.exec_()      
         if dlg.catalog is None:
             return
         cat = dlg.catalog          
         catItem = tree.findAllItems(cat)[0]
         toUpdate = [catItem]                    
+        attributes = dlg.attributes if len(dlg.attributes) < len(columns) else None
         explorer.run(self._publishTable,
                  "Publish table '" + self.element.name + "'",
                  toUpdate,
-                 self.element, cat, dlg.workspace)
+                 self.element, cat, dlg.workspace, attributes)
         
                 
-    def _publishTable(self, table, catalog = None, workspace = None):
+    def _publishTable(self, table, catalog = None, workspace = None, attributes = None):
         if catalog is None:
             pass       
         workspace = workspace if workspace is not None else catalog.get_default_workspace()        
@@ -497,18 +718,75 @@ class PgTableItem(PgTreeItem):
                                        schema = table.schema,
                                        port = geodb.port,
                                        user = geodb.user,
-                                       passwd = geodb.passwd)
-        catalog.create_pg_featuretype(table.name, connection.name, workspace, "EPSG:" + str(table.srid))  
+                                       passwd = geodb.passwd,
+                                       connection_params = pgStoreParams())
+        if attributes is not None:
+            #the primary key and the geometry, if the table has one, are always needed
+            keys = [key for key in table.primaryKey() if key not in attributes]
+            attributes = keys + attributes
+            if table.geomfield is not None and table.geomfield not in attributes:
+                attributes.append(table.geomfield)
+        catalog.create_pg_featuretype(table.name, connection.name, workspace, "EPSG:" + str(table.srid),
+                                      attributes = attributes)  
 
 
     def populate(self):
         pass
     
+    def loadDescriptionData(self):
+        #this runs in a background thread, so it uses a connection of its own
+        db = self.element.conn.geodb.copy()
+        try:
+            return (db.get_table_rows_estimate(self.element.name, self.element.schema),
+                    db.get_table_fields(self.element.name, self.element.schema))
+        finally:
+            db.close()
+
+    def linkClicked(self, tree, explorer, url):
+        actionName = url.toString()
+        if actionName == "count":
+            self.countRows(tree, explorer)
+        elif actionName == "cancelcount":
+            counter = getattr(self, "counter", None)
+            if counter is not None:
+                counter.cancel()
+        else:
+            PgTreeItem.linkClicked(self, tree, explorer, url)
+
+    def rowCountHtml(self, estimate):
+        counter = getattr(self, "counter", None)
+        if counter is not None and counter.element is self.element:
+            if counter.rows is not None:
+                return '%i (exact)' % counter.rows
+            elif counter.running:
+                return 'counting... <a href="cancelcount">Cancel</a>'
+        if estimate is None:
+            html = 'unknown'
+        else:
+            html = '~%i (estimated)' % estimate
+        return html + ' &nbsp;<a href="count">Count exactly</a>'
+
+    def countRows(self, tree, explorer):
+        '''
+        Counts the rows in the table in a background thread, using a separate connection,
+        so it can be cancelled and does not block other queries
+        '''
+        def finished(rows):
+            self.showDescription(tree, explorer)
+        def failed(trace):
+            if not counter.cancelled:
+                explorer.setError("Could not count rows in table '%s':\n%s" % (self.element.name, trace))
+            self.showDescription(tree, explorer)
+        counter = RowCounter(self.element)
+        self.counter = counter
+        counter.worker = runInBackground(counter.count, finished, failed)
+        self.showDescription(tree, explorer)
+
     def _getDescriptionHtml(self, tree, explorer):                                
-        db = self.element.conn.geodb
+        estimate, fields = self.descriptionData
         html = '<h3>General</h3><ul>'
-        properties = (("Row count:", db.get_table_rows(self.element.name, self.element.schema)),
-                      ("Geometry field", self.element.geomfield),
+        html += '<li><b>Row count</b>: %s' % self.rowCountHtml(estimate)
+        properties = (("Geometry field", self.element.geomfield),
                       ("Geometry type", self.element.geomtype),
                       ("SRID", self.element.srid))
                       
@@ -519,7 +797,7 @@ class PgTableItem(PgTreeItem):
         for header in headers:
             html += '<th>%s</th>' % header
         html += '</tr>' 
-        for field in db.get_table_fields(self.element.name, self.element.schema):
+        for field in fields:
             html += '<tr>'
             default = field.default if field.hasdefault else ""
             values = [field.num, field.name, field.data_type, not field.notnull, default]
@@ -534,4 +812,38 @@ class PgTableItem(PgTreeItem):
             if action.isEnabled():
                 html += '<li><a href="' + action.text() + '">' + action.text() + '</a></li>\n'
         html += '</ul>'
-        return html 
+        return html
+
+
+class RowCounter(object):
+    '''Runs an exact COUNT(*) on a table, which can be cancelled from another thread'''
+
+    def __init__(self, table):
+        self.element = table
+        self.rows = None
+        self.db = None
+        self.cancelled = False
+        self.running = True
+        self.worker = None
+
+    def count(self):
+        try:
+            self.db = self.element.conn.geodb.copy()
+            self.db.statement_timeout = statementTimeout(COUNT)
+            try:
+                if not self.cancelled:
+                    self.rows = self.db.get_table_rows(self.element.name, self.element.schema)
+                return self.rows
+            finally:
+                self.db.close()
+        finally:
+            self.running = False
+
+    def cancel(self):
+        self.cancelled = True
+        if self.db is not None:
+            try:
+                self.db.cancel()
+            except Exception:
+                #the query might have finished, or the connection not be open yet
+                pass
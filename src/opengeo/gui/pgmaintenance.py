@@ -0,0 +1,76 @@
+'''
+Runs VACUUM, ANALYZE and REINDEX over the tables of a PostGIS connection, a schema or
+a selection of tables, in the background and with progress that can be cancelled
+'''
+
+from PyQt4 import QtCore
+from opengeo.postgis import maintenance
+from opengeo.postgis.connection import statementTimeout, MAINTENANCE
+from opengeo.gui.worker import runInBackground
+from opengeo.gui.dialogs.maintenancedialog import MaintenanceDialog
+
+# running batches are kept here, so they are not garbage collected before finishing
+_batches = set()
+
+class MaintenanceBatch(QtCore.QObject):
+
+    progressed = QtCore.pyqtSignal(int, object)
+
+    def __init__(self, explorer, connection, job):
+        QtCore.QObject.__init__(self)
+        self.explorer = explorer
+        self.connection = connection
+        self.job = job
+        self.worker = None
+        self.progressed.connect(self.updateProgress)
+
+    def start(self):
+        _batches.add(self)
+        self.explorer.setProgressMaximum(len(self.job.tables), "Maintain PostGIS tables", self.job.cancel)
+        self.worker = runInBackground(self.job.run, self.finished, self.failed, self.progressed.emit)
+
+    def updateProgress(self, done, table):
+        self.explorer.setProgress(done)
+
+    def finished(self, results):
+        _batches.discard(self)
+        self.explorer.resetActivity()
+        self.connection.geodb.invalidate()
+        errors = ["%s.%s: %s" % (schema, table, error) for schema, table, seconds, error in results
+                  if error is not None]
+        seconds = sum(result[2] for result in results)
+        if errors:
+            self.explorer.setWarning("%i of %i PostGIS tables could not be maintained:\n%s"
+                                     % (len(errors), len(results), "\n".join(errors)))
+        elif self.job.cancelled:
+            self.explorer.setInfo("Maintenance cancelled after %i of %i PostGIS tables"
+                                  % (len(results), len(self.job.tables)))
+        else:
+            self.explorer.setInfo("%i PostGIS tables maintained in %.1f seconds" % (len(results), seconds))
+
+    def failed(self, trace):
+        _batches.discard(self)
+        self.explorer.resetActivity()
+        self.explorer.setError(trace)
+
+
+def maintainTables(explorer, connection, schema = None, tables = None, ask = True):
+    '''
+    Vacuums and analyzes the tables in a connection, in one of its schemas, or the passed
+    (schema, table) tuples. Unless ask is False, the user chooses what to do first
+    '''
+    ordered = []
+    if not explorer.run(lambda: ordered.extend(maintenance.tablesByDeadRows(connection.geodb, schema, tables)),
+                        None, []):
+        return
+    if not ordered:
+        explorer.setInfo("There are no tables to maintain")
+        return
+    job = maintenance.MaintenanceJob(connection.geodb, ordered, timeout = statementTimeout(MAINTENANCE))
+    if ask:
+        dlg = MaintenanceDialog(len(ordered))
+        dlg.exec_()
+        if not dlg.ok:
+            return
+        job.operation, job.reindex, job.workers = dlg.operation, dlg.reindex, dlg.workers
+    MaintenanceBatch(explorer, connection, job).start()
@@ -1,4 +1,4 @@
-def importToPostGIS(explorer, connection, toImport, schema, tablename, add, single):
+def importToPostGIS(explorer, connection, toImport, schema, tablename, add, single, parallel = False):
     if len(toImport) > 1:
         explorer.setProgressMaximum(len(toImport), "Import layers into PostGIS")           
     for i, layer in enumerate(toImport):  
@@ -6,6 +6,6 @@ def importToPostGIS(explorer, connection, toImport, schema, tablename, add, sing
         if not explorer.run(connection.importFileOrLayer, 
                             None, 
                             [],
-                            layer, schema, tablename, not add, single):
+                            layer, schema, tablename, not add, single, parallel):
             break                                            
     explorer.resetActivity()  
\ No newline at end of file
@@ -4,7 +4,7 @@ from PyQt4.QtCore import *
 from opengeo.gui.exploreritems import TreeItem
 from opengeo.qgis import layers as qgislayers
 from dialogs.styledialog import PublishStyleDialog
-from opengeo.qgis.catalog import OGCatalog
+from opengeo.qgis.catalog import OGCatalog, styleAttributes
 from opengeo.gui.catalogselector import selectCatalog
 from dialogs.layerdialog import PublishLayersDialog, PublishLayerDialog
 from dialogs.projectdialog import PublishProjectDialog
@@ -12,6 +12,7 @@ from opengeo.gui.dialogs.importvector import ImportIntoPostGISDialog
 from opengeo import config
 from opengeo.geoserver.catalog import ConflictingDataError
 from opengeo.gui.confirm import publishLayer
+from opengeo.gui.icons import getIcon
                 
 class QgsTreeItem(TreeItem):
     
@@ -20,37 +21,35 @@ class QgsTreeItem(TreeItem):
         
 class QgsProjectItem(QgsTreeItem): 
     def __init__(self): 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/qgis.png")
+        icon = getIcon("qgis.png")
         TreeItem.__init__(self, None, icon, "QGIS project")        
                  
     def populate(self):                    
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer.png")
+        icon = getIcon("layer.png")
         layersItem = QgsTreeItem(None, icon, "QGIS Layers")        
         layersItem.setIcon(0, icon)
         layers = qgislayers.getAllLayers()
-        for layer in layers:
-            layerItem = QgsLayerItem(layer)            
-            layersItem.addChild(layerItem)
+        layersItem.addChildren([QgsLayerItem(layer) for layer in layers])
         self.addChild(layersItem)
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/group.gif")
+        icon = getIcon("group.gif")
         groupsItem = QgsTreeItem(None, icon, "QGIS Groups")        
         groups = qgislayers.getGroups()
+        groupItems = []
         for group in groups:
             groupItem = QgsGroupItem(group)                                
-            groupsItem.addChild(groupItem)
             groupItem.populate()
+            groupItems.append(groupItem)
+        groupsItem.addChildren(groupItems)
         self.addChild(groupsItem)
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/style.png")
+        icon = getIcon("style.png")
         stylesItem = QgsTreeItem(None, icon, "QGIS Styles")               
         stylesItem.setIcon(0, icon)
         styles = qgislayers.getAllLayers()
-        for style in styles:
-            styleItem = QgsStyleItem(style)            
-            stylesItem.addChild(styleItem)
+        stylesItem.addChildren([QgsStyleItem(style) for style in styles])
         self.addChild(stylesItem)        
             
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/publish-to-geoserver.png")        
+        icon = getIcon("publish-to-geoserver.png")        
         publishProjectAction = QtGui.QAction(icon, "Publish...", explorer)
         publishProjectAction.triggered.connect(lambda: self.publishProject(tree, explorer))
         publishProjectAction.setEnabled(len(explorer.catalogs())>0)        
@@ -100,20 +99,20 @@ class QgsProjectItem(QgsTreeItem):
                     
 class QgsLayerItem(QgsTreeItem): 
     def __init__(self, layer ): 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer.png")
+        icon = getIcon("layer.png")
         TreeItem.__init__(self, layer, icon)   
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDragEnabled)      
      
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/publish-to-geoserver.png")
+        icon = getIcon("publish-to-geoserver.png")
         publishLayerAction = QtGui.QAction(icon, "Publish to GeoServer...", explorer)
         publishLayerAction.triggered.connect(lambda: self.publishLayer(tree, explorer)) 
         publishLayerAction.setEnabled(len(explorer.catalogs())>0)    
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/create-store-from-layer.png")   
+        icon = getIcon("create-store-from-layer.png")   
         createStoreFromLayerAction= QtGui.QAction(icon, "Create store from layer...", explorer)
         createStoreFromLayerAction.triggered.connect(lambda: self.createStoreFromLayer(tree, explorer))
         createStoreFromLayerAction.setEnabled(len(explorer.catalogs())>0)
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/postgis_import.png")
+        icon = getIcon("postgis_import.png")
         importToPostGisAction = QtGui.QAction(icon, "Import into PostGIS...", explorer)
         importToPostGisAction.triggered.connect(lambda: self.importLayerToPostGis(tree, explorer))
         importToPostGisAction.setEnabled(len(explorer.pgDatabases())>0)
@@ -121,11 +120,11 @@ class QgsLayerItem(QgsTreeItem):
         return [publishLayerAction, createStoreFromLayerAction, importToPostGisAction]   
     
     def multipleSelectionContextMenuActions(self, tree, explorer, selected):    
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/publish-to-geoserver.png")    
+        icon = getIcon("publish-to-geoserver.png")    
         publishLayersAction = QtGui.QAction(icon, "Publish to GeoServer...", explorer)
         publishLayersAction.triggered.connect(lambda: self.publishLayers(tree, explorer, selected))
         publishLayersAction.setEnabled(len(explorer.catalogs())>0)        
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/create-store-from-layer.png") 
+        icon = getIcon("create-store-from-layer.png") 
         createStoresFromLayersAction= QtGui.QAction(icon, "Create stores from layers...", explorer)
         createStoresFromLayersAction.triggered.connect(lambda: self.createStoresFromLayers(tree, explorer, selected))
         createStoresFromLayersAction.setEnabled(len(explorer.catalogs())>0)  
@@ -177,7 +176,7 @@ class QgsLayerItem(QgsTreeItem):
                 explorer.run(dlg.connection.importFileOrLayer, 
                             "Import layer into PostGIS",
                             tree.findAllItems(schema),
-                            layer, dlg.schema, dlg.tablename, not dlg.add, dlg.single)
+                            layer, dlg.schema, dlg.tablename, not dlg.add, dlg.single, dlg.parallel)
                 explorer.setProgress(i + 1)     
             explorer.resetActivity() 
                               
@@ -223,7 +222,12 @@ class QgsLayerItem(QgsTreeItem):
                  self.element, dlg.workspace, True)
                     
     def publishLayer(self, tree, explorer):
-        dlg = PublishLayerDialog(explorer.catalogs())
+        layer = self.element
+        if layer.type() == layer.VectorLayer:
+            fields = [f.name() for f in layer.pendingFields()]
+            dlg = PublishLayerDialog(explorer.catalogs(), fields = fields, selected = styleAttributes(layer))
+        else:
+            dlg = PublishLayerDialog(explorer.catalogs())
         dlg.exec_()      
         if dlg.catalog is None:
             return
@@ -233,23 +237,21 @@ class QgsLayerItem(QgsTreeItem):
         explorer.run(publishLayer,
                  "Publish layer '" + self.element.name() + "'",
                  [catItem],
-                 ogcat, self.element, dlg.workspace, True)
+                 ogcat, self.element, dlg.workspace, True, None, dlg.attributes)
 
              
 class QgsGroupItem(QgsTreeItem): 
     def __init__(self, group): 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/group.gif")
+        icon = getIcon("group.gif")
         TreeItem.__init__(self, group , icon)   
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDragEnabled)
         
     def populate(self):            
         grouplayers = qgislayers.getGroups()[self.element]
-        for layer in grouplayers:
-            layerItem = QgsLayerItem(layer)                                
-            self.addChild(layerItem)
+        self.addChildren([QgsLayerItem(layer) for layer in grouplayers])
 
     def contextMenuActions(self, tree, explorer): 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/publish-to-geoserver.png")                
+        icon = getIcon("publish-to-geoserver.png")                
         publishGroupAction = QtGui.QAction(icon, "Publish...", explorer)
         publishGroupAction.triggered.connect(lambda: self.publishGroup(tree, explorer))
         publishGroupAction.setEnabled(len(explorer.catalogs())>0)
@@ -302,16 +304,16 @@ class QgsGroupItem(QgsTreeItem):
                
 class QgsStyleItem(QgsTreeItem): 
     def __init__(self, layer): 
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/style.png")
+        icon = getIcon("style.png")
         TreeItem.__init__(self, layer, icon, "Style of layer '" + layer.name() + "'") 
         self.setFlags(QtCore.Qt.ItemIsEnabled | QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsDragEnabled)
         
     def contextMenuActions(self, tree, explorer):
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/publish-to-geoserver.png")
+        icon = getIcon("publish-to-geoserver.png")
         publishStyleAction = QtGui.QAction(icon, "Publish...", explorer)
         publishStyleAction.triggered.connect(lambda: self.publishStyle(tree, explorer))
         publishStyleAction.setEnabled(len(explorer.catalogs()) > 0)
-        icon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/edit.png")
+        icon = getIcon("edit.png")
         editAction = QtGui.QAction(icon, "Edit...", explorer)
         editAction.triggered.connect(lambda: config.iface.showLayerProperties(self.element))   
         return [publishStyleAction, editAction]    
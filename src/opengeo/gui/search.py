@@ -0,0 +1,81 @@
+import re
+from bisect import bisect_left, insort
+
+_separators = re.compile(r"[\W_]+", re.UNICODE)
+
+def tokenize(text):
+    '''Splits a text into the lowercase words used as index terms'''
+    if not text:
+        return set()
+    return set(t for t in _separators.split(unicode(text).lower()) if t)
+
+
+class SearchIndex(object):
+    '''
+    An inverted index from words to the documents containing them.
+    Documents can be added and removed one by one, so the index can be kept
+    up to date as the content of the explorer changes.
+    Queries match documents containing words that start with every word in the
+    query, so results can be shown as the user types
+    '''
+
+    def __init__(self):
+        self.postings = {}
+        self.terms = []
+        self.documents = {}
+
+    def add(self, document, text):
+        if document in self.documents:
+            self.remove(document)
+        tokens = tokenize(text)
+        self.documents[document] = tokens
+        for token in tokens:
+            postings = self.postings.get(token)
+            if postings is None:
+                postings = set()
+                self.postings[token] = postings
+                insort(self.terms, token)
+            postings.add(document)
+
+    def remove(self, document):
+        tokens = self.documents.pop(document, ())
+        for token in tokens:
+            postings = self.postings[token]
+            postings.discard(document)
+            if not postings:
+                del self.postings[token]
+                del self.terms[bisect_left(self.terms, token)]
+
+    def _prefixMatches(self, prefix):
+        matches = set()
+        i = bisect_left(self.terms, prefix)
+        while i < len(self.terms) and self.terms[i].startswith(prefix):
+            matches.update(self.postings[self.terms[i]])
+            i += 1
+        return matches
+
+    def search(self, query):
+        '''Returns the set of documents matching all the words in the query'''
+        result = None
+        for token in sorted(tokenize(query), key = len, reverse = True):
+            matches = self._prefixMatches(token)
+            result = matches if result is None else result & matches
+            if not result:
+                break
+        return result or set()
+
+    def matches(self, document, query):
+        '''
+        Returns True if an indexed document matches all the words in the query. Unlike search,
+        it only looks at the words of that document, so it is cheap to check new documents
+        '''
+        tokens = self.documents.get(document)
+        if not tokens:
+            return False
+        return all(any(t.startswith(word) for t in tokens) for word in tokenize(query))
+
+    def __len__(self):
+        return len(self.documents)
+
+    def __contains__(self, document):
+        return document in self.documents
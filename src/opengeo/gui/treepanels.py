@@ -1,4 +1,3 @@
-import os
 from PyQt4 import QtGui, QtCore
 from opengeo.gui.gsexploreritems import GsLayerItem,\
     GsWorkspaceItem, GsStyleItem, GsGroupItem,\
@@ -6,17 +5,19 @@ from opengeo.gui.gsexploreritems import GsLayerItem,\
     GsWorkspacesItem, GsProcessesItem
 from opengeo.qgis import layers as qgislayers
 from opengeo.gui.explorertree import ExplorerTreeWidget
-from opengeo.geoserver.gwc import Gwc
 from opengeo.postgis.connection import PgConnection
-from opengeo.gui.pgexploreritems import PgConnectionsItem, PgSchemaItem
+from opengeo.gui.pgexploreritems import PgSchemaItem
 from opengeo.gui.qgsexploreritems import QgsProjectItem, QgsGroupItem,\
     QgsLayerItem, QgsStyleItem
-from opengeo.geoserver.wps import Wps
 from dialogs.catalogdialog import DefineCatalogDialog
 from opengeo.gui.dialogs.userpasswd import UserPasswdDialog
 from opengeo.gui.dialogs.pgconnectiondialog import NewPgConnectionDialog
 from opengeo.geoserver.catalog import Catalog
 from opengeo.gui.gwcexploreritems import GwcLayerItem, GwcLayersItem
+from opengeo.gui.exploreritems import children, reconcileChildren, discardNewChildren,\
+    loadInBackground, TreeItem
+from opengeo.gui.icons import getIcon, getDisabledIcon
+from opengeo.gui.worker import runInBackground
 
 class GsTreePanel(QtGui.QWidget):
     
@@ -36,12 +37,12 @@ class GsTreePanel(QtGui.QWidget):
         horizontalLayout.addWidget(self.comboBox)
         self.addButton = QtGui.QPushButton()
         self.addButton.clicked.connect(lambda: self.addCatalog(explorer))
-        addIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")
+        addIcon = getIcon("add.png")
         self.addButton.setIcon(addIcon)
         self.addButton.setSizePolicy(QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum) 
         self.refreshButton = QtGui.QPushButton()
         self.refreshButton.clicked.connect(self.refreshContent)
-        refreshIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/refresh.png")
+        refreshIcon = getIcon("refresh.png")
         self.refreshButton.setIcon(refreshIcon)
         self.refreshButton.setSizePolicy(QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum) 
         self.refreshButton.setEnabled(False)
@@ -56,27 +57,27 @@ class GsTreePanel(QtGui.QWidget):
         verticalLayout.addWidget(self.tree)        
         self.toolbar = QtGui.QToolBar()
         self.toolbar.setToolButtonStyle(QtCore.Qt.ToolButtonIconOnly)
-        layersIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer.png")
+        layersIcon = getIcon("layer.png")
         self.layersAction = QtGui.QAction(layersIcon, "Layers", explorer)
         self.layersAction.triggered.connect(lambda: self.toggleVisibility((GsLayerItem), 
                                             self.containerItems[0].contextMenuActions(self.tree, self.explorer)))        
-        workspacesIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/workspace.png")
+        workspacesIcon = getIcon("workspace.png")
         self.workspacesAction = QtGui.QAction(workspacesIcon, "Workspaces", explorer)
         self.workspacesAction.triggered.connect(lambda: self.toggleVisibility((GsWorkspaceItem),
                                                 self.containerItems[1].contextMenuActions(self.tree, self.explorer))) 
-        stylesIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/style.png")
+        stylesIcon = getIcon("style.png")
         self.stylesAction = QtGui.QAction(stylesIcon, "Styles", explorer)
         self.stylesAction.triggered.connect(lambda: self.toggleVisibility((GsStyleItem),
                                             self.containerItems[2].contextMenuActions(self.tree, self.explorer))) 
-        groupsIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/group.gif")
+        groupsIcon = getIcon("group.gif")
         self.groupsAction = QtGui.QAction(groupsIcon, "Groups", explorer)
         self.groupsAction.triggered.connect(lambda: self.toggleVisibility((GsGroupItem),
                                             self.containerItems[3].contextMenuActions(self.tree, self.explorer))) 
-        gwcIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/gwc.png")
+        gwcIcon = getIcon("gwc.png")
         self.gwcAction = QtGui.QAction(gwcIcon, "GeoWebCache", explorer)
         self.gwcAction.triggered.connect(lambda: self.toggleVisibility((GwcLayerItem),
                                         self.containerItems[4].contextMenuActions(self.tree, self.explorer))) 
-        wpsIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/process.png")
+        wpsIcon = getIcon("process.png")
         self.wpsAction = QtGui.QAction(wpsIcon, "Processes", explorer)
         self.wpsAction.triggered.connect(lambda: self.toggleVisibility((GsProcessItem),
                                         self.containerItems[5].contextMenuActions(self.tree, self.explorer))) 
@@ -112,73 +113,49 @@ class GsTreePanel(QtGui.QWidget):
         self.tree.currentItem()
     
     def fillTree(self):    
-        self.tree.clear() 
-        QtGui.QApplication.setOverrideCursor(QtGui.QCursor(QtCore.Qt.WaitCursor)) 
-        self.explorer.setProgressMaximum(7, "Filling explorer tree")      
-        try:
-            groups = self.catalog.get_layergroups()
-            for group in groups:
-                groupItem = GsGroupItem(group)
-                groupItem.populate()                                
-                self.tree.addTopLevelItem(groupItem)          
-            self.explorer.setProgress(1)
-            cat = self.catalog            
-            try:
-                defaultWorkspace = cat.get_default_workspace()
-                defaultWorkspace.fetch()
-                defaultName = defaultWorkspace.dom.find('name').text
-            except:
-                defaultName = None             
-            self.explorer.setProgress(2)
-            workspaces = cat.get_workspaces()
-            for workspace in workspaces:
-                workspaceItem = GsWorkspaceItem(workspace, workspace.name == defaultName)
-                workspaceItem.populate()
-                self.tree.addTopLevelItem(workspaceItem)
-            self.explorer.setProgress(3)
-            styles = self.catalog.get_styles()
-            for style in styles:
-                styleItem = GsStyleItem(style, False)                
-                self.tree.addTopLevelItem(styleItem)
-            self.explorer.setProgress(4)                    
-            layers = self.catalog.get_layers()
-            for layer in layers:
-                layerItem = GsLayerItem(layer)            
-                layerItem.populate()    
-                self.tree.addTopLevelItem(layerItem)
-            self.explorer.setProgress(5)                   
-            gwc = Gwc(self.catalog)        
-            layers = gwc.layers()
-            for layer in layers:
-                item = GwcLayerItem(layer)
-                self.tree.addTopLevelItem(item)
-            self.explorer.setProgress(6)
-            self.element = Wps(self.catalog)        
+        '''
+        Fills the tree with the elements of the current catalog. Top level items are created
+        from the same data as the children of the containers, which is fetched in the background,
+        and their own children are only fetched when they are expanded
+        '''
+        catalog = self.catalog
+        #we keep a list of container items, to use their actions
+        self.containerItems = [GsLayersItem(catalog), GsWorkspacesItem(catalog),
+                               GsStylesItem(catalog),GsGroupsItem(catalog), 
+                               GwcLayersItem(catalog), GsProcessesItem(catalog)]
+        containers = list(self.containerItems)
+        root = self.tree.invisibleRootItem()
+        def load():
+            return [container.loadChildren() for container in containers]
+        def addLoaded(data):
+            if self.catalog is not catalog:
+                #a different catalog was selected while loading this one
+                return
+            items = []
+            for container, containerData in zip(containers, data):
+                items.extend(container.childItems(containerData))
+            #items are sorted before adding them, since sorting the tree afterwards
+            #moves the items one by one 
+            items.sort(key = lambda item: unicode(item.text(0)))
+            previous = children(root)
             try:
-                processes = self.catalog.processes()
-                for process in processes:
-                    item = GsProcessItem(process)
-                    self.tree.addTopLevelItem(item)
-                self.explorer.setProgress(7)                
+                self.tree.addTopLevelItems(items)
+                reconcileChildren(root, previous, self.explorer)
             except:
-                #ignore this section if catalog does not have WPS installed
-                pass  
-            self.explorer.resetActivity()
-            self.tree.invisibleRootItem().sortChildren(0, QtCore.Qt.AscendingOrder)
-            #we keep a list of container items, to use their actions
-            self.containerItems = [GsLayersItem(self.catalog), GsWorkspacesItem(self.catalog),
-                                   GsStylesItem(self.catalog),GsGroupsItem(self.catalog), 
-                                   GwcLayersItem(self.catalog), GsProcessesItem(self.catalog)]
-                          
-        finally:
-            self.explorer.setProgress(0)
-            QtGui.QApplication.restoreOverrideCursor()
+                discardNewChildren(root, previous)
+                raise
+            self.toggleVisibility(getattr(self, "visibleItems", (GsLayerItem)),
+                                  getattr(self, "visibleActions", []))
+        self.worker = loadInBackground(root, load, addLoaded, self.explorer, self.comboBox.currentText())
 
     def toggleVisibility(self, visibleItems = (type(None)), visibleActions = []):
         root = self.tree.invisibleRootItem()
         for i in range(root.childCount()):
             item = root.child(i)
-            item.setHidden(not isinstance(item, visibleItems))
+            #the placeholder shown while loading is not hidden
+            item.setHidden(isinstance(item, TreeItem) and not isinstance(item, visibleItems))
+            self.tree.hiddenItems.discard(item)
+        self.tree.filterItems(self.tree.searchQuery)
         self.toptoolbar.setVisible(len(visibleActions)>0)
         self.toptoolbar.clear()
         for action in visibleActions:   
@@ -237,7 +214,6 @@ class PgTreePanel(QtGui.QWidget):
     def __init__(self, explorer):                 
         QtGui.QWidget.__init__(self, None) 
         self.explorer = explorer
-        self.connectionsItem = PgConnectionsItem()
         self.connection = None                
         verticalLayout = QtGui.QVBoxLayout()
         verticalLayout.setSpacing(2)
@@ -251,12 +227,12 @@ class PgTreePanel(QtGui.QWidget):
         horizontalLayout.addWidget(self.comboBox)
         self.addButton = QtGui.QPushButton()
         self.addButton.clicked.connect(lambda: self.addConnection(explorer))
-        addIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/add.png")
+        addIcon = getIcon("add.png")
         self.addButton.setIcon(addIcon)
         self.addButton.setSizePolicy(QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum) 
         self.refreshButton = QtGui.QPushButton()
         self.refreshButton.clicked.connect(self.refreshContent)
-        refreshIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/refresh.png")
+        refreshIcon = getIcon("refresh.png")
         self.refreshButton.setIcon(refreshIcon)
         self.refreshButton.setSizePolicy(QtGui.QSizePolicy.Minimum, QtGui.QSizePolicy.Minimum)
         horizontalLayout.addWidget(self.refreshButton) 
@@ -266,8 +242,6 @@ class PgTreePanel(QtGui.QWidget):
         verticalLayout.addWidget(self.tree)                
         self.setLayout(verticalLayout)   
         self.populateComboBox()
-        if self.connection is not None and self.connection.isValid:
-            self.refreshContent()     
     
     def populateComboBox(self):
         connections = []
@@ -278,17 +252,42 @@ class PgTreePanel(QtGui.QWidget):
             try:                                            
                 conn = PgConnection(name, settings.value('host'), int(settings.value('port')), 
                                 settings.value('database'), settings.value('username'), 
-                                settings.value('password'))                 
+                                settings.value('password'), connect = False)                 
                 connections.append(conn)                
             except Exception, e:                
                 pass
             finally:                            
                 settings.endGroup() 
         for conn in connections:
-            name = conn.name if conn.isValid else conn.name + " [could not connect to DB]"
-            self.comboBox.addItem(name, conn)
+            self.comboBox.addItem(conn.name, conn)
         if connections:
             self.connection = connections[0]
+            #only the selected database is connected to, and without blocking the GUI
+            self.connectInBackground(self.connection)
+    
+    def connectInBackground(self, conn):
+        if conn.connectionAttempted() or getattr(conn, "worker", None) is not None:
+            return
+        self.updateConnectionLabel(conn)
+        conn.worker = runInBackground(conn.connect, lambda result: self.connectionFinished(conn))
+        
+    def connectionFinished(self, conn):
+        conn.worker = None
+        self.updateConnectionLabel(conn)
+        if conn is self.connection and conn.isValid:
+            self.refreshContent()
+            
+    def updateConnectionLabel(self, conn):
+        if conn.isValid:
+            label, icon = conn.name, getIcon("postgis.png")
+        elif conn.error is not None:
+            label, icon = conn.name + " [could not connect to DB]", getIcon("wrong.gif")
+        else:
+            label, icon = conn.name + " [connecting...]", getDisabledIcon("postgis.png")
+        for i in range(self.comboBox.count()):
+            if self.comboBox.itemData(i) is conn:
+                self.comboBox.setItemText(i, label)
+                self.comboBox.setItemIcon(i, icon)
     
     def addConnection(self, explorer):
         dlg = NewPgConnectionDialog(explorer)
@@ -302,31 +301,46 @@ class PgTreePanel(QtGui.QWidget):
     
     def connectionHasChanged(self):        
         self.connection = self.comboBox.itemData(self.comboBox.currentIndex())        
-        if self.connection is not None and self.connection.isValid:
+        if self.connection is None:
+            return
+        if not self.connection.connectionAttempted():
+            self.connectInBackground(self.connection)
+        elif self.connection.isValid:
             self.refreshContent()
         
     def refreshContent(self):
         if self.connection is None:
             return        
+        if not self.connection.isValid:
+            #the server might be reachable now
+            self.connection.reconnect()
+            self.updateConnectionLabel(self.connection)
         if not self.connection.isValid:            
             dlg = UserPasswdDialog()
             dlg.exec_()
             if dlg.user is None:
                 return
             self.connection.reconnect(dlg.user, dlg.passwd)            
+            self.updateConnectionLabel(self.connection)
             if not self.connection.isValid:
                 QtGui.QMessageBox.warning(None, "Error connecting to DB", "Cannot connect to the database")
                 return 
 
-        self.tree.clear()        
+        root = self.tree.invisibleRootItem()
+        previous = children(root)       
+        self.connection.geodb.invalidate()
         schemas = self.connection.schemas()
+        items = []
         for schema in schemas:
             schemItem = PgSchemaItem(schema)
             schemItem.populate()
-            self.tree.addTopLevelItem(schemItem)
+            items.append(schemItem)
+        self.tree.addTopLevelItems(items)
+        reconcileChildren(root, previous, self.explorer)
          
     def databases(self):
-        return self.connectionsItem.databases
+        connections = [self.comboBox.itemData(i) for i in range(self.comboBox.count())]
+        return [conn for conn in connections if conn.isValid]
             
     def currentItem(self):
         self.tree.currentItem()        
@@ -350,13 +364,13 @@ class QgsTreePanel(QtGui.QWidget):
             self.toptoolbar.addAction(action)        
         self.toolbar = QtGui.QToolBar()
         self.toolbar.setToolButtonStyle(QtCore.Qt.ToolButtonIconOnly)
-        layersIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/layer.png")
+        layersIcon = getIcon("layer.png")
         self.layersAction = QtGui.QAction(layersIcon, "Layers", explorer)
         self.layersAction.triggered.connect(self.showLayers)                
-        stylesIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/style.png")
+        stylesIcon = getIcon("style.png")
         self.stylesAction = QtGui.QAction(stylesIcon, "Styles", explorer)
         self.stylesAction.triggered.connect(self.showStyles)
-        groupsIcon = QtGui.QIcon(os.path.dirname(__file__) + "/../images/group.gif")
+        groupsIcon = getIcon("group.gif")
         self.groupsAction = QtGui.QAction(groupsIcon, "Groups", explorer)
         self.groupsAction.triggered.connect(self.showGroups)                
         self.toolbar.addAction(self.layersAction)        
@@ -375,10 +389,12 @@ class QgsTreePanel(QtGui.QWidget):
             return      
         self.tree.clear()     
         groups = qgislayers.getGroups()
+        items = []
         for group in groups:
             groupItem = QgsGroupItem(group)                                
             groupItem.populate()
-            self.tree.addTopLevelItem(groupItem)          
+            items.append(groupItem)
+        self.tree.addTopLevelItems(items)          
         self.lastAction = self.sender()
             
     def showStyles(self):
@@ -386,9 +402,7 @@ class QgsTreePanel(QtGui.QWidget):
             return
         self.tree.clear()
         styles = qgislayers.getVectorLayers()
-        for style in styles:
-            styleItem = QgsStyleItem(style)               
-            self.tree.addTopLevelItem(styleItem)
+        self.tree.addTopLevelItems([QgsStyleItem(style) for style in styles])
         self.lastAction = self.sender()
                      
     def showLayers(self):              
@@ -396,9 +410,7 @@ class QgsTreePanel(QtGui.QWidget):
             return           
         self.tree.clear()
         layers = qgislayers.getAllLayers()
-        for layer in layers:
-            layerItem = QgsLayerItem(layer)                                    
-            self.tree.addTopLevelItem(layerItem)
+        self.tree.addTopLevelItems([QgsLayerItem(layer) for layer in layers])
         self.lastAction = self.sender()                                   
             
     def refreshContent(self):
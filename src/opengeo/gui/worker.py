@@ -0,0 +1,41 @@
+import traceback
+from PyQt4 import QtCore
+
+# running workers are kept here, so they are not garbage collected before finishing
+_running = set()
+
+class Worker(QtCore.QThread):
+    '''
+    Runs a function in a background thread.
+    The result is reported through the resultReady signal, and the traceback of
+    any exception raised by the function through the errorRaised one.
+    Both are delivered in the GUI thread, so slots can safely modify widgets
+    '''
+
+    resultReady = QtCore.pyqtSignal(object)
+    errorRaised = QtCore.pyqtSignal(object)
+
+    def __init__(self, func, *args):
+        QtCore.QThread.__init__(self)
+        self.func = func
+        self.args = args
+
+    def run(self):
+        try:
+            result = self.func(*self.args)
+        except Exception:
+            self.errorRaised.emit(traceback.format_exc())
+            return
+        self.resultReady.emit(result)
+
+
+def runInBackground(func, onResult, onError = None, *args):
+    '''Runs the passed function in a background thread and returns the worker running it'''
+    worker = Worker(func, *args)
+    worker.resultReady.connect(onResult)
+    if onError is not None:
+        worker.errorRaised.connect(onError)
+    _running.add(worker)
+    worker.finished.connect(lambda: _running.discard(worker))
+    worker.start()
+    return worker
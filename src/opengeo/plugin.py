@@ -7,6 +7,7 @@ from PyQt4.QtGui import *
 from opengeo import config
 from opengeo.gui.explorer import OpenGeoExplorer
 from opengeo.gui.dialogs.configdialog import ConfigDialog
+from opengeo.postgis import pool
 
 class OpenGeoPlugin:
 
@@ -18,6 +19,7 @@ class OpenGeoPlugin:
         self.menu.deleteLater()                
         self.iface.legendInterface().itemAdded.disconnect(self.explorer.updateQgisContent)
         self.iface.legendInterface().itemRemoved.disconnect(self.explorer.updateQgisContent)
+        pool.closeAll()
 
     def initGui(self):
         
@@ -0,0 +1,255 @@
+'''
+Finds problems in the physical layout of PostGIS tables that make them slow to serve,
+and fixes them.
+
+Only tables with geometry columns are checked, since those are the ones published
+to GeoServer. The problems found are geometry columns without a spatial index, tables
+without the primary key GeoServer needs for stable feature ids, tables whose statistics
+are missing or out of date, and large tables whose rows are not stored in spatial order,
+so a bounding box query has to read pages from all over the table.
+
+The spatial order of a table is measured on a sample of its rows, sorted by the geohash
+of their geometries: in a table stored in spatial order, rows that are next to each other
+in that order are usually in the same page. Tables without a known SRID cannot be
+geohashed, so their order is not checked.
+'''
+
+import time
+import psycopg2.extensions
+from opengeo.postgis.postgis_utils import DbError, unique_name
+
+MISSING_SPATIAL_INDEX = "index"
+MISSING_PRIMARY_KEY = "pk"
+POORLY_CLUSTERED = "cluster"
+STALE_STATISTICS = "statistics"
+
+# fixes are applied in this order, so tables are clustered using the new indexes
+# and analyzed once their layout has changed
+FIX_ORDER = [MISSING_SPATIAL_INDEX, MISSING_PRIMARY_KEY, POORLY_CLUSTERED, STALE_STATISTICS]
+
+CLUSTER_INDEX = "index"
+CLUSTER_GEOHASH = "geohash"
+
+# tables smaller than this (in 8KB pages) are cheap to read whatever their order
+CLUSTER_MIN_PAGES = 1000
+# rows sampled to measure the spatial order of a table
+SAMPLE_ROWS = 10000
+# fraction of the rows of the sample next to a row of the same page in geohash order, relative
+# to the fraction in a table stored in spatial order, below which a table is poorly clustered
+MIN_LOCALITY = 0.5
+# statistics are stale when more than this fraction of the rows changed since the last ANALYZE
+STALE_FRACTION = 0.1
+STALE_MIN_ROWS = 50
+
+
+class Issue(object):
+    '''A problem found in a table, for a given geometry column'''
+
+    def __init__(self, kind, schema, table, column, description):
+        self.kind = kind
+        self.schema = schema
+        self.table = table
+        self.column = column
+        self.description = description
+
+    def __repr__(self):
+        return "%s.%s: %s" % (self.schema, self.table, self.description)
+
+
+def findIssues(geodb, schema = None):
+    '''Returns the issues found in the tables with geometry columns of a schema, or of the whole database'''
+    where = ""
+    if schema is not None:
+        where = " AND n.nspname = '%s'" % geodb._quote_str(schema)
+    sql = """SELECT n.nspname, c.relname, gc.f_geometry_column, c.relpages, c.reltuples,
+            EXISTS (SELECT 1 FROM pg_index i
+                    JOIN pg_class ic ON ic.oid = i.indexrelid
+                    JOIN pg_am am ON am.oid = ic.relam
+                    WHERE i.indrelid = c.oid AND am.amname IN ('gist', 'spgist', 'brin')
+                    AND i.indisvalid AND a.attnum = ANY(i.indkey)),
+            EXISTS (SELECT 1 FROM pg_constraint k WHERE k.conrelid = c.oid AND k.contype = 'p'),
+            EXISTS (SELECT 1 FROM spatial_ref_sys r WHERE r.srid = gc.srid AND gc.srid > 0),
+            s.n_live_tup, s.n_mod_since_analyze,
+            COALESCE(s.last_analyze, s.last_autoanalyze) IS NOT NULL
+        FROM geometry_columns gc
+        JOIN pg_namespace n ON n.nspname = gc.f_table_schema
+        JOIN pg_class c ON c.relnamespace = n.oid AND c.relname = gc.f_table_name
+        JOIN pg_attribute a ON a.attrelid = c.oid AND a.attname = gc.f_geometry_column
+        LEFT JOIN pg_stat_user_tables s ON s.relid = c.oid
+        WHERE c.relkind = 'r' %s
+        ORDER BY n.nspname, c.relname, a.attnum""" % where
+    cursor = geodb.con.cursor()
+    try:
+        geodb._exec_sql(cursor, sql)
+        rows = cursor.fetchall()
+    finally:
+        geodb.con.rollback()
+
+    issues = []
+    checked = set()
+    for (nspname, relname, column, pages, tuples, indexed, hasPk, knownSrid,
+            liveRows, modified, analyzed) in rows:
+        if not indexed:
+            issues.append(Issue(MISSING_SPATIAL_INDEX, nspname, relname, column,
+                                "No spatial index on column '%s'" % column))
+        # the remaining checks are per table, using its first geometry column
+        if (nspname, relname) in checked:
+            continue
+        checked.add((nspname, relname))
+        if not hasPk:
+            issues.append(Issue(MISSING_PRIMARY_KEY, nspname, relname, column,
+                                "No primary key, so GeoServer cannot create stable feature ids"))
+        tableRows = max(liveRows or 0, tuples or 0)
+        if not analyzed and tableRows > 0:
+            issues.append(Issue(STALE_STATISTICS, nspname, relname, column, "Never analyzed"))
+        elif modified is not None and modified > max(STALE_MIN_ROWS, STALE_FRACTION * tableRows):
+            issues.append(Issue(STALE_STATISTICS, nspname, relname, column,
+                                "%i rows changed since it was last analyzed" % modified))
+        if pages >= CLUSTER_MIN_PAGES and knownSrid:
+            locality = _spatialLocality(geodb, nspname, relname, column, tableRows)
+            if locality is not None and locality < MIN_LOCALITY:
+                issues.append(Issue(POORLY_CLUSTERED, nspname, relname, column,
+                                    "Rows are not stored in spatial order (%i pages)" % pages))
+    return issues
+
+
+def _geohash(column):
+    return "ST_GeoHash(ST_Transform(ST_Centroid(ST_Envelope(%s)), 4326), 10)" % column
+
+def _spatialLocality(geodb, schema, table, column, rows):
+    '''
+    Returns how close the physical order of a table is to a spatial one, from 0 (random) to
+    about 1 (stored in spatial order), measured on a sample of its rows. Returns None if it
+    cannot be measured, because the sample is too small or its geometries cannot be geohashed
+    '''
+    quoted = geodb._quote(column)
+    if geodb.con.server_version >= 90500:
+        # whole pages are sampled, so rows stored together are sampled together
+        sample = "TABLESAMPLE SYSTEM (%f)" % min(100.0, 100.0 * SAMPLE_ROWS / max(rows, 1))
+    else:
+        sample = ""
+    sql = """SELECT count(*), count(DISTINCT page), count(NULLIF(page = previous, false))
+        FROM (SELECT page, lag(page) OVER (ORDER BY hash) AS previous
+              FROM (SELECT (ctid::text::point)[0] AS page, %s AS hash FROM %s %s
+                    WHERE %s IS NOT NULL AND NOT ST_IsEmpty(%s) LIMIT %i) AS sample) AS ordered""" % (
+        _geohash(quoted), geodb._table_name(schema, table), sample, quoted, quoted, SAMPLE_ROWS)
+    cursor = geodb.con.cursor()
+    try:
+        geodb._exec_sql(cursor, sql)
+        sampled, pages, together = cursor.fetchone()
+    except DbError:
+        # the geometries cannot be geohashed, as when they are outside the area of validity of their SRID
+        return None
+    finally:
+        geodb.con.rollback()
+    # in a table stored in spatial order, all the rows of a page but one follow another row of that page
+    if sampled - pages < SAMPLE_ROWS / 100:
+        return None
+    return float(together) / (sampled - pages)
+
+
+def _spatialIndex(geodb, schema, table, column):
+    '''Returns the name of a GiST index on a column, or None if there is none'''
+    cursor = geodb.con.cursor()
+    geodb._exec_sql(cursor, """SELECT ic.relname FROM pg_index i
+            JOIN pg_class ic ON ic.oid = i.indexrelid
+            JOIN pg_am am ON am.oid = ic.relam
+            JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+            WHERE i.indrelid = '%s'::regclass AND am.amname = 'gist' AND i.indisvalid AND a.attname = '%s'"""
+            % (geodb._quote_str(geodb._table_name(schema, table)), geodb._quote_str(column)))
+    row = cursor.fetchone()
+    return row[0] if row is not None else None
+
+def _hasKnownSrid(geodb, schema, table, column):
+    '''Returns True if a geometry column has an SRID defined in spatial_ref_sys'''
+    cursor = geodb.con.cursor()
+    geodb._exec_sql(cursor, """SELECT EXISTS (SELECT 1 FROM geometry_columns gc
+            JOIN spatial_ref_sys r ON r.srid = gc.srid
+            WHERE gc.f_table_schema = '%s' AND gc.f_table_name = '%s' AND gc.f_geometry_column = '%s' AND gc.srid > 0)"""
+            % (geodb._quote_str(schema), geodb._quote_str(table), geodb._quote_str(column)))
+    return cursor.fetchone()[0]
+
+def _isInvalidIndex(geodb, schema, name):
+    '''
+    Returns True if there is an invalid index with the passed name, as left by a
+    CREATE INDEX CONCURRENTLY that failed or was cancelled
+    '''
+    cursor = geodb.con.cursor()
+    geodb._exec_sql(cursor, """SELECT NOT i.indisvalid FROM pg_index i
+            JOIN pg_class ic ON ic.oid = i.indexrelid
+            JOIN pg_namespace n ON n.oid = ic.relnamespace
+            WHERE n.nspname = '%s' AND ic.relname = '%s'"""
+            % (geodb._quote_str(schema), geodb._quote_str(name)))
+    row = cursor.fetchone()
+    return row is not None and row[0]
+
+def fixStatements(geodb, issue, clusterMethod = CLUSTER_INDEX):
+    '''Returns the SQL statements that fix an issue'''
+    table = geodb._table_name(issue.schema, issue.table)
+    column = geodb._quote(issue.column)
+    if issue.kind == MISSING_SPATIAL_INDEX:
+        name = "%s_%s_gist" % (issue.table, issue.column)
+        statements = []
+        if _isInvalidIndex(geodb, issue.schema, name):
+            # a previous attempt was interrupted, and its index would block creating the new one
+            statements.append("DROP INDEX %s" % geodb._table_name(issue.schema, name))
+        statements.append("CREATE INDEX CONCURRENTLY %s ON %s USING GIST (%s)"
+                          % (geodb._quote(name), table, column))
+        return statements
+    elif issue.kind == MISSING_PRIMARY_KEY:
+        names = [f.name for f in geodb.get_table_fields(issue.table, issue.schema)]
+        return ["ALTER TABLE %s ADD COLUMN %s serial PRIMARY KEY" % (table, geodb._quote(unique_name("gid", names)))]
+    elif issue.kind == POORLY_CLUSTERED:
+        if clusterMethod == CLUSTER_GEOHASH:
+            if not _hasKnownSrid(geodb, issue.schema, issue.table, issue.column):
+                raise DbError("Table '%s' has no known SRID, so it cannot be sorted by geohash" % issue.table)
+            # the index is only needed to sort the table, and is dropped once it is clustered.
+            # One left by an interrupted attempt is dropped first
+            index = "%s_%s_geohash" % (issue.table, issue.column)
+            qualified = geodb._table_name(issue.schema, index)
+            return ["DROP INDEX IF EXISTS %s" % qualified,
+                    "CREATE INDEX %s ON %s (%s)" % (geodb._quote(index), table, _geohash(column)),
+                    "CLUSTER %s USING %s" % (table, geodb._quote(index)),
+                    "DROP INDEX %s" % qualified,
+                    "ANALYZE %s" % table]
+        index = _spatialIndex(geodb, issue.schema, issue.table, issue.column)
+        if index is None:
+            raise DbError("There is no spatial index to cluster table '%s' on" % issue.table)
+        return ["CLUSTER %s USING %s" % (table, geodb._quote(index)),
+                "ANALYZE %s" % table]
+    else:
+        return ["ANALYZE %s" % table]
+
+def fixIssues(geodb, issues, clusterMethod = CLUSTER_INDEX, progress = None, cancelled = None):
+    '''
+    Fixes a list of issues, one at a time, and returns a (issue, seconds, error message) tuple
+    for each of them. Errors do not stop the batch.
+    Statements are run outside of a transaction, as required by CREATE INDEX CONCURRENTLY, which
+    does not block writes to the table while the index is built.
+    progress, if passed, is called with the number of issues fixed so far and the last one.
+    cancelled, if passed, is called before fixing each issue, and the batch stops if it returns True
+    '''
+    issues = sorted(issues, key = lambda issue: FIX_ORDER.index(issue.kind))
+    results = []
+    geodb.con.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+    try:
+        for i, issue in enumerate(issues):
+            if cancelled is not None and cancelled():
+                break
+            start = time.time()
+            error = None
+            try:
+                cursor = geodb.con.cursor()
+                for sql in fixStatements(geodb, issue, clusterMethod):
+                    geodb._exec_sql(cursor, sql)
+            except DbError, e:
+                if cancelled is not None and cancelled():
+                    break
+                error = e.message
+            results.append((issue, time.time() - start, error))
+            if progress is not None:
+                progress(i + 1, issue)
+    finally:
+        geodb.con.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED)
+        geodb.invalidate()
+    return results
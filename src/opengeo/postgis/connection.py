@@ -1,129 +1,140 @@
-from postgis_utils import GeoDB
+from postgis_utils import GeoDB, DbPoolExhaustedError
 from schema import Schema
 from qgis.core import *
 from PyQt4 import QtCore
-import re
-import subprocess
-import os
+import threading
+import loader
+
+DEFAULT_CONNECT_TIMEOUT = 10
+
+def connectTimeout():
+    try:
+        return int(QtCore.QSettings().value("/OpenGeo/Settings/PostGIS/ConnectTimeout", DEFAULT_CONNECT_TIMEOUT))
+    except (TypeError, ValueError):
+        return DEFAULT_CONNECT_TIMEOUT
+
+# kinds of operations with their own statement timeout
+COUNT = "Count"
+QUERY = "Query"
+DDL = "Ddl"
+MAINTENANCE = "Maintenance"
+
+# seconds, 0 means no timeout
+DEFAULT_STATEMENT_TIMEOUTS = {COUNT: 60, QUERY: 30, DDL: 30, MAINTENANCE: 0}
+
+def statementTimeout(operation):
+    '''Returns the seconds after which the statements of a kind of operation are cancelled, or 0 for no timeout'''
+    default = DEFAULT_STATEMENT_TIMEOUTS[operation]
+    try:
+        return max(0, int(QtCore.QSettings().value("/OpenGeo/Settings/PostGIS/%sTimeout" % operation, default)))
+    except (TypeError, ValueError):
+        return default
 
 class PgConnection(object):       
     
-    def __init__(self, name, host, port, database, username, password):
+    def __init__(self, name, host, port, database, username, password, connect = True):
         self.name = name  
         self.host = host
         self.port = port
         self.database = database      
-        try:
-            self.geodb = GeoDB(host, port, database, username, password)
-            self.isValid = True
-            self.username = username
-            self.password = password
-        except:
-            self.isValid = False
+        self.username = username
+        self.password = password
+        self.geodb = None
+        self.isValid = False
+        #the error raised by the last connection attempt, if it failed
+        self.error = None
+        #True if the last connection attempt failed because all pooled connections were in use,
+        #which says nothing about the server or the credentials
+        self.poolExhausted = False
+        self._lock = threading.Lock()
+        if connect:
+            self.reconnect()
         
+    def connectionAttempted(self):
+        return self.geodb is not None or self.error is not None
         
     def schemas(self):
         schemas = self.geodb.list_schemas()
         return [Schema(self, name) for oid, name, owner, perms in schemas]        
         
+    def connect(self):
+        '''
+        Connects to the database if no connection has been attempted yet.
+        It is safe to call it from a background thread
+        '''
+        with self._lock:
+            if not self.connectionAttempted():
+                self._connect(self.username, self.password)
+        
     def reconnect(self, username = None, password = None):        
+        with self._lock:
+            self._connect(username or self.username, password or self.password)
+            
+    def _connect(self, username, password):
+        if self.geodb is not None:
+            #give the current connection back to the pool, so it is reused instead of leaked
+            self.geodb.close()
+            self.geodb = None
         try:
-            self.geodb =  GeoDB(self.host, self.port, self.database, username or self.username, password or self.password)
+            self.geodb =  GeoDB(self.host, self.port, self.database, username, password, connectTimeout())
             self.isValid = True
-        except:
+            self.error = None
+            self.poolExhausted = False
+            self.username = username
+            self.password = password
+        except Exception, e:
             self.isValid = False
+            self.error = unicode(e)
+            self.poolExhausted = isinstance(e, DbPoolExhaustedError)
             
             
-    def importFileOrLayer(self, source, schema, tablename, overwrite, singleGeom = False):
-    
-        if overwrite:
-            pk = "id"
-            geom = "geom" 
-            providerName = "postgres" 
-            
-            if isinstance(source, basestring):
-                layerName = QtCore.QFileInfo(source).completeBaseName()
-            else:
-                layerName = source.name()
-            
-            if tablename is None:
-                tablename = layerName
-        
-            uri = QgsDataSourceURI()    
-            uri.setConnection(self.geodb.host, str(self.geodb.port), self.geodb.dbname, self.geodb.user, self.geodb.passwd)    
-            uri.setDataSource(schema, tablename, geom, "", pk)
-        
-            options = {}
-            options['overwrite'] = True
-            if singleGeom:
-                options['forceSinglePartGeometryType'] = True
-                
-            if isinstance(source, basestring):
-                layer = QgsVectorLayer(source, layerName, "ogr")    
-                if not layer.isValid() or layer.type() != QgsMapLayer.VectorLayer:
-                    layer.deleteLater()
-                    raise WrongLayerFileError("Error reading file {} or it is not a valid vector layer file".format(source))
-            else:
-                layer = source
-                if not layer.isValid() or layer.type() != QgsMapLayer.VectorLayer:
-                    raise WrongLayerFileError("Layer '%s' is not valid or is not a vector layer".format(layer.name()))               
-        
-            ret, errMsg = QgsVectorLayerImport.importLayer(layer, uri.uri(), providerName, layer.crs(), False, False, options)
-            if ret != 0:
-                raise Exception(errMsg) 
+    def importFileOrLayer(self, source, schema, tablename, overwrite, singleGeom = False, parallel = False):
+        try:
+            self._importFileOrLayer(source, schema, tablename, overwrite, singleGeom, parallel)
+        finally:
+            #tables are created outside of GeoDB, so it does not know it has to refresh its catalog
+            if self.geodb is not None:
+                self.geodb.invalidate()
+
+    def _importFileOrLayer(self, source, schema, tablename, overwrite, singleGeom = False, parallel = False):
+        if isinstance(source, basestring):
+            layerName = QtCore.QFileInfo(source).completeBaseName()
+            layer = QgsVectorLayer(source, layerName, "ogr")    
+            if not layer.isValid() or layer.type() != QgsMapLayer.VectorLayer:
+                layer.deleteLater()
+                raise WrongLayerFileError("Error reading file {} or it is not a valid vector layer file".format(source))
         else:
-            if isinstance(source, QgsMapLayer):
-                source = source.source()
-                
-            args = ["shp2pgsql", "-a"]
-            if singleGeom:
-                args.append("-S")
-            args.extend([source, schema + "." + tablename])
-            if os.name == 'nt':                
-                cmdline = subprocess.list2cmdline(args)
-                data = None
-        
-                p = os.popen3(cmdline)
-                data = p[1].read()
-                
-                cursor = self.geodb.con.cursor()
-                newcommand = re.compile(";$", re.MULTILINE)
-        
-                # split the commands
-                cmds = newcommand.split(data)
-                for cmd in cmds[:-1]:
-                    # run SQL commands within current DB connection
-                    self.geodb._exec_sql(cursor, cmd)
-                data = cmds[-1]
-                
-                self.geodb.con.commit()
+            layer = source
+            layerName = layer.name()
+            if not layer.isValid() or layer.type() != QgsMapLayer.VectorLayer:
+                raise WrongLayerFileError("Layer '{}' is not valid or is not a vector layer".format(layer.name()))               
+    
+        if tablename is None:
+            tablename = layerName
         
-                if data is None or len(data) == 0:
-                    raise Exception("".join(p[2].readlines()))
-            else:
-                # start shp2pgsql as subprocess
-                p = subprocess.Popen(args=args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                        
-                # read the output while the process is running
-                data = ''
-                cursor = self.geodb.con.cursor()
-                newcommand = re.compile(";$", re.MULTILINE)
-                while p.poll() == None:
-                    data += p.stdout.read()
-                    
-                    # split the commands
-                    cmds = newcommand.split(data)
-                    for cmd in cmds[:-1]:
-                        # run SQL commands within current DB connection
-                        self.geodb._exec_sql(cursor, cmd)
-                    data = cmds[-1]
-                    
-                # commit!
-                self.db.con.commit()
-                    
-                if p.returncode != 0:                    
-                    raise Exception(p.stderr.readlines().join("\n"))            
+        workers = loader.importWorkers() if parallel else 1
+        loader.importLayer(self.geodb, layer, schema, tablename, overwrite, singleGeom, workers = workers)
         
     
+def savedConnection(name, connect = True):
+    '''Returns the PostGIS connection with the given name from the QGIS settings, or None if it does not exist'''
+    settings = QtCore.QSettings()
+    settings.beginGroup(u'/PostgreSQL/connections')
+    if name not in settings.childGroups():
+        return None
+    settings.beginGroup(name)
+    try:
+        #QGIS does not save the port if it was left empty, and uses the default one
+        try:
+            port = int(settings.value('port') or 5432)
+        except (TypeError, ValueError):
+            port = 5432
+        return PgConnection(name, settings.value('host'), port, 
+                            settings.value('database'), settings.value('username'), 
+                            settings.value('password'), connect)
+    finally:
+        settings.endGroup()
+    
+    
 class WrongLayerFileError(Exception):
     pass                   
\ No newline at end of file
@@ -0,0 +1,380 @@
+'''
+Bulk loading of QGIS vector layers into PostGIS tables.
+
+Features are streamed into COPY ... FROM STDIN in text format, with geometries
+as hex-encoded EWKB, so the server parses each row once and no SQL statement is
+built per feature. Rows are committed in batches, which keeps memory use and
+transaction size bounded for large layers. If a batch fails, the batches already
+committed are kept in the table.
+'''
+
+import binascii
+import struct
+import itertools
+import threading
+import Queue
+from PyQt4 import QtCore
+from qgis.core import *
+from opengeo.postgis.postgis_utils import TableField, DbError, unique_name
+import psycopg2
+
+DEFAULT_BATCH_SIZE = 10000
+DEFAULT_WORKERS = 4
+
+NULL = "\\N"
+
+# EWKB flag indicating that the SRID follows the geometry type
+EWKB_SRID_FLAG = 0x20000000
+# flag used for 2.5D types both by QGIS and in EWKB
+WKB_Z_FLAG = 0x80000000
+
+_geometryTypes = {1: "POINT", 2: "LINESTRING", 3: "POLYGON",
+                  4: "MULTIPOINT", 5: "MULTILINESTRING", 6: "MULTIPOLYGON"}
+
+def batchSize():
+    try:
+        return max(1, int(QtCore.QSettings().value("/OpenGeo/Settings/PostGIS/ImportBatchSize", DEFAULT_BATCH_SIZE)))
+    except (TypeError, ValueError):
+        return DEFAULT_BATCH_SIZE
+
+def importWorkers():
+    '''Returns the number of connections used for parallel imports'''
+    try:
+        return max(1, int(QtCore.QSettings().value("/OpenGeo/Settings/PostGIS/ImportWorkers", DEFAULT_WORKERS)))
+    except (TypeError, ValueError):
+        return DEFAULT_WORKERS
+
+def toEwkb(wkb, srid):
+    '''Adds a SRID to a WKB geometry, returning it as EWKB'''
+    endianness = "<" if ord(wkb[0]) == 1 else ">"
+    geomType = struct.unpack(endianness + "I", wkb[1:5])[0]
+    return (wkb[0] + struct.pack(endianness + "I", geomType | EWKB_SRID_FLAG)
+            + struct.pack(endianness + "i", srid) + wkb[5:])
+
+def copyValue(value):
+    '''Returns an attribute value as a field for a COPY in text format'''
+    if value is None or isinstance(value, QtCore.QPyNullVariant):
+        return NULL
+    if isinstance(value, (QtCore.QDate, QtCore.QDateTime, QtCore.QTime)):
+        if value.isNull():
+            return NULL
+        value = value.toString(QtCore.Qt.ISODate)
+    elif isinstance(value, bool):
+        value = "t" if value else "f"
+    elif isinstance(value, float):
+        # repr keeps all the significant digits, while unicode rounds them
+        value = repr(value)
+    elif not isinstance(value, basestring):
+        value = unicode(value)
+    value = (value.replace("\\", "\\\\").replace("\t", "\\t")
+             .replace("\n", "\\n").replace("\r", "\\r"))
+    if isinstance(value, unicode):
+        value = value.encode("utf-8")
+    return value
+
+def copyGeometry(geom, srid, singleGeom = False):
+    '''Returns a geometry as a field for a COPY in text format'''
+    if geom is None:
+        return NULL
+    if singleGeom and geom.isMultipart():
+        parts = geom.asGeometryCollection()
+        if len(parts) != 1:
+            raise DbError("Cannot import a geometry with %i parts as a single geometry" % len(parts))
+        geom = parts[0]
+    wkb = geom.asWkb()
+    if not wkb:
+        return NULL
+    return binascii.hexlify(toEwkb(wkb, srid))
+
+def columnType(field):
+    '''Returns the PostgreSQL type and modifier used to store a layer field'''
+    fieldType = field.type()
+    if fieldType == QtCore.QVariant.Int:
+        return "integer", None
+    if fieldType == QtCore.QVariant.LongLong:
+        return "bigint", None
+    if fieldType == QtCore.QVariant.Double:
+        return "double precision", None
+    if fieldType == QtCore.QVariant.Bool:
+        return "boolean", None
+    if fieldType == QtCore.QVariant.Date:
+        return "date", None
+    if fieldType == QtCore.QVariant.DateTime:
+        return "timestamp", None
+    if fieldType == QtCore.QVariant.Time:
+        return "time", None
+    if field.length() > 0:
+        return "varchar", field.length()
+    return "text", None
+
+def geometryType(wkbType, singleGeom = False):
+    '''Returns the PostGIS type name and the dimension of a QGIS wkb type'''
+    dim = 3 if wkbType & WKB_Z_FLAG else 2
+    baseType = wkbType & ~WKB_Z_FLAG
+    if singleGeom and baseType in (4, 5, 6):
+        baseType -= 3
+    return _geometryTypes.get(baseType, "GEOMETRY"), dim
+
+class _CopyStream(object):
+    '''
+    A file-like object serving COPY rows as they are read, so the rows of a batch
+    are never all in memory at the same time
+    '''
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = ""
+        self.count = 0
+
+    def read(self, size = -1):
+        chunks = [self.buffer]
+        length = len(self.buffer)
+        while size < 0 or length < size:
+            try:
+                row = next(self.rows)
+            except StopIteration:
+                break
+            self.count += 1
+            chunks.append(row)
+            length += len(row)
+        data = "".join(chunks)
+        if size < 0:
+            self.buffer = ""
+            return data
+        self.buffer = data[size:]
+        return data[:size]
+
+
+def importLayer(geodb, layer, schema, tablename, overwrite, singleGeom = False, batch = None, workers = 1):
+    '''
+    Imports a vector layer into a PostGIS table. If overwrite is true, the table
+    is (re)created to match the layer, otherwise features are appended to an
+    existing table, copying the fields it has in common with the layer.
+    When overwriting, the layer is loaded into a staging table that replaces the
+    existing one only once it is complete, so the old table is kept if the import fails.
+    With more than one worker, the layer is loaded in parallel (see importLayerInParallel).
+    Returns the number of features imported
+    '''
+    batch = batch or batchSize()
+    if workers > 1:
+        dbs = geodb.borrow_copies(workers)
+        if len(dbs) > 1:
+            try:
+                return importLayerInParallel(geodb, dbs, layer, schema, tablename, overwrite, singleGeom, batch)
+            finally:
+                for db in dbs:
+                    db.close()
+        for db in dbs:
+            db.close()
+
+    srid = layer.crs().postgisSrid()
+    if not overwrite:
+        columns, geomColumn, srid = _tableColumns(geodb, schema, tablename, layer.pendingFields(), srid)
+        sql = _copySql(geodb, schema, tablename, columns, geomColumn)
+        return _copy(geodb, sql, _rows(layer.getFeatures(), columns, geomColumn, srid, singleGeom), batch)
+    staging = unique_name(tablename + "_staging", _tableNames(geodb, schema))
+    try:
+        pk, columns, geomColumn = _createTable(geodb, schema, staging, layer, srid, singleGeom)
+        sql = _copySql(geodb, schema, staging, columns, geomColumn)
+        total = _copy(geodb, sql, _rows(layer.getFeatures(), columns, geomColumn, srid, singleGeom), batch)
+        _buildIndexes(geodb, schema, staging, pk, geomColumn)
+        _swapTable(geodb, schema, staging, tablename, pk)
+        return total
+    except:
+        _dropStaging(geodb, schema, staging)
+        raise
+
+def importLayerInParallel(geodb, dbs, layer, schema, tablename, overwrite, singleGeom, batch):
+    '''
+    Imports a layer using several connections at the same time. This is a single reader
+    feeding several COPY streams: the layer is read in the calling thread, in its own order,
+    and split into chunks of consecutive features, which one thread per connection encodes
+    and copies into a staging table. The source is not partitioned, and the encoding is
+    Python code serialized by the GIL, so the work done in the client does not scale with
+    the cores available. What runs in parallel is the server side of the COPY streams
+    (parsing the rows and writing them to the unlogged staging table), which is usually
+    what bounds large imports.
+    Indexes are built once all the data is loaded, and the result replaces (or is appended to)
+    the destination table in a single transaction, so other clients never see a partially
+    loaded table
+    '''
+    staging = unique_name(tablename + "_staging", _tableNames(geodb, schema))
+    srid = layer.crs().postgisSrid()
+    version = geodb.con.server_version
+    try:
+        if overwrite:
+            # unlogged tables cannot be made permanent before PostgreSQL 9.5
+            unlogged = version >= 90500
+            pk, columns, geomColumn = _createTable(geodb, schema, staging, layer, srid, singleGeom, unlogged)
+        else:
+            columns, geomColumn, srid = _tableColumns(geodb, schema, tablename, layer.pendingFields(), srid)
+            names = [geodb._quote(column) for i, column in columns]
+            if geomColumn is not None:
+                names.append(geodb._quote(geomColumn))
+            geodb._exec_sql_and_commit("CREATE %sTABLE %s AS SELECT %s FROM %s WITH NO DATA"
+                                       % ("UNLOGGED " if version >= 90100 else "", geodb._table_name(schema, staging),
+                                          ", ".join(names), geodb._table_name(schema, tablename)))
+        sql = _copySql(geodb, schema, staging, columns, geomColumn)
+        total = _copyInParallel(dbs, sql, layer.getFeatures(), columns, geomColumn, srid, singleGeom, batch)
+        if overwrite:
+            if unlogged:
+                geodb._exec_sql_and_commit("ALTER TABLE %s SET LOGGED" % geodb._table_name(schema, staging))
+            _buildIndexes(geodb, schema, staging, pk, geomColumn)
+            _swapTable(geodb, schema, staging, tablename, pk)
+        else:
+            names = ", ".join(names)
+            geodb.run_in_transaction(["INSERT INTO %s (%s) SELECT %s FROM %s" % (geodb._table_name(schema, tablename),
+                                                      names, names, geodb._table_name(schema, staging)),
+                                      "DROP TABLE %s" % geodb._table_name(schema, staging)])
+        return total
+    except:
+        _dropStaging(geodb, schema, staging)
+        raise
+
+def _dropStaging(geodb, schema, staging):
+    '''Drops the staging table of a failed import, if it was created'''
+    try:
+        geodb.con.rollback()
+        geodb._exec_sql_and_commit("DROP TABLE IF EXISTS %s" % geodb._table_name(schema, staging))
+    except DbError:
+        pass
+
+def _tableNames(geodb, schema):
+    return set(t[0] for t in geodb.list_geotables(schema))
+
+def _copySql(geodb, schema, tablename, columns, geomColumn):
+    names = [geodb._quote(column) for i, column in columns]
+    if geomColumn is not None:
+        names.append(geodb._quote(geomColumn))
+    return "COPY %s (%s) FROM STDIN" % (geodb._table_name(schema, tablename), ", ".join(names))
+
+def _rows(features, columns, geomColumn, srid, singleGeom):
+    indexes = [i for i, column in columns]
+    for feature in features:
+        attrs = feature.attributes()
+        values = [copyValue(attrs[i]) for i in indexes]
+        if geomColumn is not None:
+            values.append(copyGeometry(feature.geometry(), srid, singleGeom))
+        yield "\t".join(values) + "\n"
+
+def _copy(geodb, sql, rows, batch):
+    total = 0
+    cursor = geodb.con.cursor()
+    while True:
+        stream = _CopyStream(itertools.islice(rows, batch))
+        try:
+            cursor.copy_expert(sql, stream)
+            geodb.con.commit()
+        except psycopg2.Error, e:
+            geodb.con.rollback()
+            raise DbError(e.message, sql)
+        total += stream.count
+        if stream.count < batch:
+            return total
+
+def _copyInParallel(dbs, sql, features, columns, geomColumn, srid, singleGeom, batch):
+    # features are read here, since QGIS layers cannot be shared between threads. Chunks are
+    # encoded in the copying threads, so a chunk is encoded while the previous one is sent
+    chunks = Queue.Queue(maxsize = 2 * len(dbs))
+    errors = []
+    counts = []
+
+    def copyChunks(db):
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                return
+            if errors:
+                # keep consuming, so the reader is not blocked
+                continue
+            try:
+                rows = _rows(chunk, columns, geomColumn, srid, singleGeom)
+                counts.append(_copy(db, sql, rows, len(chunk) + 1))
+            except Exception, e:
+                errors.append(e)
+
+    threads = [threading.Thread(target = copyChunks, args = (db,)) for db in dbs]
+    for thread in threads:
+        thread.start()
+    try:
+        while not errors:
+            chunk = list(itertools.islice(features, batch))
+            if not chunk:
+                break
+            chunks.put(chunk)
+    finally:
+        for thread in threads:
+            chunks.put(None)
+        for thread in threads:
+            thread.join()
+    if errors:
+        raise errors[0]
+    return sum(counts)
+
+def _swapTable(geodb, schema, staging, tablename, pk):
+    '''Replaces a table with the staging one, renaming its indexes and sequence to match'''
+    cursor = geodb.con.cursor()
+    cursor.execute("SELECT indexname FROM pg_indexes WHERE schemaname = %s AND tablename = %s", (schema, staging))
+    indexes = [row[0] for row in cursor.fetchall()]
+    cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", (geodb._table_name(schema, staging), pk))
+    sequence = cursor.fetchone()[0]
+    geodb.con.rollback()
+    statements = []
+    if tablename in _tableNames(geodb, schema):
+        statements.append("DROP TABLE %s" % geodb._table_name(schema, tablename))
+    statements.append("ALTER TABLE %s RENAME TO %s" % (geodb._table_name(schema, staging), geodb._quote(tablename)))
+    for index in indexes:
+        if index.startswith(staging):
+            statements.append("ALTER INDEX %s RENAME TO %s" % (geodb._table_name(schema, index),
+                                                              geodb._quote(tablename + index[len(staging):])))
+    if sequence is not None:
+        # the sequence name is returned already qualified and quoted
+        statements.append("ALTER SEQUENCE %s RENAME TO %s" % (sequence, geodb._quote("%s_%s_seq" % (tablename, pk))))
+    geodb.run_in_transaction(statements)
+
+def _createTable(geodb, schema, tablename, layer, srid, singleGeom, unlogged = False):
+    '''Creates a table for the features of a layer. Its primary key and indexes are added by _buildIndexes'''
+    fields = layer.pendingFields()
+    names = [field.name().lower() for field in fields]
+    pk = unique_name("id", names)
+    tableFields = [TableField(pk, "serial", False)]
+    columns = []
+    for i, field in enumerate(fields):
+        dataType, modifier = columnType(field)
+        tableFields.append(TableField(names[i], dataType, True, None, modifier))
+        columns.append((i, names[i]))
+    geodb._exec_sql_and_commit("CREATE %sTABLE %s (%s)" % ("UNLOGGED " if unlogged else "",
+                                                          geodb._table_name(schema, tablename),
+                                                          ", ".join(f.field_def() for f in tableFields)))
+    geomColumn = None
+    wkbType = layer.dataProvider().geometryType()
+    if wkbType != QGis.WKBNoGeometry:
+        geomColumn = unique_name("geom", names)
+        geomType, dim = geometryType(wkbType, singleGeom)
+        geodb.add_geometry_column(tablename, geomType, schema, geomColumn, srid, dim)
+    return pk, columns, geomColumn
+
+def _buildIndexes(geodb, schema, tablename, pk, geomColumn):
+    '''Indexes are built after loading the data, which is much faster than updating them for each row'''
+    table = geodb._table_name(schema, tablename)
+    statements = ["ALTER TABLE %s ADD PRIMARY KEY (%s)" % (table, geodb._quote(pk))]
+    if geomColumn is not None:
+        statements.append("CREATE INDEX %s ON %s USING GIST (%s)" % (geodb._quote("%s_%s_idx" % (tablename, geomColumn)),
+                                                                   table, geodb._quote(geomColumn)))
+    statements.append("ANALYZE %s" % table)
+    geodb.run_in_transaction(statements)
+
+def _tableColumns(geodb, schema, tablename, fields, srid):
+    '''Returns the columns of an existing table matching the fields of a layer, its geometry column and its SRID'''
+    tables = [t for t in geodb.list_geotables(schema) if t[0] == tablename]
+    if not tables:
+        raise DbError("Table '%s' does not exist in schema '%s'" % (tablename, schema))
+    geomColumn, tableSrid = tables[0][6], tables[0][9]
+    tableColumns = dict((f.name.lower(), f.name) for f in geodb.get_table_fields(tablename, schema)
+                        if f.name != geomColumn)
+    columns = []
+    for i, field in enumerate(fields):
+        column = tableColumns.get(field.name().lower())
+        if column is not None:
+            columns.append((i, column))
+    return columns, geomColumn, tableSrid or srid
@@ -0,0 +1,157 @@
+'''
+VACUUM, ANALYZE and REINDEX over many tables at once.
+
+Tables are processed by a few threads, each with its own connection borrowed from
+the pool of the database, so several tables are maintained at the same time without
+exhausting the connections available to the server. Tables with the largest fraction
+of dead rows are processed first, so the ones that benefit the most are done even if
+the job is cancelled before finishing.
+'''
+
+import time
+import threading
+import Queue
+import psycopg2.extensions
+from PyQt4 import QtCore
+from opengeo.postgis.postgis_utils import DbError
+
+VACUUM_ANALYZE = "vacuum"
+ANALYZE = "analyze"
+
+DEFAULT_WORKERS = 2
+
+def maintenanceWorkers():
+    '''Returns the number of tables maintained at the same time'''
+    try:
+        return max(1, int(QtCore.QSettings().value("/OpenGeo/Settings/PostGIS/MaintenanceWorkers", DEFAULT_WORKERS)))
+    except (TypeError, ValueError):
+        return DEFAULT_WORKERS
+
+def tablesByDeadRows(geodb, schema = None, tables = None):
+    '''
+    Returns the (schema, table) tuples of the tables in a schema, or in the whole database,
+    sorted by their fraction of dead rows, largest first.
+    If a list of (schema, table) tuples is passed, only those tables are returned.
+    Views and other relations that cannot be vacuumed are left out
+    '''
+    where = ""
+    if schema is not None:
+        where = "WHERE schemaname = '%s'" % geodb._quote_str(schema)
+    sql = """SELECT schemaname, relname FROM pg_stat_user_tables %s
+        ORDER BY n_dead_tup::float8 / GREATEST(n_live_tup + n_dead_tup, 1) DESC, n_dead_tup DESC,
+        schemaname, relname""" % where
+    cursor = geodb.con.cursor()
+    try:
+        geodb._exec_sql(cursor, sql)
+        rows = [(nspname, relname) for nspname, relname in cursor.fetchall()]
+    finally:
+        geodb.con.rollback()
+    if tables is not None:
+        tables = set(tables)
+        rows = [row for row in rows if row in tables]
+    return rows
+
+def maintenanceStatements(geodb, schema, table, operation = VACUUM_ANALYZE, reindex = False):
+    '''Returns the SQL statements to maintain a table'''
+    name = geodb._table_name(schema, table)
+    # indexes are rebuilt first, so vacuum does not have to scan the bloated ones
+    statements = ["REINDEX TABLE %s" % name] if reindex else []
+    if operation == VACUUM_ANALYZE:
+        statements.append("VACUUM ANALYZE %s" % name)
+    else:
+        statements.append("ANALYZE %s" % name)
+    return statements
+
+
+class MaintenanceJob(object):
+    '''
+    Maintains a list of (schema, table) tuples using several connections. Running jobs
+    can be cancelled from another thread, which also cancels the statements in progress
+    '''
+
+    def __init__(self, geodb, tables, operation = VACUUM_ANALYZE, reindex = False, workers = None, timeout = None):
+        self.geodb = geodb
+        self.tables = tables
+        self.operation = operation
+        self.reindex = reindex
+        self.workers = workers or maintenanceWorkers()
+        # seconds after which the statements on a table are cancelled
+        self.timeout = timeout
+        self.cancelled = False
+        self._busy = set()
+        self._lock = threading.Lock()
+
+    def run(self, progress = None):
+        '''
+        Maintains the tables and returns a (schema, table, seconds, error message) tuple for
+        each of them, in the order they were processed. Errors do not stop the job. Tables
+        not processed because the job was cancelled are not included.
+        progress, if passed, is called from the worker threads with the number of tables
+        processed so far and the last (schema, table) tuple
+        '''
+        dbs = self.geodb.borrow_copies(min(self.workers, len(self.tables)), wait = True)
+        if not dbs and self.tables:
+            raise DbError("No connections to the database are available")
+        pending = Queue.Queue()
+        for table in self.tables:
+            pending.put(table)
+        results = []
+
+        def maintain(db):
+            while not self.cancelled:
+                try:
+                    schema, table = pending.get_nowait()
+                except Queue.Empty:
+                    return
+                start = time.time()
+                error = None
+                with self._lock:
+                    self._busy.add(db)
+                try:
+                    cursor = db.con.cursor()
+                    for sql in maintenanceStatements(db, schema, table, self.operation, self.reindex):
+                        db._exec_sql(cursor, sql)
+                except DbError, e:
+                    error = e.message
+                finally:
+                    with self._lock:
+                        self._busy.discard(db)
+                if self.cancelled and error is not None:
+                    # the statement was interrupted by the cancellation
+                    return
+                with self._lock:
+                    results.append((schema, table, time.time() - start, error))
+                    done = len(results)
+                if progress is not None:
+                    progress(done, (schema, table))
+
+        for db in dbs:
+            # VACUUM cannot run inside a transaction block
+            db.con.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            db.statement_timeout = self.timeout
+        threads = [threading.Thread(target = maintain, args = (db,)) for db in dbs]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            for db in dbs:
+                try:
+                    db.con.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_READ_COMMITTED)
+                except psycopg2.Error:
+                    pass
+                db.close()
+        return results
+
+    def cancel(self):
+        '''Stops the job after the statements currently running, which are cancelled as well'''
+        self.cancelled = True
+        with self._lock:
+            busy = list(self._busy)
+        for db in busy:
+            try:
+                db.cancel()
+            except Exception:
+                #the statement might have finished already
+                pass
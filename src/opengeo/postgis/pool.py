@@ -0,0 +1,195 @@
+'''
+Pools of psycopg2 connections, one per connection profile (that is, per connection string).
+
+Connections are borrowed by GeoDB objects and returned when they are closed, so
+refreshing or reconnecting a database in the explorer reuses existing server
+connections instead of opening new ones and leaking the old ones.
+Information about the server that does not change while it is running (version,
+PostGIS availability) is cached in the pool as well.
+'''
+
+import threading
+import time
+import psycopg2
+from PyQt4.QtCore import QSettings
+
+DEFAULT_MIN_CONNECTIONS = 1
+DEFAULT_MAX_CONNECTIONS = 10
+DEFAULT_IDLE_TIMEOUT = 300
+# seconds to wait for a connection to be returned when all of them are in use
+DEFAULT_WAIT_TIMEOUT = 10
+
+# idle connections are checked with a trivial query before being handed out
+# if they have not been used for longer than this (in seconds)
+HEALTH_CHECK_INTERVAL = 30
+
+class PoolError(Exception):
+    pass
+
+class PoolExhaustedError(PoolError):
+    '''All the connections of a pool were in use for longer than the wait timeout'''
+    pass
+
+
+class ConnectionPool(object):
+
+    def __init__(self, conninfo, minconn = DEFAULT_MIN_CONNECTIONS, maxconn = DEFAULT_MAX_CONNECTIONS,
+                 idleTimeout = DEFAULT_IDLE_TIMEOUT, connect = psycopg2.connect, waitTimeout = DEFAULT_WAIT_TIMEOUT):
+        self.conninfo = conninfo
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.idleTimeout = idleTimeout
+        self.waitTimeout = waitTimeout
+        self._connect = connect
+        self._idle = [] # (connection, time it was returned)
+        self._used = set()
+        self._connecting = 0
+        self._lock = threading.Lock()
+        # notified each time a connection is returned or a slot for a new one is freed
+        self._available = threading.Condition(self._lock)
+        self.closed = False
+        self.serverInfo = {}
+
+    def getconn(self, timeout = None):
+        '''
+        Returns a working connection, reusing an idle one if possible. If all the connections
+        are in use, waits up to timeout seconds (waitTimeout if None) for one to be returned,
+        and raises a PoolExhaustedError if none is
+        '''
+        if timeout is None:
+            timeout = self.waitTimeout
+        deadline = time.time() + timeout
+        self._evict()
+        while True:
+            with self._lock:
+                while not self._idle and len(self._used) + self._connecting >= self.maxconn:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        raise PoolExhaustedError("All %i connections to the database are in use" % self.maxconn)
+                    self._available.wait(remaining)
+                if self._idle:
+                    con, returned = self._idle.pop()
+                else:
+                    con, returned = None, None
+                    self._connecting += 1
+            if con is None:
+                # connect outside of the lock, having reserved a slot for the new connection
+                try:
+                    con = self._connect(self.conninfo)
+                    with self._lock:
+                        self._used.add(con)
+                    return con
+                finally:
+                    with self._lock:
+                        self._connecting -= 1
+                        self._available.notify()
+            if self._isHealthy(con, time.time() - returned):
+                with self._lock:
+                    self._used.add(con)
+                return con
+            self._close(con)
+
+    def putconn(self, con):
+        '''Returns a borrowed connection to the pool'''
+        try:
+            self._putconn(con)
+        finally:
+            # the connection is either idle or closed now, so a waiting thread can have one
+            with self._lock:
+                self._available.notify()
+
+    def _putconn(self, con):
+        with self._lock:
+            self._used.discard(con)
+        if con.closed:
+            return
+        if self.closed:
+            self._close(con)
+            return
+        try:
+            con.rollback()
+        except psycopg2.Error:
+            self._close(con)
+            return
+        with self._lock:
+            self._idle.append((con, time.time()))
+        self._evict()
+
+    def closeall(self):
+        '''Closes the idle connections. Borrowed ones are closed when they are returned'''
+        with self._lock:
+            self.closed = True
+            idle = [con for con, returned in self._idle]
+            self._idle = []
+        for con in idle:
+            self._close(con)
+
+    def _isHealthy(self, con, idleTime):
+        if con.closed:
+            return False
+        if idleTime < HEALTH_CHECK_INTERVAL:
+            return True
+        try:
+            cursor = con.cursor()
+            cursor.execute("SELECT 1")
+            cursor.fetchone()
+            con.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _evict(self):
+        '''Closes the connections that have been idle for too long, keeping at least minconn open'''
+        now = time.time()
+        toClose = []
+        with self._lock:
+            keep = []
+            # most recently returned connections are at the end of the list
+            for con, returned in reversed(self._idle):
+                if (now - returned > self.idleTimeout
+                        and len(keep) + len(self._used) >= self.minconn):
+                    toClose.append(con)
+                else:
+                    keep.append((con, returned))
+            self._idle = list(reversed(keep))
+        for con in toClose:
+            self._close(con)
+
+    def _close(self, con):
+        try:
+            con.close()
+        except psycopg2.Error:
+            pass
+
+    def stats(self):
+        with self._lock:
+            return {"idle": len(self._idle), "used": len(self._used), "max": self.maxconn}
+
+
+_pools = {}
+_poolsLock = threading.Lock()
+
+def getPool(conninfo):
+    '''Returns the pool for a connection string, creating it if needed'''
+    with _poolsLock:
+        pool = _pools.get(conninfo)
+        if pool is None:
+            settings = QSettings()
+            try:
+                maxconn = int(settings.value("/OpenGeo/Settings/PostGIS/MaxConnections", DEFAULT_MAX_CONNECTIONS))
+                idleTimeout = int(settings.value("/OpenGeo/Settings/PostGIS/IdleTimeout", DEFAULT_IDLE_TIMEOUT))
+                waitTimeout = int(settings.value("/OpenGeo/Settings/PostGIS/PoolWaitTimeout", DEFAULT_WAIT_TIMEOUT))
+            except (TypeError, ValueError):
+                maxconn, idleTimeout, waitTimeout = DEFAULT_MAX_CONNECTIONS, DEFAULT_IDLE_TIMEOUT, DEFAULT_WAIT_TIMEOUT
+            pool = ConnectionPool(conninfo, maxconn = max(1, maxconn), idleTimeout = idleTimeout,
+                                  waitTimeout = max(0, waitTimeout))
+            _pools[conninfo] = pool
+        return pool
+
+def closeAll():
+    '''Closes all the pools, i.e. when the plugin is unloaded'''
+    with _poolsLock:
+        pools = _pools.values()
+        _pools.clear()
+    for pool in pools:
+        pool.closeall()
@@ -38,7 +38,15 @@ http://www.postgresql.org/docs/8.0/static/functions-info.html
 
 import psycopg2.extensions # for isolation levels
 import re
+import time
+import itertools
+from contextlib import contextmanager
 from qgis.core import *
+from opengeo.postgis.pool import getPool, PoolError, PoolExhaustedError
+from opengeo.postgis import querylog
+
+# rows sent in each INSERT statement by GeoDB.insert_table_rows
+INSERT_BATCH_SIZE = 1000
 
 # use unicode!
 psycopg2.extensions.register_type(psycopg2.extensions.UNICODE)
@@ -78,15 +86,31 @@ class TableIndex:
         self.columns = map(int, columns.split(' '))
 
 
+class TableMetadata(object):
+    """ fields, indexes and constraints of a table """
+
+    __slots__ = ("fields", "indexes", "constraints")
+
+    def __init__(self):
+        self.fields = []
+        self.indexes = []
+        self.constraints = []
+
+
 
 class DbError(Exception):
     def __init__(self, message, query=None):
         # save error. funny that the variables are in utf8, not
-        self.message = unicode(message, 'utf-8')
+        self.message = message if isinstance(message, unicode) else unicode(message, 'utf-8')
         self.query = unicode(query, 'utf-8') if query is not None else None
     def __str__(self):
         return "MESSAGE: %s\nQUERY: %s" % (self.message, self.query)
 
+class DbPoolExhaustedError(DbError):
+    """ all the connections to the database were in use. Unlike other connection errors,
+        it does not mean that the server or the credentials are wrong """
+    pass
+
 class TableField:
     def __init__(self, name, data_type, is_null=None, default=None, modifier=None):
         self.name, self.data_type, self.is_null, self.default, self.modifier = name, data_type, is_null, default, modifier
@@ -112,9 +136,20 @@ class TableField:
             return '"%s"' % ident.replace('"', '""')
 
 
+def unique_name(name, taken):
+    """ return name, or name followed by a number if it is already in taken """
+    unique = name
+    i = 0
+    while unique in taken:
+        unique = "%s_%i" % (name, i)
+        i += 1
+    return unique
+
+
 class GeoDB:
 
-    def __init__(self, host=None, port=None, dbname=None, user=None, passwd=None):
+    def __init__(self, host=None, port=None, dbname=None, user=None, passwd=None, connect_timeout=None,
+                 pool_timeout=None):
 
         # regular expression for identifiers without need to quote them
         self.re_ident_ok = re.compile(r"^\w+$")
@@ -124,23 +159,67 @@ class GeoDB:
         self.dbname = dbname
         self.user = user
         self.passwd = passwd
+        # seconds to wait for the server before giving up, so unreachable hosts fail fast
+        self.connect_timeout = connect_timeout
 
         if self.dbname == '' or self.dbname is None:
             self.dbname = self.user
 
+        # connections are borrowed from the pool of this connection profile,
+        # and returned to it when this object is closed
+        self.pool = getPool(self.con_info())
         try:
-            self.con = psycopg2.connect(self.con_info())
-        except psycopg2.OperationalError, e:
-            raise DbError(unicode(e))
-
-        self.has_postgis = self.check_postgis()
+            self.con = self.pool.getconn(pool_timeout)
+        except PoolExhaustedError, e:
+            raise DbPoolExhaustedError(str(e))
+        except (psycopg2.OperationalError, PoolError), e:
+            raise DbError(str(e))
+
+        # seconds after which statements are cancelled by the server (None to wait indefinitely)
+        self.statement_timeout = None
+        # whether the current transaction has a statement timeout set with SET LOCAL
+        self._local_timeout = False
+
+        self.has_postgis = self._server_info('has_postgis', self.check_postgis)
+
+        # catalog introspection is cached, and invalidated each time the generation
+        # changes, which happens after any statement committed through this object
+        self.generation = 0
+        self._introspection = None
+        self._metadata = (0, {}, set())
+
+    def invalidate(self):
+        """ discard the cached introspection of the database. Statements committed through
+            this object do it automatically, but it has to be called after modifying the
+            database by other means (i.e. importing a layer with a QGIS provider) """
+        self.generation += 1
 
     def __getstate__(self):
         '''the connection cannot be pickled, so ensure it doesn't try'''
         state = dict(vars(self))
         state.pop('con', None)
+        state.pop('pool', None)
         return state
 
+    def close(self):
+        """ return the connection to the pool. The object cannot be used after this """
+        con = self.__dict__.pop('con', None)
+        if con is not None:
+            self.pool.putconn(con)
+
+    def __del__(self):
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _server_info(self, key, func):
+        """ values that do not change while the server is running are cached in the pool """
+        info = self.pool.serverInfo
+        if key not in info:
+            info[key] = func()
+        return info[key]
+
     def con_info(self):
         con_str = ''
         if self.host:   con_str += "host='%s' "     % self.host
@@ -148,9 +227,13 @@ class GeoDB:
         if self.dbname: con_str += "dbname='%s' "   % self.dbname
         if self.user:   con_str += "user='%s' "     % self.user
         if self.passwd: con_str += "password='%s' " % self.passwd
+        if self.connect_timeout: con_str += "connect_timeout=%d " % self.connect_timeout
         return con_str
 
     def get_info(self):
+        return self._server_info('version', self._get_info)
+
+    def _get_info(self):
         c = self.con.cursor()
         self._exec_sql(c, "SELECT version()")
         return c.fetchone()[0]
@@ -170,6 +253,9 @@ class GeoDB:
             - proj version
             - whether uses stats
         """
+        return self._server_info('postgis', self._get_postgis_info)
+
+    def _get_postgis_info(self):
         c = self.con.cursor()
         self._exec_sql(c, "SELECT postgis_lib_version(), postgis_scripts_installed(), postgis_scripts_released(), postgis_geos_version(), postgis_proj_version(), postgis_uses_stats()")
         return c.fetchone()
@@ -178,10 +264,37 @@ class GeoDB:
         """
             get list of schemas in tuples: (oid, name, owner, perms)
         """
+        return self._introspect()[0]
+
+    def _introspect(self):
+        """ return the schemas of the database and their tables, grouped by schema.
+            Both are fetched at once for the whole database and cached until the
+            database is modified """
+        introspection = self._introspection
+        if introspection is not None and introspection[0] == self.generation:
+            return introspection[1:]
+        generation = self.generation
         c = self.con.cursor()
         sql = "SELECT oid, nspname, pg_get_userbyid(nspowner), nspacl FROM pg_namespace WHERE nspname !~ '^pg_' AND nspname != 'information_schema'"
         self._exec_sql(c, sql)
-        return c.fetchall()
+        schemas = c.fetchall()
+        tables = {}
+        for table in self._list_all_geotables():
+            tables.setdefault(table[1], []).append(table)
+        self._introspection = (generation, schemas, tables)
+        return schemas, tables
+
+    def cached_names(self):
+        """ return the names of the schemas and tables in the cached introspection of the
+            database, or an empty list if it is not up to date. It never queries the database """
+        introspection = self._introspection
+        if introspection is None or introspection[0] != self.generation:
+            return []
+        schemas, tables = introspection[1:]
+        names = [schema[1] for schema in schemas]
+        for schemaTables in tables.itervalues():
+            names.extend(table[0] for table in schemaTables)
+        return names
 
     def list_geotables(self, schema=None):
         """
@@ -195,14 +308,17 @@ class GeoDB:
             - srid
             - type
         """
-        c = self.con.cursor()
-
+        tables = self._introspect()[1]
         if schema:
-            schema_where = " AND nspname = '%s' " % self._quote_str(schema)
+            return list(tables.get(schema, []))
         else:
-            schema_where = " AND (nspname != 'information_schema' AND nspname !~ 'pg_') "
+            return [table for name in sorted(tables) for table in tables[name]]
+
+    def _list_all_geotables(self):
+        """ list the tables in all the schemas of the database, with a single query """
+        c = self.con.cursor()
 
-        # LEFT OUTER JOIN: like LEFT JOIN but if there are more matches, for join, all are used (not only one)
+        schema_where = " AND (nspname != 'information_schema' AND nspname !~ 'pg_') "
 
         # first find out whether postgis is enabled
         if not self.has_postgis:
@@ -212,34 +328,23 @@ class GeoDB:
                             JOIN pg_namespace ON pg_namespace.oid = pg_class.relnamespace
                             WHERE pg_class.relkind IN ('v', 'r')""" + schema_where + "ORDER BY nspname, relname"
         else:
-            # discovery of all tables and whether they contain a geometry column
-            sql = """SELECT pg_class.relname, pg_namespace.nspname, pg_class.relkind, pg_get_userbyid(relowner), reltuples, relpages, pg_attribute.attname, pg_attribute.atttypid::regtype, NULL, NULL
+            # discovery of all tables and their geometry columns, with the geometry info
+            # from geometry_columns if they are registered there
+            # LEFT OUTER JOIN: like LEFT JOIN but if there are more matches, for join, all are used (not only one)
+            sql = """SELECT pg_class.relname, pg_namespace.nspname, pg_class.relkind, pg_get_userbyid(relowner), reltuples, relpages,
+                            pg_attribute.attname, COALESCE(geometry_columns.type, pg_attribute.atttypid::regtype::text),
+                            geometry_columns.coord_dimension, geometry_columns.srid
                             FROM pg_class
                             JOIN pg_namespace ON pg_namespace.oid = pg_class.relnamespace
-                            LEFT OUTER JOIN pg_attribute ON pg_attribute.attrelid = pg_class.oid AND
+                            LEFT OUTER JOIN pg_attribute ON pg_attribute.attrelid = pg_class.oid AND NOT pg_attribute.attisdropped AND
                                     ( pg_attribute.atttypid = 'geometry'::regtype
                                         OR pg_attribute.atttypid IN (SELECT oid FROM pg_type WHERE typbasetype='geometry'::regtype ) )
+                            LEFT OUTER JOIN geometry_columns ON f_table_schema = nspname AND f_table_name = relname
+                                    AND f_geometry_column = pg_attribute.attname
                             WHERE pg_class.relkind IN ('v', 'r')""" + schema_where + "ORDER BY nspname, relname, attname"
 
         self._exec_sql(c, sql)
-        items = c.fetchall()
-
-        # get geometry info from geometry_columns if exists
-        if self.has_postgis:
-            sql = """SELECT relname, nspname, relkind, pg_get_userbyid(relowner), reltuples, relpages,
-                            geometry_columns.f_geometry_column, geometry_columns.type, geometry_columns.coord_dimension, geometry_columns.srid
-                            FROM pg_class
-                          JOIN pg_namespace ON relnamespace=pg_namespace.oid
-                          LEFT OUTER JOIN geometry_columns ON relname=f_table_name AND nspname=f_table_schema
-                          WHERE (relkind = 'r' or relkind='v') """ + schema_where + "ORDER BY nspname, relname, f_geometry_column"
-            self._exec_sql(c, sql)
-
-            # merge geometry info to "items"
-            for i, geo_item in enumerate(c.fetchall()):
-                if geo_item[7]:
-                    items[i] = geo_item
-
-        return items
+        return c.fetchall()
 
 
     def get_table_rows(self, table, schema=None):
@@ -247,71 +352,268 @@ class GeoDB:
         self._exec_sql(c, "SELECT COUNT(*) FROM %s" % self._table_name(schema, table))
         return c.fetchone()[0]
 
+    def get_table_rows_estimate(self, table, schema=None):
+        """ return an estimate of the number of rows in a table, without scanning it.
+            It is computed like the planner does, scaling the tuple density recorded
+            by the last VACUUM/ANALYZE to the current size of the table, and falls back
+            to the statistics collector. Returns None if there is no estimate (i.e. views) """
+        c = self.con.cursor()
+        if schema:
+            schema_where = " AND nspname = '%s' " % self._quote_str(schema)
+        else:
+            schema_where = " AND pg_table_is_visible(pg_class.oid) "
+        sql = """SELECT reltuples, relpages,
+                        pg_relation_size(pg_class.oid) / current_setting('block_size')::integer,
+                        n_live_tup
+                        FROM pg_class
+                        JOIN pg_namespace ON pg_namespace.oid = pg_class.relnamespace
+                        LEFT JOIN pg_stat_user_tables ON pg_stat_user_tables.relid = pg_class.oid
+                        WHERE relkind = 'r' AND relname = '%s' """ % self._quote_str(table) + schema_where
+        self._exec_sql(c, sql)
+        row = c.fetchone()
+        if row is None:
+            return None
+        reltuples, relpages, curpages, live = row
+        if relpages > 0 and reltuples >= 0:
+            return int(round(reltuples / relpages * curpages))
+        if live is not None:
+            return live
+        if curpages == 0:
+            return 0
+        return None
+
+    def get_table_extent(self, table, geom_column, schema=None):
+        """ return the extent of a geometry column as (xmin, xmax, ymin, ymax), avoiding a full scan
+            when possible. It uses the estimate kept in the statistics of the table, then the
+            extent stored in the spatial index (PostGIS 3), and only as a last resort it computes
+            the exact extent. Returns None if the table is empty """
+        t = self._table_name(schema, table)
+        args = "'%s', '%s'" % (self._quote_str(table), self._quote_str(geom_column))
+        if schema:
+            args = "'%s', %s" % (self._quote_str(schema), args)
+        queries = ["SELECT ST_EstimatedExtent(%s)" % args,
+                   "SELECT _postgis_index_extent('%s'::regclass, '%s')" % (self._quote_str(t), self._quote_str(geom_column)),
+                   "SELECT ST_Extent(%s) FROM %s" % (self._quote(geom_column), t)]
+        c = self.con.cursor()
+        for sql in queries:
+            try:
+                self._exec_sql(c, "SELECT ST_XMin(e), ST_XMax(e), ST_YMin(e), ST_YMax(e) FROM (%s) AS t(e)" % sql)
+                row = c.fetchone()
+            except DbError:
+                # the function is not available in this PostGIS version, or there are no statistics
+                row = None
+            self.con.rollback()
+            if row is not None and row[0] is not None:
+                return row
+        return None
+
+    def database_key(self):
+        """ return a (host, port, dbname) tuple identifying the database, shared by copies of this object """
+        return (self.host, self.port, self.dbname)
+
+    def copy(self, pool_timeout=None):
+        """ return a new GeoDB object with its own connection to the same database,
+            for long running queries that should not block this one. It has to be
+            closed when no longer needed. If all the connections of the pool are in use,
+            it waits up to pool_timeout seconds (the pool default if None) for one """
+        return GeoDB(self.host, self.port, self.dbname, self.user, self.passwd, self.connect_timeout,
+                     pool_timeout)
+
+    def borrow_copies(self, count, wait=False):
+        """ return up to count copies of this object, taking only the connections available
+            in the pool right away. If wait is True, it waits for the first one if there are
+            none. All of them have to be closed when no longer needed """
+        dbs = []
+        for i in range(count):
+            try:
+                dbs.append(self.copy(None if wait and not dbs else 0))
+            except DbError:
+                # no more connections available in the pool
+                break
+        return dbs
+
+    def cancel(self):
+        """ cancel the query currently running in this connection, from any thread.
+            This sends the server the same request as pg_cancel_backend, and the
+            statement fails with a DbError """
+        self.con.cancel()
+
+    @contextmanager
+    def timeout(self, seconds):
+        """ context manager to run the statements in the block with a statement timeout.
+            None or 0 means no timeout. Statements run after the block in the same
+            transaction are not affected """
+        previous = self.statement_timeout
+        self.statement_timeout = seconds or None
+        try:
+            yield self
+        finally:
+            self.statement_timeout = previous
+            self._reset_local_timeout()
+
+    def _reset_local_timeout(self):
+        """ restore the statement timeout set with SET LOCAL, if the transaction is still open """
+        if not self._local_timeout:
+            return
+        self._local_timeout = False
+        if self.con.get_transaction_status() == psycopg2.extensions.TRANSACTION_STATUS_INTRANS:
+            try:
+                self.con.cursor().execute("SET LOCAL statement_timeout = DEFAULT")
+            except psycopg2.Error:
+                pass
+
+    def explain_query(self, sql):
+        """ return the plan of a query as a list of lines, without running it.
+            Raises a DbError if the query is not valid """
+        c = self.con.cursor()
+        try:
+            self._exec_sql(c, "EXPLAIN %s" % sql)
+            return [row[0] for row in c.fetchall()]
+        finally:
+            self.con.rollback()
+
+    def get_query_columns(self, sql):
+        """ return the columns returned by a query as a list of (name, data type) tuples """
+        c = self.con.cursor()
+        try:
+            self._exec_sql(c, "SELECT * FROM (%s) AS q LIMIT 0" % sql)
+            columns = [(col[0], col[1]) for col in c.description]
+            self._exec_sql(c, "SELECT oid, typname FROM pg_type WHERE oid = ANY(%s)",
+                           (list(set(oid for name, oid in columns)),))
+            types = dict(c.fetchall())
+        finally:
+            self.con.rollback()
+        return [(name, types.get(oid)) for name, oid in columns]
+
+    def get_query_geometry(self, sql, geom_column):
+        """ return the geometry type and SRID of a geometry column returned by a query, as found
+            in the first row with a geometry, or (None, None) if there are no geometries """
+        col = self._quote(geom_column)
+        c = self.con.cursor()
+        try:
+            self._exec_sql(c, "SELECT GeometryType(%s), ST_SRID(%s) FROM (%s) AS q WHERE %s IS NOT NULL LIMIT 1"
+                           % (col, col, sql, col))
+            row = c.fetchone()
+        finally:
+            self.con.rollback()
+        return tuple(row) if row is not None else (None, None)
+
 
     def get_table_fields(self, table, schema=None):
         """ return list of columns in table """
+        return self._table_metadata(table, schema).fields
+
+
+    def get_table_indexes(self, table, schema=None):
+        """ get info about table's indexes. ignore primary key and unique index, they get listed in constaints """
+        return self._table_metadata(table, schema).indexes
+
+
+    def get_table_constraints(self, table, schema=None):
+        return self._table_metadata(table, schema).constraints
+
+
+    def _table_metadata(self, table, schema):
+        """ return the metadata of a single table. It is taken from the cache if it is there,
+            and otherwise only that table is queried, not its whole schema. Without a schema,
+            the table is the one that PostgreSQL finds through the search_path """
+        if schema is None:
+            metadata = self._fetch_tables_metadata(None, [table], visible=True)
+            return metadata.values()[0] if metadata else TableMetadata()
+        generation, cache, complete = self._metadata
+        if generation != self.generation:
+            generation, cache, complete = self.generation, {}, set()
+            self._metadata = (generation, cache, complete)
+        record = cache.get((schema, table))
+        if record is None:
+            if schema in complete:
+                return TableMetadata()
+            metadata = self._fetch_tables_metadata(schema, [table])
+            cache.update(metadata)
+            record = metadata.get((schema, table), TableMetadata())
+        return record
+
+
+    def get_tables_metadata(self, schema, tables=None):
+        """ return the fields, indexes and constraints of the tables in a schema, or of the
+            passed tables in it, as a dict of TableMetadata objects keyed by (schema, table).
+            They are fetched with a fixed number of queries, instead of three queries per table,
+            and the metadata of whole schemas is cached until the database is modified """
+        generation, cache, complete = self._metadata
+        if generation != self.generation:
+            generation, cache, complete = self.generation, {}, set()
+            self._metadata = (generation, cache, complete)
+        if schema is not None and schema in complete:
+            return dict((key, record) for key, record in cache.iteritems()
+                        if key[0] == schema and (tables is None or key[1] in tables))
+        metadata = self._fetch_tables_metadata(schema, tables)
+        if schema is not None:
+            cache.update(metadata)
+            if tables is None:
+                complete.add(schema)
+        return metadata
+
+
+    def _fetch_tables_metadata(self, schema, tables, visible=False):
+        where = ""
+        if schema is not None:
+            where += " AND nsp.nspname='%s' " % self._quote_str(schema)
+        if visible:
+            where += " AND pg_table_is_visible(t.oid) "
+        if tables is not None:
+            if not tables:
+                return {}
+            where += " AND t.relname IN (%s) " % ",".join("'%s'" % self._quote_str(table) for table in tables)
+        metadata = {}
+        def record(row):
+            key = (row[0], row[1])
+            if key not in metadata:
+                metadata[key] = TableMetadata()
+            return metadata[key]
+
         c = self.con.cursor()
-        schema_where = " AND nspname='%s' " % self._quote_str(schema) if schema is not None else ""
-        sql = """SELECT a.attnum AS ordinal_position,
+        sql = """SELECT nsp.nspname, t.relname,
+                a.attnum AS ordinal_position,
                 a.attname AS column_name,
-                t.typname AS data_type,
+                ty.typname AS data_type,
                 a.attlen AS char_max_len,
                 a.atttypmod AS modifier,
                 a.attnotnull AS notnull,
                 a.atthasdef AS hasdefault,
-                adef.adsrc AS default_value
-            FROM pg_class c
-            JOIN pg_attribute a ON a.attrelid = c.oid
-            JOIN pg_type t ON a.atttypid = t.oid
-            JOIN pg_namespace nsp ON c.relnamespace = nsp.oid
+                pg_get_expr(adef.adbin, adef.adrelid) AS default_value
+            FROM pg_class t
+            JOIN pg_attribute a ON a.attrelid = t.oid
+            JOIN pg_type ty ON a.atttypid = ty.oid
+            JOIN pg_namespace nsp ON t.relnamespace = nsp.oid
             LEFT JOIN pg_attrdef adef ON adef.adrelid = a.attrelid AND adef.adnum = a.attnum
-            WHERE
-              c.relname = '%s' %s AND
-                a.attnum > 0
-            ORDER BY a.attnum""" % (self._quote_str(table), schema_where)
-
+            WHERE t.relkind IN ('r', 'v') AND a.attnum > 0 AND NOT a.attisdropped %s
+            ORDER BY nsp.nspname, t.relname, a.attnum""" % where
         self._exec_sql(c, sql)
-        attrs = []
         for row in c.fetchall():
-            attrs.append(TableAttribute(row))
-        return attrs
-
+            record(row).fields.append(TableAttribute(row[2:]))
 
-    def get_table_indexes(self, table, schema=None):
-        """ get info about table's indexes. ignore primary key and unique index, they get listed in constaints """
-        c = self.con.cursor()
-
-        schema_where = " AND nspname='%s' " % self._quote_str(schema) if schema is not None else ""
-        sql = """SELECT relname, indkey FROM pg_class, pg_index
-                         WHERE pg_class.oid = pg_index.indexrelid AND pg_class.oid IN (
-                                 SELECT indexrelid FROM pg_index, pg_class
-                                         JOIN pg_namespace nsp ON pg_class.relnamespace = nsp.oid
-                                         WHERE pg_class.relname='%s' %s AND pg_class.oid=pg_index.indrelid
-                                           AND indisunique != 't' AND indisprimary != 't' )""" % (self._quote_str(table), schema_where)
+        sql = """SELECT nsp.nspname, t.relname, i.relname, ix.indkey
+            FROM pg_index ix
+            JOIN pg_class i ON i.oid = ix.indexrelid
+            JOIN pg_class t ON t.oid = ix.indrelid
+            JOIN pg_namespace nsp ON t.relnamespace = nsp.oid
+            WHERE NOT ix.indisunique AND NOT ix.indisprimary %s""" % where
         self._exec_sql(c, sql)
-        indexes = []
         for row in c.fetchall():
-            indexes.append(TableIndex(row))
-        return indexes
+            record(row).indexes.append(TableIndex(row[2:]))
 
-
-    def get_table_constraints(self, table, schema=None):
-        c = self.con.cursor()
-
-        schema_where = " AND nspname='%s' " % self._quote_str(schema) if schema is not None else ""
-        sql = """SELECT c.conname, c.contype, c.condeferrable, c.condeferred, array_to_string(c.conkey, ' '), c.consrc,
-                 t2.relname, c.confupdtype, c.confdeltype, c.confmatchtype, array_to_string(c.confkey, ' ') FROM pg_constraint c
-          LEFT JOIN pg_class t ON c.conrelid = t.oid
+        sql = """SELECT nsp.nspname, t.relname, c.conname, c.contype, c.condeferrable, c.condeferred,
+                 array_to_string(c.conkey, ' '), pg_get_expr(c.conbin, c.conrelid),
+                 t2.relname, c.confupdtype, c.confdeltype, c.confmatchtype, array_to_string(c.confkey, ' ') 
+            FROM pg_constraint c
+            JOIN pg_class t ON c.conrelid = t.oid
             LEFT JOIN pg_class t2 ON c.confrelid = t2.oid
             JOIN pg_namespace nsp ON t.relnamespace = nsp.oid
-            WHERE t.relname = '%s' %s """ % (self._quote_str(table), schema_where)
-
+            WHERE c.contype IN ('c', 'f', 'p', 'u') %s""" % where
         self._exec_sql(c, sql)
-
-        constrs = []
         for row in c.fetchall():
-            constrs.append(TableConstraint(row))
-        return constrs
+            record(row).constraints.append(TableConstraint(row[2:]))
+        return metadata
 
 
     def get_view_definition(self, view, schema=None):
@@ -589,26 +891,93 @@ class GeoDB:
             return "Unknown"
 
     def insert_table_row(self, table, values, schema=None, cursor=None):
-        """ insert a row with specified values to a table.
+        """ insert a row with specified values to a table. Values are passed as query parameters,
+         so they do not have to be quoted.
          if a cursor is specified, it doesn't commit (expecting that there will be more inserts)
          otherwise it commits immediately """
-        t = self._table_name(schema, table)
-        sql = ""
-        for value in values:
-            # TODO: quote values?
-            if sql: sql += ", "
-            sql += value
-        sql = "INSERT INTO %s VALUES (%s)" % (t, sql)
         if cursor:
-            self._exec_sql(cursor, sql)
+            self._exec_sql(cursor, *self._insert_sql(table, schema, None, [values]))
         else:
-            self._exec_sql_and_commit(sql)
+            self.insert_table_rows(table, [values], schema=schema)
+
+    def insert_table_rows(self, table, rows, columns=None, schema=None, batch_size=INSERT_BATCH_SIZE):
+        """ insert rows from an iterable in a single transaction. Rows are sent in batches
+         of batch_size rows, each of them as a multi-row INSERT with parameterized values.
+         If any of them fails, no row is inserted.
+         returns a list with the number of rows and the time in seconds of each batch """
+        c = self.con.cursor()
+        rows = iter(rows)
+        timings = []
+        try:
+            while True:
+                batch = list(itertools.islice(rows, batch_size))
+                if not batch:
+                    break
+                start = time.time()
+                self._exec_sql(c, *self._insert_sql(table, schema, columns, batch))
+                timings.append((len(batch), time.time() - start))
+            self.con.commit()
+        except:
+            self.con.rollback()
+            raise
+        return timings
 
-    def _exec_sql(self, cursor, sql):             
+    def run_in_transaction(self, statements):
+        """ execute several statements in a single transaction, so either all of them
+            take effect or, if any of them fails, none does """
+        c = self.con.cursor()
+        try:
+            for sql in statements:
+                self._exec_sql(c, sql)
+            self.con.commit()
+        except DbError:
+            self.con.rollback()
+            raise
+        finally:
+            self.invalidate()
+
+    def _insert_sql(self, table, schema, columns, rows):
+        """ returns a multi-row INSERT statement and its parameters """
+        t = self._table_name(schema, table)
+        if columns:
+            t += " (%s)" % ", ".join(self._quote(column) for column in columns)
+        values = []
+        params = []
+        for row in rows:
+            values.append("(%s)" % ", ".join(["%s"] * len(row)))
+            params.extend(row)
+        # identifiers must not be taken as placeholders
+        return "INSERT INTO %s VALUES %s" % (t.replace("%", "%%"), ", ".join(values)), params
+
+    def _exec_sql(self, cursor, sql, params=None):             
+        start = time.time()
+        statement = sql
+        autocommit = False
         try:
-            cursor.execute(sql)
+            if self.statement_timeout:
+                timeout = int(self.statement_timeout * 1000)
+                autocommit = self.con.isolation_level == psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT
+                if autocommit:
+                    # there is no transaction to scope SET LOCAL to, so the session setting is restored afterwards
+                    self.con.cursor().execute("SET statement_timeout = %d" % timeout)
+                elif cursor.name is not None:
+                    # named cursors only accept a single query
+                    self.con.cursor().execute("SET LOCAL statement_timeout = %d" % timeout)
+                    self._local_timeout = True
+                else:
+                    sql = "SET LOCAL statement_timeout = %d; %s" % (timeout, sql)
+                    self._local_timeout = True
+            cursor.execute(sql, params)
         except psycopg2.Error, e:
-            raise DbError(e.message, e.cursor.query)
+            querylog.record(statement, time.time() - start, e.message.strip(), self.database_key())
+            raise DbError(e.message, e.cursor.query if e.cursor is not None else sql)
+        finally:
+            if autocommit:
+                try:
+                    self.con.cursor().execute("SET statement_timeout = DEFAULT")
+                except psycopg2.Error:
+                    pass
+        querylog.record(statement, time.time() - start, database = self.database_key())
 
     def _exec_sql_and_commit(self, sql):          
         """ tries to execute and commit some action, on error it rolls back the change """                
@@ -619,6 +988,8 @@ class GeoDB:
         except DbError, e:
             self.con.rollback()
             raise
+        finally:
+            self.invalidate()
 
     def _quote(self, identifier):
         """ quote identifier if needed """
@@ -0,0 +1,118 @@
+'''
+Paged reading of the rows of a table, for previewing its content.
+
+Pages are read with keyset pagination on the primary key (WHERE pk > last key ORDER BY pk),
+so reading any page is an index range scan, no matter how far into the table it is. Rows in
+a page are fetched from a named (server-side) cursor a chunk at a time, so only the rows
+shown are transferred and kept in memory. Tables and views without a primary key can only
+be read forwards, from a single cursor.
+'''
+
+import itertools
+import psycopg2
+from opengeo.postgis.postgis_utils import DbError
+
+PAGE_SIZE = 500
+FETCH_SIZE = 100
+
+# columns of these types are shown by their type only, instead of being transferred
+_SPATIAL_TYPES = ["geometry", "geography"]
+
+_cursorIds = itertools.count()
+
+
+class TablePreview(object):
+    '''
+    Reads the rows of a table a page at a time, using a connection of its own, so reading
+    does not block other queries and can be cancelled from another thread.
+    It has to be closed when no longer needed
+    '''
+
+    def __init__(self, table, pageSize = PAGE_SIZE, timeout = None):
+        geodb = table.conn.geodb
+        self.schema = table.schema
+        self.tablename = table.name
+        self.pageSize = pageSize
+        fields = geodb.get_table_fields(table.name, table.schema)
+        self.columns = [f.name for f in fields]
+        self._spatial = [f.data_type in _SPATIAL_TYPES for f in fields]
+        pk = table.primaryKey()
+        self.keyIndexes = [self.columns.index(c) for c in pk]
+        self.cursor = None
+        self.remaining = 0
+        self.db = geodb.copy()
+        self.db.statement_timeout = timeout
+
+    def isKeyed(self):
+        '''Returns True if pages can be read in any order, that is, if the table has a primary key'''
+        return bool(self.keyIndexes)
+
+    def key(self, row):
+        '''Returns the key of a row, to be passed to openPage to read the rows after it'''
+        return tuple(row[i] for i in self.keyIndexes)
+
+    def _sql(self, after):
+        db = self.db
+        expressions = []
+        for column, spatial in zip(self.columns, self._spatial):
+            if spatial:
+                expressions.append("GeometryType(%s::geometry)" % db._quote(column))
+            else:
+                expressions.append(db._quote(column))
+        sql = "SELECT %s FROM %s" % (", ".join(expressions), db._table_name(self.schema, self.tablename))
+        if not self.isKeyed():
+            return sql, None
+        keyColumns = ", ".join(db._quote(self.columns[i]) for i in self.keyIndexes)
+        if after is not None:
+            sql += " WHERE (%s) > (%s)" % (keyColumns, ", ".join(["%s"] * len(after)))
+        sql += " ORDER BY %s LIMIT %i" % (keyColumns, self.pageSize)
+        return sql, after
+
+    def openPage(self, after = None):
+        '''
+        Starts reading the page of rows following the row with the passed key, or the first page.
+        Without a primary key, pages can only be read in order, and the key is ignored
+        '''
+        if self.cursor is not None and not self.isKeyed():
+            # continue reading the cursor that has all the rows
+            self.remaining = self.pageSize
+            return
+        self._closeCursor()
+        sql, params = self._sql(after)
+        self.cursor = self.db.con.cursor("opengeo_preview_%i" % _cursorIds.next())
+        self.db._exec_sql(self.cursor, sql, params)
+        self.remaining = self.pageSize
+
+    def fetch(self, count = FETCH_SIZE):
+        '''Returns up to count more rows of the current page. An empty list means the page is complete'''
+        if self.cursor is None or self.remaining <= 0:
+            return []
+        try:
+            rows = self.cursor.fetchmany(min(count, self.remaining))
+        except psycopg2.Error, e:
+            raise DbError(e.message)
+        self.remaining = self.remaining - len(rows) if rows else 0
+        return rows
+
+    def cancel(self):
+        '''Cancels the query running to fetch rows, from any thread'''
+        try:
+            self.db.cancel()
+        except Exception:
+            #there might be no query running
+            pass
+
+    def _closeCursor(self):
+        if self.cursor is not None:
+            # do not keep a transaction open between pages
+            try:
+                self.cursor.close()
+                self.db.con.rollback()
+            except psycopg2.Error:
+                #the connection might have been broken by a cancelled query
+                pass
+            self.cursor = None
+
+    def close(self):
+        self._closeCursor()
+        self.db.close()
@@ -0,0 +1,124 @@
+'''
+Generalized copies of a table at several tolerances (a pyramid).
+
+Maps at small scales do not need full resolution geometries, so they can be rendered
+from copies of a table with far fewer vertices. GeoServer serves them through a
+pre-generalized datastore, which reads from the copy matching the scale of each request.
+'''
+
+import time
+
+SIMPLIFY = "simplify"
+SNAP_TO_GRID = "snap"
+
+class PyramidLevel(object):
+    '''A table in a pyramid, with the time it took to build it and its size'''
+
+    def __init__(self, tolerance, tablename, seconds, vertices, size):
+        self.tolerance = tolerance
+        self.tablename = tablename
+        self.seconds = seconds
+        self.vertices = vertices
+        self.size = size
+
+    def reduction(self, base):
+        '''Returns the ratios between the number of vertices and the size of a base level and those of this one'''
+        return (float(base.vertices) / self.vertices if self.vertices else None,
+                float(base.size) / self.size if self.size else None)
+
+
+def levelTableName(tablename, tolerance):
+    return "%s_gen_%s" % (tablename, ("%g" % tolerance).replace(".", "_").replace("-", "_").replace("+", ""))
+
+def defaultTolerances(extent, levels = 3):
+    '''Returns tolerances for a pyramid, from 1/20000 of the size of the extent, growing by a factor of 5'''
+    xmin, xmax, ymin, ymax = extent
+    tolerance = max(xmax - xmin, ymax - ymin) / 20000.0
+    tolerances = []
+    for i in xrange(levels):
+        tolerances.append(float("%.2g" % tolerance))
+        tolerance *= 5
+    return tolerances
+
+def _levelStats(geodb, schema, tablename, geomColumn):
+    '''Returns the number of vertices in a table and its size in bytes, including indexes'''
+    cursor = geodb.con.cursor()
+    try:
+        geodb._exec_sql(cursor, "SELECT SUM(ST_NPoints(%s)), pg_total_relation_size('%s'::regclass) FROM %s"
+                        % (geodb._quote(geomColumn), geodb._quote_str(geodb._table_name(schema, tablename)),
+                           geodb._table_name(schema, tablename)))
+        vertices, size = cursor.fetchone()
+    finally:
+        geodb.con.rollback()
+    return int(vertices or 0), int(size or 0)
+
+def _columnType(geodb, schema, tablename, column):
+    '''Returns the type of a column, with its modifiers, i.e. geometry(MultiPolygon,4326)'''
+    cursor = geodb.con.cursor()
+    try:
+        geodb._exec_sql(cursor, "SELECT format_type(atttypid, atttypmod) FROM pg_attribute "
+                        "WHERE attrelid = '%s'::regclass AND attname = '%s'"
+                        % (geodb._quote_str(geodb._table_name(schema, tablename)), geodb._quote_str(column)))
+        return cursor.fetchone()[0]
+    finally:
+        geodb.con.rollback()
+
+def _generalizedGeometry(geodb, geomColumn, geomType, tolerance, method):
+    geom = geodb._quote(geomColumn)
+    if method == SNAP_TO_GRID:
+        expression = "ST_SnapToGrid(%s, %r)" % (geom, tolerance)
+    else:
+        expression = "ST_SimplifyPreserveTopology(%s, %r)" % (geom, tolerance)
+    if "(multi" in geomType.lower():
+        expression = "ST_Multi(%s)" % expression
+    return "%s::%s" % (expression, geomType)
+
+def buildPyramid(table, tolerances, method = SIMPLIFY, progress = None):
+    '''
+    Creates a generalized copy of a table for each tolerance, with the same primary key and a
+    spatial index. Existing copies are replaced. Geometries that collapse when generalized are
+    left out of the copies.
+    Returns a list of PyramidLevel objects, the first one describing the original table.
+    progress, if passed, is called with the number of levels built so far and the last one
+    '''
+    geodb = table.conn.geodb
+    schema, geomColumn = table.schema, table.geomfield
+    vertices, size = _levelStats(geodb, schema, table.name, geomColumn)
+    levels = [PyramidLevel(0, table.name, 0, vertices, size)]
+    geomType = _columnType(geodb, schema, table.name, geomColumn)
+    columns = [geodb._quote(c) for c in table.columns()]
+    pk = table.primaryKey()
+    for tolerance in sorted(tolerances):
+        start = time.time()
+        levelName = levelTableName(table.name, tolerance)
+        levelTable = geodb._table_name(schema, levelName)
+        generalized = _generalizedGeometry(geodb, geomColumn, geomType, tolerance, method)
+        statements = ["DROP TABLE IF EXISTS %s" % levelTable,
+                      "CREATE TABLE %s AS SELECT %s FROM (SELECT %s AS %s FROM %s) AS g WHERE NOT ST_IsEmpty(%s)"
+                      % (levelTable, ", ".join(columns + [geodb._quote(geomColumn)]),
+                         ", ".join(columns + [generalized]), geodb._quote(geomColumn),
+                         geodb._table_name(schema, table.name), geodb._quote(geomColumn))]
+        if pk:
+            statements.append("ALTER TABLE %s ADD PRIMARY KEY (%s)" % (levelTable, ", ".join(geodb._quote(c) for c in pk)))
+        statements.append("CREATE INDEX %s ON %s USING GIST (%s)" % (geodb._quote("%s_%s_idx" % (levelName, geomColumn)),
+                                                                   levelTable, geodb._quote(geomColumn)))
+        statements.append("ANALYZE %s" % levelTable)
+        geodb.run_in_transaction(statements)
+        vertices, size = _levelStats(geodb, schema, levelName, geomColumn)
+        level = PyramidLevel(tolerance, levelName, time.time() - start, vertices, size)
+        levels.append(level)
+        if progress is not None:
+            progress(len(levels) - 1, level)
+    return levels
+
+def pyramidReport(levels):
+    '''Returns a text describing the timing and size reduction of each level of a pyramid'''
+    base = levels[0]
+    lines = ["%s: %i vertices, %i KB" % (base.tablename, base.vertices, base.size / 1024)]
+    for level in levels[1:]:
+        vertexRatio, sizeRatio = level.reduction(base)
+        lines.append("%s (tolerance %g): built in %.1f s, %i vertices (%s), %i KB (%s)"
+                     % (level.tablename, level.tolerance, level.seconds, level.vertices,
+                        "%.1fx fewer" % vertexRatio if vertexRatio else "-",
+                        level.size / 1024, "%.1fx smaller" % sizeRatio if sizeRatio else "-"))
+    return "\n".join(lines)
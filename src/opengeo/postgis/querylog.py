@@ -0,0 +1,70 @@
+'''
+Timings of the SQL statements run through GeoDB objects.
+
+The most recent statements are kept in memory, to find out which operations are slow,
+and each of them is logged to the "opengeo.postgis" logger: at DEBUG level normally,
+and at WARNING level if it failed or took longer than SLOW_QUERY seconds.
+'''
+
+import collections
+import logging
+import time
+
+logger = logging.getLogger("opengeo.postgis")
+
+MAX_QUERIES = 200
+SLOW_QUERY = 5.0
+# longer statements (i.e. inserts of many rows) are truncated
+MAX_SQL_LENGTH = 1000
+
+class QueryTiming(object):
+    '''
+    A statement that was run, with the time it took and the error it raised, if any.
+    database identifies the database it was run in, as a (host, port, dbname) tuple
+    '''
+
+    def __init__(self, sql, seconds, error = None, database = None):
+        self.sql = sql if len(sql) <= MAX_SQL_LENGTH else sql[:MAX_SQL_LENGTH] + "..."
+        self.seconds = seconds
+        self.error = error
+        self.database = database
+        self.finished = time.time()
+
+    def __repr__(self):
+        return "%.3f s%s: %s" % (self.seconds, " (%s)" % self.error if self.error else "", self.sql)
+
+
+# appending to and copying a deque are atomic, so no lock is needed
+_queries = collections.deque(maxlen = MAX_QUERIES)
+
+def record(sql, seconds, error = None, database = None):
+    timing = QueryTiming(sql, seconds, error, database)
+    _queries.append(timing)
+    if error is not None or seconds > SLOW_QUERY:
+        logger.warning("%r", timing)
+    elif logger.isEnabledFor(logging.DEBUG):
+        logger.debug("%r", timing)
+
+def recentQueries(database = None):
+    '''Returns the QueryTiming objects of the most recent statements, oldest first, optionally only those of a database'''
+    queries = list(_queries)
+    if database is not None:
+        queries = [timing for timing in queries if timing.database == database]
+    return queries
+
+def slowestQueries(count = 10, database = None):
+    return sorted(recentQueries(database), key = lambda timing: timing.seconds, reverse = True)[:count]
+
+def stats(database = None):
+    '''
+    Returns a dict with the number of recent statements, the seconds they took in total,
+    and how many of them failed or were slow, optionally only for a database
+    '''
+    queries = recentQueries(database)
+    return {"queries": len(queries),
+            "seconds": sum(timing.seconds for timing in queries),
+            "errors": len([timing for timing in queries if timing.error is not None]),
+            "slow": len([timing for timing in queries if timing.seconds > SLOW_QUERY])}
+
+def clear():
+    _queries.clear()
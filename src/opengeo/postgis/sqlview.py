@@ -0,0 +1,67 @@
+'''
+Support for publishing PostGIS queries as GeoServer SQL views.
+
+Queries can have parameters, written as %name% like GeoServer expects them. They
+are replaced with their default values to validate the query and to find out the
+columns and geometry it returns.
+'''
+
+import re
+
+_parameter = re.compile(r"%(\w+)%")
+
+# GeometryType() names and their JTS equivalents, as used by GeoServer
+GEOMETRY_TYPES = {"POINT": "Point",
+                  "LINESTRING": "LineString",
+                  "POLYGON": "Polygon",
+                  "MULTIPOINT": "MultiPoint",
+                  "MULTILINESTRING": "MultiLineString",
+                  "MULTIPOLYGON": "MultiPolygon",
+                  "GEOMETRYCOLLECTION": "GeometryCollection"}
+
+def viewParameters(sql):
+    '''Returns the names of the parameters in a query, in order of appearance'''
+    names = []
+    for name in _parameter.findall(sql):
+        if name not in names:
+            names.append(name)
+    return names
+
+def resolveParameters(sql, values):
+    '''Replaces the parameters in a query with the passed values. Parameters without a value are left as they are'''
+    return _parameter.sub(lambda m: values.get(m.group(1), m.group(0)), sql)
+
+def geoserverGeometryType(pgtype):
+    '''Returns the GeoServer name of a geometry type, as returned by the GeometryType() function'''
+    if pgtype is None:
+        return "Geometry"
+    pgtype = pgtype.upper()
+    if pgtype.endswith("M") and pgtype[:-1] in GEOMETRY_TYPES:
+        pgtype = pgtype[:-1]
+    return GEOMETRY_TYPES.get(pgtype, "Geometry")
+
+class QueryInfo(object):
+    '''The plan of a query, its columns as (name, type) tuples and the names of its geometry columns'''
+
+    def __init__(self, plan, columns):
+        self.plan = plan
+        self.columns = columns
+        self.geomColumns = [name for name, datatype in columns if datatype == "geometry"]
+
+def validateQuery(geodb, sql, defaults):
+    '''
+    Checks that a query is valid with EXPLAIN, using the default values of its parameters,
+    and returns its QueryInfo. It raises a DbError if the query is not valid, or a ValueError
+    if a parameter has no default value
+    '''
+    missing = [name for name in viewParameters(sql) if not defaults.get(name)]
+    if missing:
+        raise ValueError("No default value for parameters: " + ", ".join(missing))
+    resolved = resolveParameters(sql, defaults)
+    plan = geodb.explain_query(resolved)
+    return QueryInfo(plan, geodb.get_query_columns(resolved))
+
+def queryGeometry(geodb, sql, defaults, geomColumn):
+    '''Returns the GeoServer geometry type and the SRID of a geometry column of a query'''
+    pgtype, srid = geodb.get_query_geometry(resolveParameters(sql, defaults), geomColumn)
+    return geoserverGeometryType(pgtype), srid or 4326
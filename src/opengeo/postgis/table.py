@@ -1,3 +1,5 @@
+from opengeo.postgis.postgis_utils import TableConstraint
+
 class Table(object):
     
     
@@ -11,3 +13,16 @@ class Table(object):
         self.conn = connection
         self.isView = self.tabletype == u'v'
         
+    def columns(self):
+        '''Returns the names of the columns of the table, other than its geometry'''
+        return [f.name for f in self.conn.geodb.get_table_fields(self.name, self.schema) 
+                if f.name != self.geomfield]
+        
+    def primaryKey(self):
+        '''Returns the names of the columns in the primary key of the table'''
+        geodb = self.conn.geodb
+        names = dict((f.num, f.name) for f in geodb.get_table_fields(self.name, self.schema))
+        for constraint in geodb.get_table_constraints(self.name, self.schema):
+            if constraint.con_type == TableConstraint.TypePrimaryKey:
+                return [names[num] for num in constraint.keys if num in names]
+        return []
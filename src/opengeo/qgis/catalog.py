@@ -10,6 +10,7 @@ and methods to interact with GIS objects
 '''
 
 import os
+import logging
 from qgis.core import *
 from PyQt4.QtXml import *
 from PyQt4.QtCore import *
@@ -17,10 +18,14 @@ from opengeo.qgis import layers, exporter, utils
 from opengeo.geoserver.catalog import ConflictingDataError, UploadError
 from opengeo.geoserver.catalog import Catalog as GSCatalog
 from opengeo.qgis.sldadapter import adaptGsToQgs,\
-    getGsCompatibleSld
+    getGsCompatibleSld, getStyleAttributes
+from opengeo.geoserver.support import is_geometry_binding
 from opengeo.qgis import uri as uri_utils
 from opengeo.qgis.utils import tempFilename
 from opengeo.geoserver.importerclient import Client
+from opengeo.geoserver import pgprofiles
+from opengeo.postgis.connection import savedConnection
+from opengeo.postgis.postgis_utils import GeoDB, DbError
 
 try:
     from processing.modeler.ModelerAlgorithm import ModelerAlgorithm
@@ -36,11 +41,46 @@ try:
     processingOk = True
 except:
     processingOk = False
+
+logger = logging.getLogger("opengeo.qgis")
     
 def createGeoServerCatalog(service_url = "http://localhost:8080/geoserver/rest", 
                  username="admin", password="geoserver", disable_ssl_certificate_validation=False):
     catalog = GSCatalog(service_url, username, password, disable_ssl_certificate_validation)
     return OGCatalog(catalog)
+
+def styleAttributes(layer, sld = None):
+    '''
+    Returns the names of the attributes of a vector layer used by its style, along with 
+    its primary key, or None if all attributes are to be published
+    '''
+    if layer.type() != layer.VectorLayer:
+        return None
+    if not bool(QSettings().value("/OpenGeo/Settings/GeoServer/PublishStyleAttributesOnly", True, bool)):
+        return None
+    if sld is None:
+        sld = getGsCompatibleSld(layer)
+    if sld is None:
+        #the style cannot be converted, so there is no way to know which attributes it uses
+        return None
+    fields = [f.name() for f in layer.pendingFields()]
+    used = getStyleAttributes(sld)
+    keys = [fields[i] for i in layer.dataProvider().pkAttributeIndexes() if i < len(fields)]
+    return [f for f in fields if f in used or f in keys]
+
+def pgStoreParams():
+    '''
+    Returns the connection parameters for new PostGIS datastores, taken from
+    the tuning profile selected in the plugin settings
+    '''
+    profile = QSettings().value("/OpenGeo/Settings/GeoServer/PostGISStoreProfile", pgprofiles.INTERACTIVE_WMS)
+    try:
+        return pgprofiles.profile_params(profile)
+    except ValueError:
+        #the setting might name a profile from another version of the plugin
+        logger.warning("Unknown PostGIS store profile '%s' in the settings, using '%s' instead",
+                       profile, pgprofiles.INTERACTIVE_WMS)
+        return pgprofiles.profile_params(pgprofiles.INTERACTIVE_WMS)
     
 
 class OGCatalog(object):
@@ -204,8 +244,13 @@ class OGCatalog(object):
                                            schema = uri.schema(),
                                            port = uri.port(),
                                            user = uri.username(),
-                                           passwd = uri.password())  
-                    self.catalog.create_pg_featuretype(uri.table(), connName, workspace, layer.crs().authid())
+                                           passwd = uri.password(),
+                                           connection_params = pgStoreParams())  
+                    native, latlon = self.tableBoundingBoxes(uri, layer.crs())
+                    self.catalog.create_pg_featuretype(uri.table(), connName, workspace, layer.crs().authid(),
+                                                       native, latlon)
+                elif self.stagingConnectionName():
+                    self.uploadThroughPostGIS(layer, workspace, overwrite, name)
                 else:   
                     path = self.getDataFromLayer(layer)
                     if restApi:  
@@ -257,7 +302,11 @@ class OGCatalog(object):
         if title != name:
             resource.dirty["title"] = title
             self.catalog.save(resource)
-        if resource.latlon_bbox is None:
+        if resource.latlon_bbox is None and layer.crs().isValid():
+            native, latlon = self.boundingBoxes(layer.extent(), layer.crs())
+            resource.latlon_bbox = latlon
+            self.catalog.save(resource)
+        elif resource.latlon_bbox is None:
             box = resource.native_bbox[:4]
             minx, maxx, miny, maxy = [float(a) for a in box]
             if -180 <= minx <= 180 and -180 <= maxx <= 180 and \
@@ -270,6 +319,82 @@ class OGCatalog(object):
                        '[%s]. the layer has been created, but its projection should be set manually.')
                 raise Exception(msg % layer.name())
             
+    def boundingBoxes(self, extent, crs):
+        '''
+        Returns the native and lat/lon bounding boxes of an extent, as (minx, maxx, miny, maxy, crs)
+        tuples to pass when creating a resource, so GeoServer does not have to compute them.
+        Returns (None, None) if the crs is not known
+        '''
+        if extent is None or not crs.isValid() or not crs.authid():
+            return None, None
+        native = (extent.xMinimum(), extent.xMaximum(), extent.yMinimum(), extent.yMaximum(), crs.authid())
+        wgs84 = QgsCoordinateReferenceSystem("EPSG:4326")
+        box = QgsCoordinateTransform(crs, wgs84).transformBoundingBox(extent)
+        latlon = (box.xMinimum(), box.xMaximum(), box.yMinimum(), box.yMaximum(), wgs84.authid())
+        return native, latlon
+    
+    def tableBoundingBoxes(self, uri, crs):
+        '''Returns the bounding boxes of a PostGIS table, estimated by the database without scanning it'''
+        try:
+            geodb = GeoDB(uri.host(), int(uri.port() or 5432), uri.database(), uri.username(), uri.password())
+        except DbError:
+            return None, None
+        try:
+            extent = geodb.get_table_extent(uri.table(), uri.geometryColumn(), uri.schema())
+        finally:
+            geodb.close()
+        if extent is None:
+            return None, None
+        xmin, xmax, ymin, ymax = extent
+        return self.boundingBoxes(QgsRectangle(xmin, ymin, xmax, ymax), crs)
+        
+    def stagingConnectionName(self):
+        '''
+        Returns the name of the PostGIS connection where vector layers are loaded
+        before publishing them, or an empty string if they are uploaded as shapefiles
+        '''
+        return QSettings().value("/OpenGeo/Settings/GeoServer/StagingConnection", "")
+    
+    def uploadThroughPostGIS(self, layer, workspace, overwrite, name):
+        '''
+        Publishes a vector layer by bulk loading it into a table in the staging
+        PostGIS database, which is then added to GeoServer as a feature type.
+        This avoids the limits of shapefiles, and GeoServer serves the layer from 
+        an indexed table
+        '''
+        settings = QSettings()
+        connName = self.stagingConnectionName()
+        schema = settings.value("/OpenGeo/Settings/GeoServer/StagingSchema", "public") or "public"
+        conn = savedConnection(connName)
+        if conn is None:
+            raise Exception("The PostGIS connection '%s' used for publishing layers does not exist" % connName)
+        if not conn.isValid:
+            raise Exception("Cannot connect to the PostGIS database used for publishing layers: %s" % conn.error)
+        geodb = conn.geodb
+        try:
+            if not overwrite and name in [t[0] for t in geodb.list_geotables(schema)]:
+                raise ConflictingDataError("There is already a table named %s in the staging database" % name)
+            conn.importFileOrLayer(layer, schema, name, True, False, True)
+            storeName = connName + "_" + schema
+            self.catalog.create_pg_featurestore(storeName,                                           
+                                           workspace = workspace,
+                                           overwrite = True,
+                                           host = geodb.host,
+                                           database = geodb.dbname,
+                                           schema = schema,
+                                           port = geodb.port,
+                                           user = geodb.user,
+                                           passwd = geodb.passwd,
+                                           connection_params = pgStoreParams())
+            store = self.catalog.get_store(storeName, workspace or self.catalog.get_default_workspace())
+            #when overwriting, the table has been replaced, so an existing feature type can be kept
+            if self.catalog.get_resource(name, store) is None:
+                native, latlon = self.boundingBoxes(layer.extent(), layer.crs())
+                self.catalog.create_pg_featuretype(name, storeName, workspace, layer.crs().authid(), 
+                                                   native, latlon)
+        finally:
+            geodb.close()
+            
     def getConnectionNameFromLayer(self, layer):
         connName = "postgis_store"
         uri = QgsDataSourceURI(layer.dataProvider().dataSourceUri())                
@@ -328,7 +453,7 @@ class OGCatalog(object):
         layergroup = self.catalog.create_layergroup(destName, names, names)
         self.catalog.save(layergroup)
         
-    def publishLayer (self, layer, workspace=None, overwrite=True, name=None):
+    def publishLayer (self, layer, workspace=None, overwrite=True, name=None, attributes=None):
         '''
         Publishes a QGIS layer. 
         It creates the corresponding store and the layer itself.
@@ -342,6 +467,10 @@ class OGCatalog(object):
         name: the name for the published layer. Uses the QGIS layer name if not passed 
         or None
         
+        attributes: the names of the attributes to publish, for vector layers. If not passed
+        or None, only the attributes used by the layer style and its primary key are published,
+        unless that is disabled in the plugin settings
+        
         '''
         
         if isinstance(layer, basestring):
@@ -357,16 +486,38 @@ class OGCatalog(object):
         name = name.replace(" ", "_")        
           
         sld = self.publishStyle(layer, overwrite, name)
+        if attributes is None:
+            attributes = styleAttributes(layer, sld)
             
         layer = self.preprocess(layer)            
         self.upload(layer, workspace, overwrite, title)          
 
+        if attributes is not None:
+            self.restrictAttributes(self.catalog.get_layer(name).resource, attributes)
+
         if sld is not None:
             #assign style to created store  
             publishing = self.catalog.get_layer(name)        
             publishing.default_style = self.catalog.get_style(name)
             self.catalog.save(publishing)
             
+    def restrictAttributes(self, resource, attributes):
+        '''
+        Makes a feature type publish only the passed attributes and its geometry.
+        Names are compared ignoring case and the truncation of field names in shapefiles, 
+        since layers might have been exported before uploading them
+        '''
+        bindings = resource.attribute_bindings
+        if not bindings:
+            return
+        wanted = set(a.lower() for a in attributes)
+        wanted.update(a.lower()[:10] for a in attributes)
+        kept = [(attname, binding) for attname, binding in bindings
+                if is_geometry_binding(binding) or attname.lower() in wanted]
+        if len(kept) < len(bindings):
+            resource.attribute_bindings = kept
+            self.catalog.save(resource)
+
     def preprocess(self, layer):    
         '''
         Preprocesses the layer with the corresponding preprocess hook and returns the path to the 
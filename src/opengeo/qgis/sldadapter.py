@@ -147,6 +147,14 @@ def getStyleAsSld(layer):
     else:
         return None
     
+def getStyleAttributes(sld):
+    '''Returns the names of the attributes used by the rules, filters and labels of a SLD, in order of appearance'''
+    names = []
+    for name in re.findall(r"<(?:\w+:)?PropertyName>\s*(.*?)\s*</(?:\w+:)?PropertyName>", sld or "", re.DOTALL):
+        if name and name not in names:
+            names.append(name)
+    return names
+    
 def getGeomTypeFromSld(sld):
     if "PointSymbolizer" in sld:
         return "Point"
@@ -6,9 +6,15 @@ from qgis.core import *
 from PyQt4.QtCore import *
 from opengeo.test import utils
 from opengeo import config
+from opengeo.geoserver import pgprofiles
+from opengeo.geoserver.catalog import ConflictingDataError
+from opengeo.postgis.connection import savedConnection
 from opengeo.test.utils import PT1, DEM, DEM2, PT1JSON, DEMASCII,\
     GEOLOGY_GROUP, GEOFORMS, LANDUSE, HOOK, WORKSPACE
 
+PGSTORE = "profilestore"
+STAGING = utils.safeName("staging")
+
 class CatalogTests(unittest.TestCase):
     '''
     Tests for the OGCatalog class that provides additional capabilities to a gsconfig catalog
@@ -91,6 +97,83 @@ class CatalogTests(unittest.TestCase):
         self.cat.catalog.delete(self.cat.catalog.get_layer(GEOFORMS), recurse = True)
         self.cat.catalog.delete(self.cat.catalog.get_layer(LANDUSE), recurse = True)
         
+    def testPublishAttributeSubset(self):
+        fields = [f.name() for f in layers.resolveLayer(PT1).pendingFields()]
+        self.cat.publishLayer(PT1, self.ws, name = PT1, attributes = fields[:1])
+        resource = self.cat.catalog.get_layer(PT1).resource
+        names = [name.lower() for name, binding in resource.attribute_bindings]
+        self.assertTrue(fields[0].lower()[:10] in names)
+        self.assertEqual(2, len(names))
+        self.cat.catalog.delete(self.cat.catalog.get_layer(PT1), recurse = True)
+
+    def testPgStoreProfile(self):
+        cat = self.cat.catalog
+        connection = dict(host = "localhost", port = 54321, database = "opengeo",
+                          user = "postgres", passwd = "postgres")
+        bulk = pgprofiles.profile_params(pgprofiles.BULK_WFS)
+        cat.create_pg_featurestore(PGSTORE, self.ws, connection_params = bulk, **connection)
+        store = cat.get_store(PGSTORE, self.ws)
+        self.assertEqual(bulk["fetch size"], store.connection_parameters["fetch size"])
+        #overwriting an existing store does not change its tuning
+        interactive = pgprofiles.profile_params(pgprofiles.INTERACTIVE_WMS)
+        cat.create_pg_featurestore(PGSTORE, self.ws, overwrite = True, connection_params = interactive, **connection)
+        store = cat.get_store(PGSTORE, self.ws)
+        self.assertEqual(bulk["fetch size"], store.connection_parameters["fetch size"])
+        #applying the GeoServer defaults removes the tuning parameters
+        store.connection_parameters = pgprofiles.apply_profile(store.connection_parameters,
+                                                               pgprofiles.GEOSERVER_DEFAULTS)
+        cat.save(store)
+        store = cat.get_store(PGSTORE, self.ws)
+        self.assertNotEqual(bulk["fetch size"], store.connection_parameters.get("fetch size"))
+        cat.delete(store)
+
+    def testUploadThroughPostGIS(self):
+        settings = QSettings()
+        oldStaging = settings.value("/OpenGeo/Settings/GeoServer/StagingConnection", "")
+        conn = utils.getPostgresConnection()
+        settings.beginGroup(u'/PostgreSQL/connections/' + STAGING)
+        for key, value in [("host", conn.host), ("port", conn.port), ("database", conn.database),
+                           ("username", conn.username), ("password", conn.password)]:
+            settings.setValue(key, value)
+        settings.endGroup()
+        settings.setValue("/OpenGeo/Settings/GeoServer/StagingConnection", STAGING)
+        try:
+            self.cat.publishLayer(PT1, self.ws, name = PT1)
+            layer = self.cat.catalog.get_layer(PT1)
+            self.assertIsNotNone(layer)
+            self.assertEqual(STAGING + "_public", layer.resource.store.name)
+            self.assertTrue(PT1 in [t[0] for t in conn.geodb.list_geotables("public")])
+            #overwriting replaces the table, but keeps the existing feature type
+            resource = layer.resource
+            resource.dirty["title"] = "staged"
+            self.cat.catalog.save(resource)
+            self.cat.publishLayer(PT1, self.ws, name = PT1)
+            self.assertEqual("staged", self.cat.catalog.get_layer(PT1).resource.title)
+            #without overwriting, an existing table is a conflict
+            self.assertRaises(ConflictingDataError, self.cat.uploadThroughPostGIS,
+                              layers.resolveLayer(PT1), self.ws, False, PT1)
+        finally:
+            layer = self.cat.catalog.get_layer(PT1)
+            if layer is not None:
+                self.cat.catalog.delete(layer, recurse = True)
+            settings.setValue("/OpenGeo/Settings/GeoServer/StagingConnection", oldStaging)
+            settings.remove(u'/PostgreSQL/connections/' + STAGING)
+            conn.geodb.invalidate()
+            if PT1 in [t[0] for t in conn.geodb.list_geotables("public")]:
+                conn.geodb.delete_table(PT1, "public")
+
+    def testSavedConnectionWithoutPort(self):
+        settings = QSettings()
+        settings.beginGroup(u'/PostgreSQL/connections/' + STAGING)
+        settings.setValue("host", "localhost")
+        settings.setValue("database", "opengeo")
+        settings.endGroup()
+        try:
+            conn = savedConnection(STAGING, connect = False)
+            self.assertEqual(5432, conn.port)
+        finally:
+            settings.remove(u'/PostgreSQL/connections/' + STAGING)
+
     def testPreuploadVectorHook(self):
         if not catalog.processingOk:
             print 'skipping testPreuploadVectorHook, processing not installed'
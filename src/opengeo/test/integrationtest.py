@@ -29,6 +29,8 @@ class ExplorerIntegrationTest(unittest.TestCase):
         utils.cleanDatabase(cls.conn) 
         
     def _getItemUnder(self, parent, name):
+        if parent.isLazy() and not parent.childCount():
+            parent.populate()
         for idx in range(parent.childCount()):
             item = parent.child(idx)            
             if item.text(0) == name:
@@ -0,0 +1,47 @@
+import unittest
+import struct
+from opengeo.postgis.loader import toEwkb, copyValue, geometryType, _CopyStream, NULL
+
+class LoaderTests(unittest.TestCase):
+    '''
+    Tests for the encoding of features for the bulk loader.
+    These do not require a PostGIS database
+    '''
+
+    def testEwkb(self):
+        wkb = struct.pack("<BIdd", 1, 1, 1.0, 2.0)
+        ewkb = toEwkb(wkb, 4326)
+        self.assertEquals(struct.pack("<BIidd", 1, 0x20000001, 4326, 1.0, 2.0), ewkb)
+        wkb = struct.pack(">BIdd", 0, 1, 1.0, 2.0)
+        self.assertEquals(struct.pack(">BIidd", 0, 0x20000001, 4326, 1.0, 2.0), toEwkb(wkb, 4326))
+
+    def testCopyValues(self):
+        self.assertEquals(NULL, copyValue(None))
+        self.assertEquals("a\\tb\\nc\\\\d", copyValue(u"a\tb\nc\\d"))
+        self.assertEquals("0.1", copyValue(0.1))
+        self.assertEquals("12", copyValue(12))
+        self.assertEquals("t", copyValue(True))
+        self.assertEquals("\xc3\xb1", copyValue(u"\xf1"))
+
+    def testGeometryTypes(self):
+        self.assertEquals(("MULTIPOLYGON", 2), geometryType(6))
+        self.assertEquals(("POLYGON", 2), geometryType(6, True))
+        self.assertEquals(("POINT", 3), geometryType(0x80000001))
+        self.assertEquals(("GEOMETRY", 2), geometryType(0))
+
+    def testStreamIsReadInChunks(self):
+        rows = ["row%i\n" % i for i in range(100)]
+        stream = _CopyStream(iter(rows))
+        chunks = []
+        chunk = stream.read(16)
+        while chunk:
+            self.assertTrue(len(chunk) <= 16)
+            chunks.append(chunk)
+            chunk = stream.read(16)
+        self.assertEquals("".join(rows), "".join(chunks))
+        self.assertEquals(100, stream.count)
+
+
+def suite():
+    suite = unittest.makeSuite(LoaderTests, 'test')
+    return suite
@@ -7,6 +7,13 @@ from opengeo.test.utils import PT1, PUBLIC_SCHEMA, PT2, getPostgresConnection
 from opengeo.gui.explorer import OpenGeoExplorer
 from opengeo.gui.pgoperations import importToPostGIS
 from opengeo.postgis.schema import Schema
+from opengeo.postgis.postgis_utils import TableField, DbError
+from opengeo.postgis.sqlview import validateQuery
+from opengeo.postgis.pyramid import buildPyramid
+from opengeo.postgis import advisor
+from opengeo.postgis.maintenance import MaintenanceJob, tablesByDeadRows, ANALYZE
+from opengeo.postgis.preview import TablePreview
+from opengeo.postgis import querylog
 
 class PgOperationsTests(unittest.TestCase):
         
@@ -44,7 +51,187 @@ class PgOperationsTests(unittest.TestCase):
         schema = Schema(self.conn, PUBLIC_SCHEMA)
         self.assertIsNotNone(self.getTable(schema, PT1))
         self.assertIsNotNone(self.getTable(schema, PT2))
+
+    def testAppendToExistingTable(self):
+        layer = layers.resolveLayer(PT1)
+        importToPostGIS(self.explorer, self.conn, [layer], PUBLIC_SCHEMA, PT1, False, False);
+        importToPostGIS(self.explorer, self.conn, [layer], PUBLIC_SCHEMA, PT1, True, False);
+        rows = self.conn.geodb.get_table_rows(PT1, PUBLIC_SCHEMA)
+        self.assertEquals(2 * layer.featureCount(), rows)
+
+    def testOverwriteExistingTable(self):
+        layer = layers.resolveLayer(PT1)
+        importToPostGIS(self.explorer, self.conn, [layer], PUBLIC_SCHEMA, PT1, False, False);
+        importToPostGIS(self.explorer, self.conn, [layer], PUBLIC_SCHEMA, PT1, False, False);
+        geodb = self.conn.geodb
+        self.assertEquals(layer.featureCount(), geodb.get_table_rows(PT1, PUBLIC_SCHEMA))
+        names = [t[0] for t in geodb.list_geotables(PUBLIC_SCHEMA)]
+        self.assertFalse(PT1 + "_staging" in names)
+        indexes = [i.name for i in geodb.get_table_indexes(PT1, PUBLIC_SCHEMA)]
+        self.assertTrue(PT1 + "_pkey" in indexes)
+
+    def testParallelImport(self):
+        layer = layers.resolveLayer(PT1)
+        importToPostGIS(self.explorer, self.conn, [layer], PUBLIC_SCHEMA, PT1, False, False, True);
+        importToPostGIS(self.explorer, self.conn, [layer], PUBLIC_SCHEMA, PT1, True, False, True);
+        geodb = self.conn.geodb
+        self.assertEquals(2 * layer.featureCount(), geodb.get_table_rows(PT1, PUBLIC_SCHEMA))
+        names = [t[0] for t in geodb.list_geotables(PUBLIC_SCHEMA)]
+        self.assertFalse(PT1 + "_staging" in names)
+        indexes = [i.name for i in geodb.get_table_indexes(PT1, PUBLIC_SCHEMA)]
+        self.assertTrue(PT1 + "_pkey" in indexes)
+
+    def testBatchedInsert(self):
+        geodb = self.conn.geodb
+        table = utils.safeName("batched")
+        fields = [TableField("id", "integer", False), TableField("name", "varchar", True, None, 20)]
+        geodb.create_table(table, fields, "id", PUBLIC_SCHEMA)
+        rows = [(i, "row '%i'" % i) for i in range(25)]
+        timings = geodb.insert_table_rows(table, rows, ["id", "name"], PUBLIC_SCHEMA, batch_size = 10)
+        self.assertEquals([10, 10, 5], [n for n, seconds in timings])
+        self.assertEquals(25, geodb.get_table_rows(table, PUBLIC_SCHEMA))
+        #a failing batch rolls back the whole insert
+        self.assertRaises(DbError, geodb.insert_table_rows, table, [(100, "a"), (0, "b")],
+                          ["id", "name"], PUBLIC_SCHEMA, batch_size = 1)
+        self.assertEquals(25, geodb.get_table_rows(table, PUBLIC_SCHEMA))
+        geodb.delete_table(table, PUBLIC_SCHEMA)
+
+    def testTableExtent(self):
+        layer = layers.resolveLayer(PT1)
+        importToPostGIS(self.explorer, self.conn, [layer], PUBLIC_SCHEMA, PT1, False, False);
+        xmin, xmax, ymin, ymax = self.conn.geodb.get_table_extent(PT1, "geom", PUBLIC_SCHEMA)
+        extent = layer.extent()
+        #estimated extents can be slightly larger than the exact one
+        self.assertTrue(xmin <= extent.xMinimum() and xmax >= extent.xMaximum())
+        self.assertTrue(ymin <= extent.yMinimum() and ymax >= extent.yMaximum())
+
+    def testValidateSqlView(self):
+        importToPostGIS(self.explorer, self.conn, [layers.resolveLayer(PT1)], PUBLIC_SCHEMA, PT1, False, False);
+        sql = "SELECT * FROM %s.%s WHERE ST_X(geom) > %%x%%" % (PUBLIC_SCHEMA, PT1)
+        self.assertRaises(ValueError, validateQuery, self.conn.geodb, sql, {})
+        info = validateQuery(self.conn.geodb, sql, {"x": "0"})
+        self.assertTrue(info.plan)
+        self.assertEquals(["geom"], info.geomColumns)
+        self.assertRaises(DbError, validateQuery, self.conn.geodb, sql.replace("geom", "nogeom"), {"x": "0"})
+
+    def testGeneralizedPyramid(self):
+        importToPostGIS(self.explorer, self.conn, [layers.resolveLayer(PT2)], PUBLIC_SCHEMA, PT2, False, False);
+        table = self.getTable(Schema(self.conn, PUBLIC_SCHEMA), PT2)
+        levels = buildPyramid(table, [0.01, 0.1])
+        self.assertEquals([0, 0.01, 0.1], [level.tolerance for level in levels])
+        self.assertTrue(levels[2].vertices <= levels[1].vertices <= levels[0].vertices)
+        geodb = self.conn.geodb
+        for level in levels[1:]:
+            self.assertEquals(geodb.get_table_rows(PT2, PUBLIC_SCHEMA), geodb.get_table_rows(level.tablename, PUBLIC_SCHEMA))
+
+    def testRowCountEstimate(self):
+        importToPostGIS(self.explorer, self.conn, [layers.resolveLayer(PT1)], PUBLIC_SCHEMA, PT1, False, False);
+        geodb = self.conn.geodb
+        geodb.vacuum_analyze(PT1, PUBLIC_SCHEMA)
+        rows = geodb.get_table_rows(PT1, PUBLIC_SCHEMA)
+        self.assertEquals(rows, geodb.get_table_rows_estimate(PT1, PUBLIC_SCHEMA))
+        self.assertIsNone(geodb.get_table_rows_estimate("nonexistent_table", PUBLIC_SCHEMA))
+
+    def testIntrospectionIsRefreshedAfterImport(self):
+        schema = Schema(self.conn, PUBLIC_SCHEMA)
+        self.assertIsNone(self.getTable(schema, PT1))
+        importToPostGIS(self.explorer, self.conn, [layers.resolveLayer(PT1)], PUBLIC_SCHEMA, PT1, False, False);
+        self.assertIsNotNone(self.getTable(schema, PT1))
+        self.conn.geodb.delete_table(PT1, PUBLIC_SCHEMA)
+        self.assertIsNone(self.getTable(schema, PT1))
+
+    def testBulkTableMetadata(self):
+        importToPostGIS(self.explorer, self.conn, [layers.resolveLayer(PT1)], PUBLIC_SCHEMA, PT1, False, False);
+        geodb = self.conn.geodb
+        metadata = geodb.get_tables_metadata(PUBLIC_SCHEMA)
+        record = metadata[(PUBLIC_SCHEMA, PT1)]
+        self.assertTrue(len(record.fields) > 0)
+        self.assertEquals([f.name for f in record.fields], 
+                          [f.name for f in geodb.get_table_fields(PT1, PUBLIC_SCHEMA)])
+        self.assertEquals(metadata.keys(), geodb.get_tables_metadata(PUBLIC_SCHEMA).keys())
+        self.assertEquals([(PUBLIC_SCHEMA, PT1)], geodb.get_tables_metadata(PUBLIC_SCHEMA, [PT1]).keys())
+
+    def testSingleTableMetadata(self):
+        importToPostGIS(self.explorer, self.conn, [layers.resolveLayer(PT1)], PUBLIC_SCHEMA, PT1, False, False);
+        geodb = self.conn.geodb.copy()
+        try:
+            fields = [f.name for f in geodb.get_table_fields(PT1, PUBLIC_SCHEMA)]
+            self.assertTrue(len(fields) > 0)
+            #a single table lookup does not fetch the rest of the schema
+            self.assertEquals([(PUBLIC_SCHEMA, PT1)], geodb._metadata[1].keys())
+            #without a schema, the table is found through the search_path
+            self.assertEquals(fields, [f.name for f in geodb.get_table_fields(PT1)])
+        finally:
+            geodb.close()
+
+    def testAdvisorFixesMissingSpatialIndex(self):
+        importToPostGIS(self.explorer, self.conn, [layers.resolveLayer(PT1)], PUBLIC_SCHEMA, PT1, False, False);
+        geodb = self.conn.geodb
+        index = advisor._spatialIndex(geodb, PUBLIC_SCHEMA, PT1, "geom")
+        if index is not None:
+            geodb._exec_sql_and_commit("DROP INDEX %s" % geodb._table_name(PUBLIC_SCHEMA, index))
+        issues = [i for i in advisor.findIssues(geodb, PUBLIC_SCHEMA) if i.table == PT1]
+        self.assertTrue(advisor.MISSING_SPATIAL_INDEX in [i.kind for i in issues])
+        results = advisor.fixIssues(geodb, issues)
+        self.assertEquals([None] * len(issues), [error for issue, seconds, error in results])
+        issues = [i for i in advisor.findIssues(geodb, PUBLIC_SCHEMA) if i.table == PT1]
+        self.assertFalse(advisor.MISSING_SPATIAL_INDEX in [i.kind for i in issues])
         
+    def testMaintainTablesInParallel(self):
+        importToPostGIS(self.explorer, self.conn, [layers.resolveLayer(PT1)], PUBLIC_SCHEMA, PT1, False, False);
+        importToPostGIS(self.explorer, self.conn, [layers.resolveLayer(PT2)], PUBLIC_SCHEMA, PT2, False, False);
+        geodb = self.conn.geodb
+        tables = tablesByDeadRows(geodb, PUBLIC_SCHEMA, [(PUBLIC_SCHEMA, PT1), (PUBLIC_SCHEMA, PT2), (PUBLIC_SCHEMA, "nonexistent")])
+        self.assertEquals(set([(PUBLIC_SCHEMA, PT1), (PUBLIC_SCHEMA, PT2)]), set(tables))
+        results = MaintenanceJob(geodb, tables, workers = 2).run()
+        self.assertEquals(set(tables), set((schema, table) for schema, table, seconds, error in results))
+        self.assertEquals([None, None], [error for schema, table, seconds, error in results])
+        job = MaintenanceJob(geodb, tables, ANALYZE)
+        job.cancel()
+        self.assertEquals([], job.run())
+
+    def testPagedPreview(self):
+        importToPostGIS(self.explorer, self.conn, [layers.resolveLayer(PT1)], PUBLIC_SCHEMA, PT1, False, False);
+        table = self.getTable(Schema(self.conn, PUBLIC_SCHEMA), PT1)
+        preview = TablePreview(table, pageSize = 2)
+        try:
+            self.assertTrue(preview.isKeyed())
+            keys = []
+            after = None
+            while True:
+                preview.openPage(after)
+                rows = preview.fetch(1) + preview.fetch(1)
+                self.assertEquals([], preview.fetch())
+                if not rows:
+                    break
+                keys.extend(preview.key(row) for row in rows)
+                after = keys[-1]
+            self.assertEquals(sorted(keys), keys)
+            self.assertEquals(self.conn.geodb.get_table_rows(PT1, PUBLIC_SCHEMA), len(set(keys)))
+        finally:
+            preview.close()
+
+    def testStatementTimeout(self):
+        geodb = self.conn.geodb
+        cursor = geodb.con.cursor()
+        with geodb.timeout(1):
+            self.assertRaises(DbError, geodb._exec_sql, cursor, "SELECT pg_sleep(5)")
+        geodb.con.rollback()
+        timing = querylog.recentQueries()[-1]
+        self.assertEquals("SELECT pg_sleep(5)", timing.sql)
+        self.assertIsNotNone(timing.error)
+        self.assertTrue(timing.seconds < 5)
+        self.assertEquals(geodb.database_key(), timing.database)
+        self.assertTrue(querylog.stats(geodb.database_key())["errors"] > 0)
+        geodb._exec_sql(cursor, "SHOW statement_timeout")
+        self.assertEquals("0", cursor.fetchone()[0])
+        #the timeout does not last beyond the block, even if the transaction does
+        with geodb.timeout(1):
+            geodb._exec_sql(cursor, "SELECT 1")
+        geodb._exec_sql(cursor, "SHOW statement_timeout")
+        self.assertEquals("0", cursor.fetchone()[0])
+        geodb.con.rollback()
+
 
 def suite():
     suite = unittest.makeSuite(PgOperationsTests, 'test')
@@ -0,0 +1,39 @@
+import unittest
+from opengeo.geoserver import pgprofiles
+
+class PgProfilesTests(unittest.TestCase):
+    '''
+    Tests for the tuning profiles of PostGIS datastores.
+    These do not require a GeoServer catalog or a PostGIS database
+    '''
+
+    def setUp(self):
+        self.params = {"host": "localhost", "port": "5432", "database": "opengeo", "dbtype": "postgis"}
+
+    def testApplyProfile(self):
+        params = pgprofiles.apply_profile(self.params, pgprofiles.BULK_WFS)
+        self.assertEquals("10000", params["fetch size"])
+        self.assertEquals("false", params["Loose bbox"])
+        self.assertEquals("opengeo", params["database"])
+        self.assertFalse("fetch size" in self.params)
+
+    def testProfilesReplaceEachOther(self):
+        params = pgprofiles.apply_profile(self.params, pgprofiles.BULK_WFS)
+        params["fetch size"] = "500"
+        params = pgprofiles.apply_profile(params, pgprofiles.INTERACTIVE_WMS)
+        self.assertEquals(pgprofiles.profile_params(pgprofiles.INTERACTIVE_WMS), pgprofiles.tuning_params(params))
+
+    def testDefaultsRevertTuning(self):
+        params = pgprofiles.apply_profile(self.params, pgprofiles.INTERACTIVE_WMS)
+        params = pgprofiles.apply_profile(params, pgprofiles.GEOSERVER_DEFAULTS)
+        self.assertEquals(self.params, params)
+        self.assertEquals({}, pgprofiles.tuning_params(params))
+
+    def testUnknownProfile(self):
+        self.assertRaises(ValueError, pgprofiles.profile_params, "Unknown profile")
+        self.assertRaises(ValueError, pgprofiles.apply_profile, self.params, "Unknown profile")
+
+
+def suite():
+    suite = unittest.makeSuite(PgProfilesTests, 'test')
+    return suite
@@ -0,0 +1,84 @@
+import unittest
+import threading
+from opengeo.postgis.pool import ConnectionPool, PoolError, PoolExhaustedError
+
+class FakeConnection(object):
+
+    def __init__(self):
+        self.closed = False
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class PoolTests(unittest.TestCase):
+    '''
+    Tests for the pool of PostGIS connections.
+    These use fake connections and do not require a database
+    '''
+
+    def setUp(self):
+        self.opened = []
+        self.pool = ConnectionPool("dbname=test", maxconn = 2, connect = self._connect, waitTimeout = 0)
+
+    def _connect(self, conninfo):
+        con = FakeConnection()
+        self.opened.append(con)
+        return con
+
+    def testReturnedConnectionsAreReused(self):
+        con = self.pool.getconn()
+        self.pool.putconn(con)
+        self.assertTrue(self.pool.getconn() is con)
+        self.assertEquals(1, len(self.opened))
+
+    def testMaxConnections(self):
+        self.pool.getconn()
+        self.pool.getconn()
+        self.assertRaises(PoolExhaustedError, self.pool.getconn)
+        self.assertRaises(PoolError, self.pool.getconn, 0.1)
+
+    def testWaitForReturnedConnection(self):
+        first = self.pool.getconn()
+        self.pool.getconn()
+        timer = threading.Timer(0.1, self.pool.putconn, (first,))
+        timer.start()
+        try:
+            self.assertTrue(self.pool.getconn(5) is first)
+        finally:
+            timer.join()
+        self.assertEquals(2, len(self.opened))
+
+    def testClosedConnectionsAreReplaced(self):
+        con = self.pool.getconn()
+        self.pool.putconn(con)
+        con.closed = True
+        self.assertFalse(self.pool.getconn() is con)
+        self.assertEquals(2, len(self.opened))
+
+    def testIdleConnectionsAreEvicted(self):
+        self.pool.idleTimeout = -1
+        first = self.pool.getconn()
+        second = self.pool.getconn()
+        self.pool.putconn(first)
+        self.pool.putconn(second)
+        #one connection is kept open
+        self.assertEquals(1, [con.closed for con in self.opened].count(True))
+
+    def testCloseAll(self):
+        idle = self.pool.getconn()
+        used = self.pool.getconn()
+        self.pool.putconn(idle)
+        self.pool.closeall()
+        self.assertTrue(idle.closed)
+        self.assertFalse(used.closed)
+        self.pool.putconn(used)
+        self.assertTrue(used.closed)
+
+
+def suite():
+    suite = unittest.makeSuite(PoolTests, 'test')
+    return suite
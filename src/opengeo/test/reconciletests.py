@@ -0,0 +1,81 @@
+import unittest
+from PyQt4 import QtGui
+from opengeo.gui.exploreritems import TreeItem, children, reconcileChildren
+
+class ReconcileTests(unittest.TestCase):
+    '''
+    Tests for the reconciliation of refreshed explorer subtrees.
+    These do not require a GeoServer catalog or a PostGIS database
+    '''
+
+    def setUp(self):
+        self.tree = QtGui.QTreeWidget()
+        self.root = self.tree.invisibleRootItem()
+        for name in ["a", "b", "c"]:
+            self.root.addChild(TreeItem(name))
+
+    def _refresh(self, names):
+        previous = children(self.root)
+        for name in names:
+            self.root.addChild(TreeItem(name))
+        return previous, reconcileChildren(self.root, previous)
+
+    def testUnchangedItemsAreKept(self):
+        previous, current = self._refresh(["a", "b", "c"])
+        self.assertEquals(3, self.root.childCount())
+        for old, new in zip(previous, current):
+            self.assertTrue(old is new)
+
+    def testNewAndRemovedItems(self):
+        previous, current = self._refresh(["a", "c", "d"])
+        self.assertEquals(["a", "c", "d"], [self.root.child(i).text(0) for i in range(self.root.childCount())])
+        self.assertTrue(current[0] is previous[0])
+        self.assertTrue(current[1] is previous[2])
+
+    def testExpansionIsPreserved(self):
+        item = self.root.child(1)
+        item.addChild(TreeItem("child"))
+        item.setExpanded(True)
+        previous = children(self.root)
+        for name in ["a", "b", "c"]:
+            fresh = TreeItem(name)
+            fresh.addChild(TreeItem("child"))
+            self.root.addChild(fresh)
+        reconcileChildren(self.root, previous)
+        self.assertTrue(self.root.child(1) is item)
+        self.assertTrue(item.isExpanded())
+        self.assertEquals(1, item.childCount())
+
+    def testOnlyDeclaredStateIsTaken(self):
+        item = self.root.child(0)
+        item.worker = "running"
+        previous = children(self.root)
+        for name in ["a", "b", "c"]:
+            fresh = TreeItem(name)
+            fresh.worker = None
+            fresh.unloadedNames = ["child"]
+            self.root.addChild(fresh)
+        reconcileChildren(self.root, previous)
+        self.assertTrue(self.root.child(0) is item)
+        self.assertEquals("running", item.worker)
+        self.assertEquals(["child"], item.unloadedNames)
+
+    def testUnpopulatedLazyItemIsEmptied(self):
+        class LazyItem(TreeItem):
+            def loadChildren(self):
+                return []
+        self.root.takeChildren()
+        item = LazyItem("a")
+        self.root.addChild(item)
+        item.addChild(TreeItem("child"))
+        previous = children(self.root)
+        self.root.addChild(LazyItem("a"))
+        reconcileChildren(self.root, previous)
+        self.assertTrue(self.root.child(0) is item)
+        self.assertEquals(0, item.childCount())
+        self.assertEquals(QtGui.QTreeWidgetItem.ShowIndicator, item.childIndicatorPolicy())
+
+
+def suite():
+    suite = unittest.makeSuite(ReconcileTests, 'test')
+    return suite
@@ -0,0 +1,46 @@
+import unittest
+from opengeo.gui.search import SearchIndex, tokenize
+
+class SearchIndexTests(unittest.TestCase):
+    '''
+    Tests for the inverted index used by the search box of the explorer.
+    These do not require a GeoServer catalog or a PostGIS database
+    '''
+
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.add("roads", "topp:roads Main roads of the city transport")
+        self.index.add("rivers", "topp:rivers Rivers and lakes hydrography")
+        self.index.add("states", "usa:states US states boundaries")
+
+    def testTokenize(self):
+        self.assertEquals(set(["topp", "tasmania", "roads"]), tokenize("topp:tasmania_Roads"))
+
+    def testPrefixSearch(self):
+        self.assertEquals(set(["roads", "rivers"]), self.index.search("top"))
+        self.assertEquals(set(["rivers"]), self.index.search("riv"))
+
+    def testAllWordsMustMatch(self):
+        self.assertEquals(set(["roads"]), self.index.search("topp transp"))
+        self.assertEquals(set(), self.index.search("topp boundaries"))
+
+    def testMatchesSingleDocument(self):
+        self.assertTrue(self.index.matches("roads", "topp transp"))
+        self.assertFalse(self.index.matches("rivers", "topp transp"))
+        self.assertFalse(self.index.matches("lakes", "topp"))
+        for query in ["top", "us sta", "roads city"]:
+            matches = set(doc for doc in self.index.documents if self.index.matches(doc, query))
+            self.assertEquals(self.index.search(query), matches)
+
+    def testRemoveAndUpdate(self):
+        self.index.remove("roads")
+        self.assertEquals(set(["rivers"]), self.index.search("topp"))
+        self.index.add("rivers", "usa:rivers")
+        self.assertEquals(set(), self.index.search("topp"))
+        self.assertEquals(set(["rivers", "states"]), self.index.search("usa"))
+        self.assertEquals(["boundaries", "rivers", "states", "us", "usa"], self.index.terms)
+
+
+def suite():
+    suite = unittest.makeSuite(SearchIndexTests, 'test')
+    return suite
@@ -0,0 +1,28 @@
+import unittest
+from opengeo.postgis.sqlview import viewParameters, resolveParameters, geoserverGeometryType
+
+class SqlViewTests(unittest.TestCase):
+    '''
+    Tests for the handling of parameters and geometry types of SQL views.
+    These do not require a PostGIS database
+    '''
+
+    def testParameters(self):
+        sql = "SELECT * FROM parcels WHERE zone = '%zone%' AND area > %area% AND owner LIKE '%zone%'"
+        self.assertEquals(["zone", "area"], viewParameters(sql))
+        self.assertEquals("SELECT * FROM parcels WHERE zone = 'R1' AND area > %area% AND owner LIKE 'R1'",
+                          resolveParameters(sql, {"zone": "R1"}))
+
+    def testLiteralPercentSignsAreNotParameters(self):
+        self.assertEquals([], viewParameters("SELECT * FROM parcels WHERE owner LIKE 'a% b%'"))
+
+    def testGeometryTypes(self):
+        self.assertEquals("MultiPolygon", geoserverGeometryType("MULTIPOLYGON"))
+        self.assertEquals("Point", geoserverGeometryType("POINTM"))
+        self.assertEquals("Geometry", geoserverGeometryType(None))
+        self.assertEquals("Geometry", geoserverGeometryType("CIRCULARSTRING"))
+
+
+def suite():
+    suite = unittest.makeSuite(SqlViewTests, 'test')
+    return suite
@@ -0,0 +1,72 @@
+import unittest
+from opengeo.geoserver.transport import AdaptiveLimiter, Transport, READ, WRITE
+
+class TransportTests(unittest.TestCase):
+    '''
+    Tests for the adaptive concurrency limiter used by the shared GeoServer transport.
+    These do not require a running GeoServer
+    '''
+
+    def testLimitGrowsWithFastRequests(self):
+        limiter = AdaptiveLimiter(initial = 2, maximum = 8, latencyThreshold = 1.0)
+        for i in range(50):
+            limiter.acquire()
+            limiter.release(0.01)
+        self.assertTrue(limiter.limit > 2)
+        self.assertTrue(limiter.limit <= 8)
+        self.assertEquals(0, limiter.inflight)
+
+    def testLimitShrinksOnOverload(self):
+        limiter = AdaptiveLimiter(initial = 8, maximum = 8)
+        limiter.acquire()
+        limiter.release(0.01, overloaded = True)
+        self.assertEquals(4, limiter.limit)
+        self.assertEquals(1, limiter.errors)
+
+    def testLimitShrinksOnSlowRequests(self):
+        limiter = AdaptiveLimiter(initial = 8, maximum = 8, latencyThreshold = 1.0)
+        limiter.acquire()
+        limiter.release(2.0)
+        self.assertEquals(4, limiter.limit)
+
+    def testWritesIgnoreLatency(self):
+        transport = Transport("http://localhost:8080/geoserver/", "admin", "geoserver", maxWrites = 4)
+        limiter = transport.limiters[WRITE]
+        limiter.acquire()
+        limiter.release(60.0)
+        self.assertEquals(0, limiter.decreases)
+        self.assertTrue(limiter.limit >= 1)
+        limiter.acquire()
+        limiter.release(0.01, overloaded = True)
+        self.assertEquals(1, limiter.decreases)
+
+    def testFailedRequestsDoNotChangeLimit(self):
+        limiter = AdaptiveLimiter(initial = 8, maximum = 8)
+        limiter.acquire()
+        limiter.release()
+        self.assertEquals(8, limiter.limit)
+        self.assertEquals(0, limiter.inflight)
+        self.assertEquals(0, limiter.requests)
+
+    def testLimitNeverBelowMinimum(self):
+        limiter = AdaptiveLimiter(initial = 1, minimum = 1)
+        for i in range(5):
+            limiter.acquire()
+            limiter._lastDecrease = 0
+            limiter.release(0.01, overloaded = True)
+        self.assertEquals(1, limiter.limit)
+
+    def testSeparateReadAndWriteLimits(self):
+        transport = Transport("http://localhost:8080/geoserver/", "admin", "geoserver",
+                              maxReads = 10, maxWrites = 2)
+        stats = transport.stats()
+        self.assertTrue(READ in stats)
+        self.assertTrue(WRITE in stats)
+        self.assertEquals(1, stats[WRITE]["limit"])
+        self.assertEquals(10, transport.limiters[READ].maximum)
+        self.assertEquals(2, transport.limiters[WRITE].maximum)
+
+
+def suite():
+    suite = unittest.makeSuite(TransportTests, 'test')
+    return suite
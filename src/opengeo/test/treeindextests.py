@@ -0,0 +1,40 @@
+import unittest
+from opengeo.gui.explorertree import ExplorerTreeWidget
+from opengeo.gui.exploreritems import TreeItem
+
+class Named(object):
+
+    def __init__(self, name, workspace = None):
+        self.name = name
+        self.workspace = workspace
+
+
+class TreeIndexTests(unittest.TestCase):
+    '''
+    Tests for the index of tree items by element used by the explorer tree.
+    These do not require a GeoServer catalog or a PostGIS database
+    '''
+
+    def setUp(self):
+        self.tree = ExplorerTreeWidget(None)
+        self.parent = TreeItem("parent")
+        self.child = TreeItem(Named("layer", "ws1"))
+        self.parent.addChild(self.child)
+        self.tree.addTopLevelItem(self.parent)
+
+    def testItemsAreIndexedWithTheirParent(self):
+        self.assertEquals([self.child], self.tree.findAllItems(Named("layer", "ws1")))
+        self.assertEquals([self.parent], self.tree.findAllItems("parent"))
+
+    def testQualifiedNames(self):
+        self.assertEquals([None], self.tree.findAllItems(Named("layer", "ws2")))
+
+    def testRemovedItemsAreUnindexed(self):
+        self.tree.takeTopLevelItem(0)
+        self.assertEquals([None], self.tree.findAllItems(Named("layer", "ws1")))
+        self.assertEquals({}, self.tree.itemsIndex)
+
+
+def suite():
+    suite = unittest.makeSuite(TreeIndexTests, 'test')
+    return suite